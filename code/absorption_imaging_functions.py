@@ -0,0 +1,148 @@
+import threading
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+"""
+Vectorized computation of optical density (OD) images from absorption imaging stacks.
+
+An absorption image is computed from a frame with atoms, a frame without atoms and a dark frame as
+-log((with_atoms - dark) / (without_atoms - dark)) for the OD, or without the log for the "fake OD", i.e. the transmission.
+Pixels where this is undefined (nan) are replaced by a configurable value, infinities by the largest finite values, and the
+result is optionally clipped.
+
+The computation is done in float32, in place: the only memory used besides the output is one float32 scratch buffer, kept
+per frame shape and per thread and reused between calls. If numba is installed, a compiled kernel computing each pixel in a
+single pass is used instead, with no scratch buffer at all.
+"""
+
+
+"""
+Computes OD and fake OD images, reusing its scratch buffers between calls. An AbsorptionImageKernel may be shared between
+threads.
+
+Parameters:
+
+use_numba: (bool) Whether to use the compiled numba kernel. If None, the default, it is used if numba is installed.
+"""
+class AbsorptionImageKernel():
+
+    def __init__(self, use_numba = None):
+        if use_numba is None:
+            use_numba = not numba is None
+        if use_numba and numba is None:
+            raise ImportError("The numba absorption kernel requires numba.")
+        self.use_numba = use_numba
+        self._thread_local = threading.local()
+
+
+    """
+    Compute the OD image -log((with_atoms - dark) / (without_atoms - dark)).
+
+    Parameters:
+
+    with_atoms, without_atoms, dark: Arrays of the same shape, of any real dtype. They are not modified.
+
+    out: (Optional) A float32 array of the same shape, into which the OD is written. If None, a new array is returned.
+
+    nan_value: The value given to pixels where the OD is undefined, e.g. where both differences are zero.
+
+    clip_min, clip_max: (Optional) Limits to which the OD is clipped.
+
+    Returns: The float32 OD image, i.e. out if it was passed."""
+    def get_od(self, with_atoms, without_atoms, dark, out = None, nan_value = 0.0, clip_min = None, clip_max = None):
+        return self._compute_absorption_image(with_atoms, without_atoms, dark, out, True, nan_value, clip_min, clip_max)
+
+
+    """
+    Compute the fake OD image (with_atoms - dark) / (without_atoms - dark). Parameters are as for get_od."""
+    def get_fake_od(self, with_atoms, without_atoms, dark, out = None, nan_value = 0.0, clip_min = None, clip_max = None):
+        return self._compute_absorption_image(with_atoms, without_atoms, dark, out, False, nan_value, clip_min, clip_max)
+
+    def _compute_absorption_image(self, with_atoms, without_atoms, dark, out, take_log, nan_value, clip_min, clip_max):
+        with_atoms, without_atoms, dark = np.asarray(with_atoms), np.asarray(without_atoms), np.asarray(dark)
+        if not (with_atoms.shape == without_atoms.shape == dark.shape):
+            raise ValueError("The with atoms, without atoms and dark frames must have the same shape.")
+        if out is None:
+            out = np.empty(with_atoms.shape, dtype = np.float32)
+        elif out.shape != with_atoms.shape or out.dtype != np.float32:
+            raise ValueError("out must be a float32 array of the same shape as the frames.")
+        if self.use_numba and with_atoms.ndim == 2:
+            _numba_absorption_kernel(with_atoms, without_atoms, dark, out, take_log, np.float32(nan_value),
+                                    np.float32(-np.inf if clip_min is None else clip_min),
+                                    np.float32(np.inf if clip_max is None else clip_max))
+            return out
+        numerator = self._get_scratch_buffer(with_atoms.shape)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            np.subtract(with_atoms, dark, out = numerator, dtype = np.float32, casting = 'unsafe')
+            np.subtract(without_atoms, dark, out = out, dtype = np.float32, casting = 'unsafe')
+            np.divide(numerator, out, out = out)
+            if take_log:
+                np.log(out, out = out)
+                np.negative(out, out = out)
+        np.nan_to_num(out, copy = False, nan = nan_value)
+        if not clip_min is None or not clip_max is None:
+            np.clip(out, clip_min, clip_max, out = out)
+        return out
+
+    def _get_scratch_buffer(self, shape):
+        scratch_buffers_dict = getattr(self._thread_local, "scratch_buffers_dict", None)
+        if scratch_buffers_dict is None:
+            scratch_buffers_dict = {}
+            self._thread_local.scratch_buffers_dict = scratch_buffers_dict
+        if not shape in scratch_buffers_dict:
+            #Keep only the buffer for the latest shape, as a viewer's frames rarely change size
+            scratch_buffers_dict.clear()
+            scratch_buffers_dict[shape] = np.empty(shape, dtype = np.float32)
+        return scratch_buffers_dict[shape]
+
+
+if not numba is None:
+    @numba.njit(cache = True, nogil = True, error_model = 'numpy')
+    def _numba_absorption_kernel(with_atoms, without_atoms, dark, out, take_log, nan_value, clip_min, clip_max):
+        float32_max = np.finfo(np.float32).max
+        for i in range(out.shape[0]):
+            for j in range(out.shape[1]):
+                dark_value = np.float32(dark[i, j])
+                value = (np.float32(with_atoms[i, j]) - dark_value) / (np.float32(without_atoms[i, j]) - dark_value)
+                if take_log:
+                    value = -np.log(value)
+                if np.isnan(value):
+                    value = nan_value
+                elif value > float32_max:
+                    value = float32_max
+                elif value < -float32_max:
+                    value = -float32_max
+                out[i, j] = min(max(value, clip_min), clip_max)
+else:
+    _numba_absorption_kernel = None
+
+
+_DEFAULT_KERNEL = None
+_default_kernel_lock = threading.Lock()
+
+def _get_default_kernel():
+    global _DEFAULT_KERNEL
+    with _default_kernel_lock:
+        if _DEFAULT_KERNEL is None:
+            _DEFAULT_KERNEL = AbsorptionImageKernel()
+        return _DEFAULT_KERNEL
+
+
+"""
+Compute an OD image with a shared AbsorptionImageKernel. Parameters are as for AbsorptionImageKernel.get_od."""
+def get_od_image(with_atoms, without_atoms, dark, out = None, nan_value = 0.0, clip_min = None, clip_max = None):
+    return _get_default_kernel().get_od(with_atoms, without_atoms, dark, out = out, nan_value = nan_value,
+                                        clip_min = clip_min, clip_max = clip_max)
+
+
+"""
+Compute a fake OD image with a shared AbsorptionImageKernel. Parameters are as for AbsorptionImageKernel.get_od."""
+def get_fake_od_image(with_atoms, without_atoms, dark, out = None, nan_value = 0.0, clip_min = None, clip_max = None):
+    return _get_default_kernel().get_fake_od(with_atoms, without_atoms, dark, out = out, nan_value = nan_value,
+                                            clip_min = clip_min, clip_max = clip_max)
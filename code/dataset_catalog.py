@@ -0,0 +1,281 @@
+import datetime
+import json
+import numbers
+import os
+import sqlite3
+
+
+DATETIME_FORMAT_STRING = "%Y-%m-%d--%H-%M-%S"
+FILENAME_DELIMITER_CHAR = '_'
+DEFAULT_PARAMETERS_FILENAME = "run_params_dump.json"
+
+#Bookkeeping keys in the run parameter dicts saved by the watchdog which are not themselves run parameters
+RUN_PARAMETERS_BOOKKEEPING_KEYS = ["id", "runtime", "badshot", "ListBoundVariables"]
+
+"""
+A persistent SQLite index of the images saved in run folders.
+
+Each image saved under the runID_datetime_imagename naming convention is recorded with its run id, acquisition datetime,
+image type, path, size and folder, and the run parameters in the folder's run_params_dump.json are joined to it, so that
+finding the files for a run id or parameter value is an index lookup rather than a directory listing. If a run's parameters
+record ListBoundVariables, only those are catalogued; otherwise, all parameters are.
+
+The catalog is kept current either by calling update/update_folder, which only re-examine files that have changed, or
+by passing it to an ImageWatchdog, which adds images as it saves them.
+
+Parameters:
+
+catalog_pathname: The path to the SQLite file holding the catalog. It is created if it does not exist.
+"""
+class DatasetCatalog():
+
+    def __init__(self, catalog_pathname):
+        self.catalog_pathname = catalog_pathname
+        self.connection = sqlite3.connect(catalog_pathname)
+        self._initialize_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _initialize_tables(self):
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS images (
+                                        pathname TEXT PRIMARY KEY,
+                                        folder_pathname TEXT NOT NULL,
+                                        run_id INTEGER,
+                                        acquisition_datetime TEXT,
+                                        image_type TEXT,
+                                        size INTEGER NOT NULL,
+                                        mtime REAL NOT NULL)""")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS run_parameters (
+                                        folder_pathname TEXT NOT NULL,
+                                        run_id INTEGER NOT NULL,
+                                        key TEXT NOT NULL,
+                                        value TEXT,
+                                        numeric_value REAL,
+                                        PRIMARY KEY (folder_pathname, run_id, key))""")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS parameter_files (
+                                        folder_pathname TEXT PRIMARY KEY,
+                                        mtime REAL NOT NULL,
+                                        size INTEGER NOT NULL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS images_run_id_index ON images(run_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS images_folder_index ON images(folder_pathname)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS images_datetime_index ON images(acquisition_datetime)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS run_parameters_key_index ON run_parameters(key, numeric_value)")
+
+
+    """
+    Bring the catalog up to date with every folder under root_folder_pathname which contains images.
+
+    Returns: The number of image files which were (re-)indexed."""
+    def update(self, root_folder_pathname, image_extension = ".fits", parameters_filename = DEFAULT_PARAMETERS_FILENAME):
+        indexed_count = 0
+        for dirpath, dirnames, filenames in os.walk(root_folder_pathname):
+            if any([f.endswith(image_extension) for f in filenames]):
+                indexed_count += self.update_folder(dirpath, image_extension = image_extension, parameters_filename = parameters_filename)
+        return indexed_count
+
+
+    """
+    Bring the catalog up to date with a single run folder.
+
+    Image files which are new, or whose size or modification time differ from those recorded, are (re-)indexed; entries for
+    files which no longer exist are removed. The folder's run parameters file is only re-read if it has changed.
+
+    Returns: The number of image files which were (re-)indexed."""
+    def update_folder(self, folder_pathname, image_extension = ".fits", parameters_filename = DEFAULT_PARAMETERS_FILENAME):
+        folder_pathname = os.path.abspath(folder_pathname)
+        known_stats_dict = {}
+        for pathname, size, mtime in self.connection.execute("SELECT pathname, size, mtime FROM images WHERE folder_pathname = ?",
+                                                            (folder_pathname,)):
+            known_stats_dict[pathname] = (size, mtime)
+        found_pathnames_set = set()
+        indexed_count = 0
+        with self.connection:
+            self._update_folder_run_parameters(folder_pathname, parameters_filename)
+            with os.scandir(folder_pathname) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(image_extension) or not entry.is_file():
+                        continue
+                    found_pathnames_set.add(entry.path)
+                    entry_stat = entry.stat()
+                    if known_stats_dict.get(entry.path) == (entry_stat.st_size, entry_stat.st_mtime):
+                        continue
+                    self._insert_image(entry.path, folder_pathname, entry_stat, image_extension)
+                    indexed_count += 1
+            for pathname in known_stats_dict:
+                if not pathname in found_pathnames_set:
+                    self.connection.execute("DELETE FROM images WHERE pathname = ?", (pathname,))
+        return indexed_count
+
+
+    """
+    Add a single, newly-saved image to the catalog.
+
+    Parameters:
+
+    image_pathname: The path to the image, whose filename follows the runID_datetime_imagename convention.
+
+    run_parameters: (Optional) The run parameters dict for the image's run, as saved in run_params_dump.json. If passed,
+    these are catalogued for the run without re-reading the parameters file.
+    """
+    def add_image(self, image_pathname, run_parameters = None):
+        image_pathname = os.path.abspath(image_pathname)
+        folder_pathname = os.path.dirname(image_pathname)
+        image_extension = os.path.splitext(image_pathname)[1]
+        with self.connection:
+            run_id = self._insert_image(image_pathname, folder_pathname, os.stat(image_pathname), image_extension)
+            if not run_parameters is None and not run_id is None:
+                self._insert_run_parameters(folder_pathname, run_id, run_parameters)
+
+
+    def _insert_image(self, image_pathname, folder_pathname, image_stat, image_extension):
+        run_id, acquisition_datetime, image_type = parse_image_filename(os.path.basename(image_pathname), image_extension = image_extension)
+        acquisition_datetime_string = None if acquisition_datetime is None else acquisition_datetime.strftime(DATETIME_FORMAT_STRING)
+        self.connection.execute("""INSERT OR REPLACE INTO images (pathname, folder_pathname, run_id, acquisition_datetime, image_type, size, mtime)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                                    (image_pathname, folder_pathname, run_id, acquisition_datetime_string, image_type,
+                                    image_stat.st_size, image_stat.st_mtime))
+        return run_id
+
+
+    def _update_folder_run_parameters(self, folder_pathname, parameters_filename):
+        parameters_pathname = os.path.join(folder_pathname, parameters_filename)
+        if not os.path.isfile(parameters_pathname):
+            return
+        parameters_stat = os.stat(parameters_pathname)
+        known_stats_row = self.connection.execute("SELECT mtime, size FROM parameter_files WHERE folder_pathname = ?",
+                                                    (folder_pathname,)).fetchone()
+        if known_stats_row == (parameters_stat.st_mtime, parameters_stat.st_size):
+            return
+        try:
+            with open(parameters_pathname, 'r') as json_file:
+                run_parameters_dump_dict = json.load(json_file)
+        except json.JSONDecodeError:
+            return
+        self.connection.execute("DELETE FROM run_parameters WHERE folder_pathname = ?", (folder_pathname,))
+        for run_id_string in run_parameters_dump_dict:
+            self._insert_run_parameters(folder_pathname, int(run_id_string), run_parameters_dump_dict[run_id_string])
+        self.connection.execute("INSERT OR REPLACE INTO parameter_files (folder_pathname, mtime, size) VALUES (?, ?, ?)",
+                                (folder_pathname, parameters_stat.st_mtime, parameters_stat.st_size))
+
+
+    def _insert_run_parameters(self, folder_pathname, run_id, run_parameters):
+        if "ListBoundVariables" in run_parameters:
+            parameter_names_list = [f for f in run_parameters["ListBoundVariables"] if f in run_parameters]
+        else:
+            parameter_names_list = [f for f in run_parameters if not f in RUN_PARAMETERS_BOOKKEEPING_KEYS]
+        rows_list = []
+        for parameter_name in parameter_names_list:
+            value = run_parameters[parameter_name]
+            numeric_value = value if (isinstance(value, numbers.Real) and not isinstance(value, bool)) else None
+            rows_list.append((folder_pathname, run_id, parameter_name, json.dumps(value), numeric_value))
+        self.connection.executemany("""INSERT OR REPLACE INTO run_parameters (folder_pathname, run_id, key, value, numeric_value)
+                                        VALUES (?, ?, ?, ?, ?)""", rows_list)
+
+
+    """
+    Find catalogued images.
+
+    All parameters are optional filters; images must match every filter passed.
+
+    Parameters:
+
+    run_id: (int) The run id of the image.
+
+    image_type: (str) The image type, i.e. the last part of the filename, e.g. "TopA".
+
+    folder_pathname: The run folder containing the image.
+
+    datetime_range: A list [min_datetime, max_datetime]. Only images acquired between the two, inclusive, are returned.
+
+    parameter_values: A dict {parameter_name:value}. Only images whose run had each parameter equal to the given value are returned.
+    Numeric values compare numerically, so 1 matches 1.0.
+
+    Returns: A list of tuples (run_id, acquisition_datetime, image_type, pathname), sorted by acquisition datetime and image type."""
+    def find_images(self, run_id = None, image_type = None, folder_pathname = None, datetime_range = None, parameter_values = None):
+        query_string = "SELECT run_id, acquisition_datetime, image_type, pathname FROM images WHERE 1"
+        query_params = []
+        if not run_id is None:
+            query_string += " AND run_id = ?"
+            query_params.append(run_id)
+        if not image_type is None:
+            query_string += " AND image_type = ?"
+            query_params.append(image_type)
+        if not folder_pathname is None:
+            query_string += " AND folder_pathname = ?"
+            query_params.append(os.path.abspath(folder_pathname))
+        if not datetime_range is None:
+            range_min, range_max = datetime_range
+            query_string += " AND acquisition_datetime BETWEEN ? AND ?"
+            query_params.extend([range_min.strftime(DATETIME_FORMAT_STRING), range_max.strftime(DATETIME_FORMAT_STRING)])
+        if not parameter_values is None:
+            for parameter_name in parameter_values:
+                value = parameter_values[parameter_name]
+                query_string += """ AND EXISTS (SELECT 1 FROM run_parameters WHERE run_parameters.folder_pathname = images.folder_pathname
+                                    AND run_parameters.run_id = images.run_id AND run_parameters.key = ?"""
+                query_params.append(parameter_name)
+                if isinstance(value, numbers.Real) and not isinstance(value, bool):
+                    query_string += " AND run_parameters.numeric_value = ?)"
+                    query_params.append(value)
+                else:
+                    query_string += " AND run_parameters.value = ?)"
+                    query_params.append(json.dumps(value))
+        query_string += " ORDER BY acquisition_datetime, image_type"
+        images_list = []
+        for image_run_id, acquisition_datetime_string, image_type_string, pathname in self.connection.execute(query_string, query_params):
+            acquisition_datetime = None
+            if not acquisition_datetime_string is None:
+                acquisition_datetime = datetime.datetime.strptime(acquisition_datetime_string, DATETIME_FORMAT_STRING)
+            images_list.append((image_run_id, acquisition_datetime, image_type_string, pathname))
+        return images_list
+
+
+    """
+    Get the catalogued parameters of a run as a dict {parameter_name:value}, or None if the run is not catalogued.
+
+    If folder_pathname is not passed and the run appears in several folders, the first one found is used."""
+    def get_run_parameters(self, run_id, folder_pathname = None):
+        if folder_pathname is None:
+            folder_row = self.connection.execute("SELECT folder_pathname FROM run_parameters WHERE run_id = ? LIMIT 1", (run_id,)).fetchone()
+            if folder_row is None:
+                return None
+            folder_pathname = folder_row[0]
+        else:
+            folder_pathname = os.path.abspath(folder_pathname)
+        run_parameters_dict = {}
+        for key, value_string in self.connection.execute("SELECT key, value FROM run_parameters WHERE folder_pathname = ? AND run_id = ?",
+                                                        (folder_pathname, run_id)):
+            run_parameters_dict[key] = json.loads(value_string)
+        if len(run_parameters_dict) == 0:
+            return None
+        return run_parameters_dict
+
+
+"""
+Parse a filename in the runID_datetime_imagename convention established by the watchdog.
+
+Returns: A tuple (run_id, acquisition_datetime, image_type). run_id is None for unmatched images, and any
+element which cannot be parsed is None."""
+def parse_image_filename(filename, image_extension = ".fits"):
+    if filename.endswith(image_extension):
+        filename = filename[:-len(image_extension)]
+    split_filename_list = filename.split(FILENAME_DELIMITER_CHAR, 2)
+    if len(split_filename_list) != 3:
+        return (None, None, None)
+    run_id_string, datetime_string, image_type = split_filename_list
+    try:
+        run_id = int(run_id_string)
+    except ValueError:
+        run_id = None
+    try:
+        acquisition_datetime = datetime.datetime.strptime(datetime_string, DATETIME_FORMAT_STRING)
+    except ValueError:
+        acquisition_datetime = None
+    return (run_id, acquisition_datetime, image_type)
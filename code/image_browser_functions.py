@@ -0,0 +1,482 @@
+from collections import OrderedDict
+import os
+import threading
+
+from astropy.io import fits
+import numpy as np
+
+
+"""
+Functions and classes supporting the image browser: incremental listing of image folders, partial reads of FITS image 
+stacks, caching of decoded images and of frames derived from them, and fast display of a sequence of large images.
+"""
+
+DEFAULT_CACHE_MAX_NBYTES = 512 * 2**20
+DEFAULT_MAX_DOWNSAMPLE_FACTOR = 8
+
+
+"""
+A least-recently-used cache of numpy arrays, bounded by the total number of bytes held.
+
+Values may be numpy arrays or tuples/lists of them. When adding a value would exceed max_nbytes, the least recently used
+entries are evicted until it fits; a value larger than max_nbytes on its own is not cached. The cache holds read-only views
+of the arrays put in it, since these are shared between all callers which get them; the arrays themselves are left
+writeable, but should not be modified after being cached. The cache may be used from several threads.
+
+Parameters:
+
+max_nbytes: (int) The maximum total size, in bytes, of the cached values.
+"""
+class DecodedFrameCache():
+
+    def __init__(self, max_nbytes = DEFAULT_CACHE_MAX_NBYTES):
+        self.max_nbytes = max_nbytes
+        self.current_nbytes = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self._entries_dict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries_dict)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries_dict
+
+
+    """
+    Get the value cached under key, marking it as most recently used, or default if it is not cached."""
+    def get(self, key, default = None):
+        with self._lock:
+            try:
+                value, value_nbytes = self._entries_dict[key]
+            except KeyError:
+                self.miss_count += 1
+                return default
+            self._entries_dict.move_to_end(key)
+            self.hit_count += 1
+            return value
+
+
+    """
+    Cache value under key, evicting least recently used entries as needed.
+
+    Returns: True if the value was cached, or False if it alone exceeds max_nbytes."""
+    def put(self, key, value):
+        value_nbytes = _get_value_nbytes(value)
+        if value_nbytes > self.max_nbytes:
+            return False
+        value = _get_read_only_view(value)
+        with self._lock:
+            if key in self._entries_dict:
+                old_value, old_value_nbytes = self._entries_dict.pop(key)
+                self.current_nbytes -= old_value_nbytes
+            while self.current_nbytes + value_nbytes > self.max_nbytes:
+                evicted_key, (evicted_value, evicted_value_nbytes) = self._entries_dict.popitem(last = False)
+                self.current_nbytes -= evicted_value_nbytes
+            self._entries_dict[key] = (value, value_nbytes)
+            self.current_nbytes += value_nbytes
+        return True
+
+
+    """
+    Get the value cached under key; if it is not cached, compute it by calling compute_function with no arguments and cache
+    the result.
+
+    The computation is done outside the cache's lock, so that two threads may occasionally compute the same value; the
+    later result then replaces the earlier."""
+    def get_or_compute(self, key, compute_function):
+        value = self.get(key)
+        if value is None:
+            value = compute_function()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries_dict.clear()
+            self.current_nbytes = 0
+
+
+"""
+Get a cache key for data derived from the file at path.
+
+The key includes the file's modification time, so that entries for a file which is overwritten are not returned. Any
+further params, e.g. the frame type and the parameters used in computing a derived frame, are appended to the key and must
+be hashable."""
+def get_file_cache_key(path, *params):
+    return (os.path.abspath(path), os.stat(path).st_mtime_ns) + params
+
+
+def _get_value_nbytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(_get_value_nbytes(v) for v in value)
+    return np.asarray(value).nbytes
+
+def _get_read_only_view(value):
+    if isinstance(value, (tuple, list)):
+        return type(value)(_get_read_only_view(v) for v in value)
+    elif isinstance(value, np.ndarray):
+        value_view = value.view()
+        value_view.flags.writeable = False
+        return value_view
+    return value
+
+
+"""
+Read selected frames from a FITS file holding a stack of frames in its primary HDU, e.g. the (with atoms, without atoms, 
+dark) stacks saved by the image saver.
+
+The primary HDU is memory-mapped, so that only the frames requested - and, if roi is passed, only the rows of those frames 
+within it - are read from disk and converted, rather than the whole stack. The FITS scaling given by BSCALE and BZERO is 
+applied to the frames read; unsigned integer images, stored per the FITS convention as signed integers with an offset BZERO,
+are returned with their unsigned type.
+
+Parameters:
+
+fits_path: (str) The path to the FITS file.
+
+frame_indices: A list of the indices, along the first axis of the stack, of the frames to read.
+
+roi: A list [x_min, y_min, x_max, y_max] of pixel coordinates, with the max values exclusive, as for crop_and_bin_frames in 
+rolling_camera_functions. If None, whole frames are read.
+
+Returns: A list of the frames, as 2D arrays in memory, in the order of frame_indices.
+"""
+def read_fits_frames(fits_path, frame_indices, roi = None):
+    frames_list = []
+    with fits.open(fits_path, memmap = True, do_not_scale_image_data = True) as hdul:
+        primary_hdu = hdul[0]
+        bscale = primary_hdu.header.get("BSCALE", 1)
+        bzero = primary_hdu.header.get("BZERO", 0)
+        raw_data = primary_hdu.data
+        for frame_index in frame_indices:
+            if roi is None:
+                raw_frame = raw_data[frame_index]
+            else:
+                x_min, y_min, x_max, y_max = roi
+                raw_frame = raw_data[frame_index, y_min:y_max, x_min:x_max]
+            frames_list.append(_scale_raw_frame(raw_frame, bscale, bzero))
+        #Release the memory map before the file is closed
+        raw_data = None
+        raw_frame = None
+    return frames_list
+
+def _scale_raw_frame(raw_frame, bscale, bzero):
+    native_dtype = raw_frame.dtype.newbyteorder('=')
+    if bscale == 1 and bzero == 0:
+        return raw_frame.astype(native_dtype)
+    if native_dtype.kind == 'i' and bscale == 1 and bzero == 2**(8 * native_dtype.itemsize - 1):
+        #Offsetting by BZERO is equivalent to flipping the sign bit
+        unsigned_dtype = np.dtype("u{0:d}".format(native_dtype.itemsize))
+        frame = raw_frame.astype(native_dtype).view(unsigned_dtype)
+        frame ^= unsigned_dtype.type(bzero)
+        return frame
+    float_dtype = np.float32 if native_dtype.itemsize <= 2 else np.float64
+    return raw_frame.astype(float_dtype) * float_dtype(bscale) + float_dtype(bzero)
+
+
+"""
+Get selected frames of a FITS stack, reading only those not already in cache and caching them.
+
+Frames are cached individually, keyed on the file as by get_file_cache_key, so that e.g. the dark frame read to display it 
+alone is reused when the full stack is later needed for an OD. Parameters are as for read_fits_frames.
+
+Returns: A list of the frames, in the order of frame_indices. The frames are shared with the cache and read-only."""
+def load_cached_fits_frames(cache, fits_path, frame_indices, roi = None):
+    roi_key = None if roi is None else tuple(roi)
+    file_key = get_file_cache_key(fits_path, "frame", roi_key)
+    frames_list = [cache.get(file_key + (frame_index,)) for frame_index in frame_indices]
+    missing_frame_indices = [frame_index for frame_index, frame in zip(frame_indices, frames_list) if frame is None]
+    if len(missing_frame_indices) > 0:
+        read_frames_dict = dict(zip(missing_frame_indices, read_fits_frames(fits_path, missing_frame_indices, roi = roi)))
+        for frame_index, frame in read_frames_dict.items():
+            cache.put(file_key + (frame_index,), frame)
+        frames_list = [read_frames_dict[frame_index] if frame is None else frame 
+                        for frame_index, frame in zip(frame_indices, frames_list)]
+    return frames_list
+
+
+"""
+Build a multi-resolution pyramid of a frame, for displaying large frames quickly when zoomed out.
+
+Each level halves the resolution of the one before by averaging blocks of 2 x 2 pixels, discarding a last row or column 
+which does not fill a block. Levels are computed in float32, which is ample for display.
+
+Parameters:
+
+frame: A 2D array.
+
+max_downsample_factor: (int) The downsampling factor of the coarsest level, a power of 2. Coarser levels are not built 
+once a level would be less than 2 pixels along an axis.
+
+Returns: A tuple of the downsampled levels, for factors 2, 4, ... up to max_downsample_factor; the frame itself, at factor 
+1, is not included.
+"""
+def build_image_pyramid(frame, max_downsample_factor = DEFAULT_MAX_DOWNSAMPLE_FACTOR):
+    levels_list = []
+    level = frame
+    downsample_factor = 2
+    while downsample_factor <= max_downsample_factor and min(level.shape) >= 4:
+        level_height, level_width = level.shape[0] // 2, level.shape[1] // 2
+        blocks = level[:2 * level_height, :2 * level_width].reshape((level_height, 2, level_width, 2))
+        level = blocks.mean(axis = (1, 3), dtype = np.float32)
+        levels_list.append(level)
+        downsample_factor *= 2
+    return tuple(levels_list)
+
+
+"""
+Choose the level of an image pyramid to display: the coarsest level whose pixels are no larger than the screen pixels 
+over which the current view is drawn, so that no detail visible on screen is lost.
+
+Parameters:
+
+view_data_width, view_data_height: The width and height of the view, in full-resolution image pixels.
+
+view_screen_width, view_screen_height: The width and height, in screen pixels, of the area in which the view is drawn.
+
+level_count: The number of levels, counting the full-resolution image as level 0.
+
+Returns: The index of the level, whose downsampling factor is 2**index."""
+def choose_pyramid_level(view_data_width, view_data_height, view_screen_width, view_screen_height, level_count):
+    if view_screen_width <= 0 or view_screen_height <= 0:
+        return 0
+    data_pixels_per_screen_pixel = min(view_data_width / view_screen_width, view_data_height / view_screen_height)
+    level_index = 0
+    while level_index + 1 < level_count and 2**(level_index + 1) <= data_pixels_per_screen_pixel:
+        level_index += 1
+    return level_index
+
+
+"""
+A matplotlib axes showing one image at a time, for viewers which switch between images often.
+
+Rather than clearing and redrawing the axes for each image, a single AxesImage is kept and updated in place with set_data 
+and set_clim; it is recreated only when the shape of the image changes. Overlays drawn on top of the image, such as ROI 
+outlines, can be removed with clear_overlays.
+
+If the downsampled levels of an image pyramid are passed with an image, the level drawn follows the axis limits and the size
+of the axes on screen, as given by choose_pyramid_level, so that zooming out and panning over large images stays fluid. The
+levels are drawn with the extent of the full image, so that data coordinates are always full-resolution pixels.
+
+Parameters:
+
+ax: The matplotlib axes in which to show the images.
+
+cmap: The colormap used for the images.
+"""
+class PersistentImageView():
+
+    def __init__(self, ax, cmap = 'gray'):
+        self.ax = ax 
+        self.cmap = cmap 
+        self.axes_image = None
+        self.frame_shape = None
+        self.level_index = 0
+        self._pyramid_levels_list = []
+        self.ax.callbacks.connect('xlim_changed', self._update_level)
+        self.ax.callbacks.connect('ylim_changed', self._update_level)
+        self.ax.figure.canvas.mpl_connect('resize_event', self._update_level)
+
+
+    """
+    Show frame, scaled so that vmin and vmax are the ends of the colormap. downsampled_frames, if passed, are the levels of 
+    frame's pyramid, as returned by build_image_pyramid.
+
+    Returns: True if the frame's shape differs from that of the previous frame, in which case the axis limits are reset to 
+    show the whole frame, or False if the previous image was updated in place and the axis limits kept."""
+    def show_frame(self, frame, vmin, vmax, downsampled_frames = ()):
+        self._pyramid_levels_list = [frame] + list(downsampled_frames)
+        if not self.axes_image is None and self.frame_shape == frame.shape:
+            self.level_index = self._choose_level_index()
+            self._set_level_data()
+            self.axes_image.set_clim(vmin, vmax)
+            return False
+        if not self.axes_image is None:
+            self.axes_image.remove()
+            self.axes_image = None
+        self.frame_shape = frame.shape
+        self.level_index = 0
+        self.axes_image = self.ax.imshow(frame, cmap = self.cmap, vmin = vmin, vmax = vmax)
+        #Resetting the view chooses the level
+        self.reset_view()
+        return True
+
+    """
+    Set the axis limits to show the whole of the current image."""
+    def reset_view(self):
+        if self.axes_image is None:
+            return
+        frame_height, frame_width = self.frame_shape
+        self.ax.set_xlim([0, frame_width])
+        self.ax.set_ylim([0, frame_height])
+
+
+    """
+    Remove all lines and patches drawn on the axes, leaving the image."""
+    def clear_overlays(self):
+        for artist in list(self.ax.lines) + list(self.ax.patches):
+            artist.remove()
+
+    def _choose_level_index(self):
+        x_min, x_max = self.ax.get_xlim()
+        y_min, y_max = self.ax.get_ylim()
+        axes_bbox = self.ax.get_window_extent()
+        return choose_pyramid_level(abs(x_max - x_min), abs(y_max - y_min), axes_bbox.width, axes_bbox.height, 
+                                    len(self._pyramid_levels_list))
+
+    def _set_level_data(self):
+        level_frame = self._pyramid_levels_list[self.level_index]
+        downsample_factor = 2**self.level_index
+        #A level covers only the whole blocks of the full frame
+        covered_height = level_frame.shape[0] * downsample_factor
+        covered_width = level_frame.shape[1] * downsample_factor
+        self.axes_image.set_data(level_frame)
+        self.axes_image.set_extent((-0.5, covered_width - 0.5, covered_height - 0.5, -0.5))
+
+    def _update_level(self, *args):
+        if self.axes_image is None:
+            return
+        level_index = self._choose_level_index()
+        if level_index != self.level_index:
+            self.level_index = level_index
+            self._set_level_data()
+
+
+"""
+Loads items on a background thread ahead of their use, e.g. the files next to the one being viewed in a browser.
+
+Each call to prefetch replaces any items still pending from the previous call, so that after a quick series of calls only 
+the items wanted most recently are loaded. Items are loaded in the order given by calling load_function(item), which is 
+expected to store its result somewhere shared, such as a DecodedFrameCache; return values are discarded. Items which raise 
+are skipped and counted in failed_load_count.
+
+Parameters:
+
+load_function: The function called with each item to load it.
+"""
+class FramePrefetcher():
+
+    def __init__(self, load_function):
+        self.load_function = load_function
+        self.completed_load_count = 0
+        self.failed_load_count = 0
+        self._pending_items_list = []
+        self._is_loading = False
+        self._is_closed = False
+        self._condition = threading.Condition()
+        self._worker_thread = threading.Thread(target = self._load_items, daemon = True)
+        self._worker_thread.start()
+
+    def __enter__(self):
+        return self 
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    """
+    Discard any pending items and stop the worker thread once the item being loaded, if any, is done."""
+    def close(self):
+        with self._condition:
+            self._pending_items_list = []
+            self._is_closed = True
+            self._condition.notify_all()
+        self._worker_thread.join()
+
+
+    """
+    Replace the pending items with items_list, nearest-needed first."""
+    def prefetch(self, items_list):
+        with self._condition:
+            self._pending_items_list = list(items_list)
+            self._condition.notify_all()
+
+
+    """
+    Wait until no items are pending or being loaded, for up to timeout seconds if specified. Returns True if the 
+    prefetcher is idle."""
+    def wait_until_idle(self, timeout = None):
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._is_loading and len(self._pending_items_list) == 0, 
+                                            timeout = timeout)
+
+    def _load_items(self):
+        while True:
+            with self._condition:
+                self._is_loading = False
+                self._condition.notify_all()
+                self._condition.wait_for(lambda: self._is_closed or len(self._pending_items_list) > 0)
+                if self._is_closed:
+                    return
+                item = self._pending_items_list.pop(0)
+                self._is_loading = True
+            try:
+                self.load_function(item)
+            except Exception:
+                with self._condition:
+                    self.failed_load_count += 1
+            else:
+                with self._condition:
+                    self.completed_load_count += 1
+
+
+"""
+Get the items of items_list within count places either side of index, nearest first and alternating between the following 
+and preceding items."""
+def get_neighbouring_items(items_list, index, count):
+    neighbouring_items_list = []
+    for offset in range(1, count + 1):
+        if index + offset < len(items_list):
+            neighbouring_items_list.append(items_list[index + offset])
+        if index - offset >= 0:
+            neighbouring_items_list.append(items_list[index - offset])
+    return neighbouring_items_list
+
+
+"""
+Lists the image files in a folder incrementally, for a browser which polls a folder receiving new images.
+
+Each call to scan lists the folder once with os.scandir and compares the names found against a set of those already seen, 
+so that the work done with the result - e.g. adding rows to a table - is proportional to the number of files added or 
+removed since the previous scan rather than to the number of files in the folder.
+
+Parameters:
+
+folder_path: (str) The folder to scan.
+
+image_extension: (str) The extension of the files to list.
+"""
+class IncrementalFolderScanner():
+
+    def __init__(self, folder_path, image_extension = ".fits"):
+        self.folder_path = folder_path 
+        self.image_extension = image_extension
+        self.file_names_list = []
+        self._seen_names_set = set()
+        self._lock = threading.Lock()
+
+
+    """
+    List the folder, updating file_names_list, which holds the names of all files found, in the order in which they were 
+    found; names found in the same scan are sorted.
+
+    Returns: A tuple (added_names_list, removed_names_list) of the names found and the names no longer present since the 
+    previous scan."""
+    def scan(self):
+        found_names_set = set()
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.name.endswith(self.image_extension) or not entry.is_file():
+                    continue
+                found_names_set.add(entry.name)
+        with self._lock:
+            added_names_list = sorted(found_names_set - self._seen_names_set)
+            removed_names_set = self._seen_names_set - found_names_set
+            if len(removed_names_set) > 0:
+                self.file_names_list = [name for name in self.file_names_list if not name in removed_names_set]
+            self.file_names_list.extend(added_names_list)
+            self._seen_names_set = found_names_set
+        return (added_names_list, sorted(removed_names_set))
@@ -37,11 +37,14 @@ class ImageWatchdog():
 
     image_extension: The file extension of the images. Default is ".fits"
 
+    dataset_catalog: (Optional) A DatasetCatalog. If passed, each image is added to the catalog, together with its run parameters, 
+        as it is saved.
+
     Remark: No separator should be at the end of directory pathnames.
     
     """
     def __init__(self, watchfolder_path, savefolder_path, image_names_list, breadboard_mismatch_tolerance = 5.0, image_extension = ".fits", 
-                experiment_parameters_pathname = None, parameters_filename = "run_params_dump.json"):
+                experiment_parameters_pathname = None, parameters_filename = "run_params_dump.json", dataset_catalog = None):
         self.image_names_list = image_names_list
         self.watchfolder_path = watchfolder_path
         self.savefolder_path = savefolder_path
@@ -53,6 +56,7 @@ class ImageWatchdog():
         self.breadboard_mismatch_tolerance = breadboard_mismatch_tolerance
         self.bc = breadboard_functions.load_breadboard_client()
         self.image_extension = image_extension
+        self.dataset_catalog = dataset_catalog
         experiment_parameters_filename = os.path.join(self.savefolder_path, "experiment_parameters.json")
         with open(experiment_parameters_filename, 'w') as experiment_parameters_file:
             experiment_parameters = loading_functions.load_experiment_parameters_from_central_folder(experiment_parameters_pathname)
@@ -109,21 +113,25 @@ class ImageWatchdog():
                     new_pathname = os.path.join(self.savefolder_path, labelled_filename)
                     new_pathname_temp = os.path.join(self.savefolder_path, labelled_temp_filename)
                     self.parameters_dict[run_id] = run_parameters
+                    catalog_run_parameters = run_parameters
                 else:
                     labelled_filename = "unmatched" + FILENAME_DELIMITER_CHAR + same_timestamp_filename
                     labelled_temp_filename = labelled_filename + TEMP_FILE_MARKER
                     new_pathname = os.path.join(self.no_id_folder_path, labelled_filename)
                     new_pathname_temp = os.path.join(self.no_id_folder_path, labelled_temp_filename)
-                move_list.append((original_pathname, new_pathname, new_pathname_temp))
+                    catalog_run_parameters = None
+                move_list.append((original_pathname, new_pathname, new_pathname_temp, catalog_run_parameters))
         #Save run parameters FIRST to avoid a race condition with live analysis...
         if(labeled_image_bool):
             self.save_run_parameters()
         for pathname_tuple in move_list:
-            original_pathname, new_pathname, new_pathname_temp = pathname_tuple
+            original_pathname, new_pathname, new_pathname_temp, catalog_run_parameters = pathname_tuple
             #Use shutil instead of os.rename to allow copying across drives
             #Break down the move into a slow save into a temporary file, plus a quick rename once the saving is done
             shutil.move(original_pathname, new_pathname_temp)
             os.rename(new_pathname_temp, new_pathname)
+            if not self.dataset_catalog is None:
+                self.dataset_catalog.add_image(new_pathname, run_parameters = catalog_run_parameters)
         return labeled_image_bool
 
     def save_run_parameters(self):
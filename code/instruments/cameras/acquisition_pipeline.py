@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+
+
+"""
+A chain of processing stages, each run by its own worker threads and fed by its own bounded queue.
+
+Items are submitted to the first stage with submit. Each stage calls its function on an item and passes the return value on
+to the next stage; a stage may return None to drop an item, and the return values of the last stage are discarded. Stages
+are configured as a list of tuples (stage_name, stage_function, num_workers).
+
+Back-pressure is applied predictably: a stage whose output queue is full waits for the next stage, so that a slow stage
+fills the queues upstream of it in turn. When the first queue is full, submit returns False at once rather than blocking,
+and the item is counted in rejected_item_count; the caller - typically an acquisition loop, which must keep draining the
+camera - can then report the loss. An exception in a stage function drops the item, which is recorded with the exception
+in failed_items_list, and does not stop the pipeline.
+
+Per-stage timing and queue occupancy are available from get_stats.
+
+Parameters:
+
+stages_list: A list of tuples (stage_name, stage_function, num_workers), in order.
+
+max_queued_items: (int) The length of the queue in front of each stage.
+"""
+class AcquisitionPipeline():
+
+    def __init__(self, stages_list, max_queued_items = 4):
+        self.stages_list = [_PipelineStage(stage_name, stage_function, num_workers, max_queued_items)
+                            for stage_name, stage_function, num_workers in stages_list]
+        self.rejected_item_count = 0
+        self.failed_items_list = []
+        self._failures_lock = threading.Lock()
+        for stage_index, stage in enumerate(self.stages_list):
+            next_stage = self.stages_list[stage_index + 1] if stage_index + 1 < len(self.stages_list) else None
+            stage.start(next_stage, self._record_failure)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    """
+    Wait for all submitted items to pass through every stage, then stop the worker threads."""
+    def close(self):
+        first_stage = self.stages_list[0]
+        for i in range(first_stage.num_workers):
+            first_stage.input_queue.put(_STOP_SIGNAL)
+        for stage in self.stages_list:
+            stage.join()
+
+
+    """
+    Submit an item to the first stage. Returns True if it was queued, or False, without blocking, if the first queue was
+    full."""
+    def submit(self, item):
+        if not self.stages_list[0].put(item, block = False):
+            self.rejected_item_count += 1
+            return False
+        return True
+
+
+    """
+    Get a dict of statistics, with the number of items rejected at submission under "items_rejected" and, for each stage,
+    a dict under its name with the numbers of items processed and failed, the mean and maximum time taken by the stage
+    function, the total time spent waiting for space in the next stage's queue, and the current and largest number of
+    items queued in front of the stage."""
+    def get_stats(self):
+        stats_dict = {"items_rejected":self.rejected_item_count}
+        for stage in self.stages_list:
+            stats_dict[stage.name] = stage.get_stats()
+        return stats_dict
+
+    def _record_failure(self, stage_name, item, e):
+        with self._failures_lock:
+            self.failed_items_list.append((stage_name, item, e))
+
+
+_STOP_SIGNAL = object()
+
+
+class _PipelineStage():
+
+    def __init__(self, name, function, num_workers, max_queued_items):
+        self.name = name
+        self.function = function
+        self.num_workers = num_workers
+        self.input_queue = queue.Queue(maxsize = max_queued_items)
+        self.processed_item_count = 0
+        self.failed_item_count = 0
+        self.total_processing_time = 0.0
+        self.max_processing_time = 0.0
+        self.total_blocked_time = 0.0
+        self.max_queued_item_count = 0
+        self._stats_lock = threading.Lock()
+        self._running_worker_count = num_workers
+        self._worker_threads_list = []
+
+    def start(self, next_stage, failure_callback):
+        self._next_stage = next_stage
+        self._failure_callback = failure_callback
+        for i in range(self.num_workers):
+            worker_thread = threading.Thread(target = self._process_items, daemon = True)
+            worker_thread.start()
+            self._worker_threads_list.append(worker_thread)
+
+    def join(self):
+        for worker_thread in self._worker_threads_list:
+            worker_thread.join()
+
+    def put(self, item, block = True):
+        try:
+            self.input_queue.put(item, block = block)
+        except queue.Full:
+            return False
+        with self._stats_lock:
+            self.max_queued_item_count = max(self.max_queued_item_count, self.input_queue.qsize())
+        return True
+
+    def get_stats(self):
+        with self._stats_lock:
+            mean_processing_time = self.total_processing_time / self.processed_item_count if self.processed_item_count > 0 else None
+            return {"items_processed":self.processed_item_count, "items_failed":self.failed_item_count,
+                    "processing_mean_secs":mean_processing_time, "processing_max_secs":self.max_processing_time,
+                    "blocked_total_secs":self.total_blocked_time, "queued_items":self.input_queue.qsize(),
+                    "max_queued_items":self.max_queued_item_count}
+
+    def _process_items(self):
+        while True:
+            item = self.input_queue.get()
+            if item is _STOP_SIGNAL:
+                self._stop_worker()
+                return
+            processing_start_time = time.perf_counter()
+            try:
+                output_item = self.function(item)
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed_item_count += 1
+                self._failure_callback(self.name, item, e)
+                continue
+            processing_time = time.perf_counter() - processing_start_time
+            with self._stats_lock:
+                self.processed_item_count += 1
+                self.total_processing_time += processing_time
+                self.max_processing_time = max(self.max_processing_time, processing_time)
+            if not output_item is None and not self._next_stage is None:
+                blocked_start_time = time.perf_counter()
+                self._next_stage.put(output_item)
+                with self._stats_lock:
+                    self.total_blocked_time += time.perf_counter() - blocked_start_time
+
+    #When the last worker of a stage stops, every worker of the next stage is signalled to stop, after all queued items
+    def _stop_worker(self):
+        with self._stats_lock:
+            self._running_worker_count -= 1
+            is_last_worker = self._running_worker_count == 0
+        if is_last_worker and not self._next_stage is None:
+            for i in range(self._next_stage.num_workers):
+                self._next_stage.put(_STOP_SIGNAL)
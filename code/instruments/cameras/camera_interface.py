@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 """
 Abstract class for standardizing calls to cameras."""
 class Camera(ABC):
@@ -37,6 +39,18 @@ class Camera(ABC):
         pass
 
 
+    """
+    Set several properties at once, given as a dict {key:value}. Implementations may reorder the writes where the camera 
+    requires it, and skip writes which would not change a property's value. By default, set_property is called for each 
+    key in order.
+    
+    Returns: A list of the keys which were written."""
+    def apply_properties(self, properties_dict):
+        for key in properties_dict:
+            self.set_property(key, properties_dict[key])
+        return list(properties_dict)
+
+
 
     """
     When accessed, provides a read-only list of available property names which could be passed as keys 
@@ -126,3 +140,148 @@ class Camera(ABC):
         pass 
 
 
+    """
+    Register a callable to be invoked, with the camera as its only argument, each time a frame is added to the video 
+    buffer. Callbacks may run on a driver thread and should return quickly. Cameras which cannot notify of new frames 
+    need not override this."""
+    def add_video_frame_callback(self, callback):
+        raise NotImplementedError("This camera does not support video frame callbacks.")
+
+    """
+    Unregister a callable registered with add_video_frame_callback."""
+    def remove_video_frame_callback(self, callback):
+        raise NotImplementedError("This camera does not support video frame callbacks.")
+
+    """
+    Return a dict of health counters for video mode, e.g. the numbers of frames received and of frames dropped because the 
+    video buffer was full. Implementations using VideoFrameBuffer should return its get_stats(), together with 
+    the statistics of a FrameHandlingLatencyStats timing the driver's frame handler."""
+    def get_video_stats(self):
+        raise NotImplementedError("This camera does not report video statistics.")
+
+
+
+"""
+Single-producer, single-consumer video frame buffer for use by Camera implementations.
+
+Frames are copied into a preallocated (buffer_length, *frame_shape) array. The producer - typically a driver callback - 
+calls append, and the consumer - the code calling the camera's video methods - calls pop_frame, flush and len. Every frame 
+is given a sequence number, counting from 0 at construction, and may carry the camera's hardware timestamp (in seconds) 
+and frame id, which are stored alongside it. The producer only ever writes _write_sequence, and the consumer 
+only ever writes _read_sequence, so no lock is required on either side.
+
+When the buffer is full, append overwrites the oldest frame. The consumer detects this from the sequence numbers, skips 
+the overwritten frames, and counts them in overrun_count. A frame which is overwritten while the consumer is copying it is 
+likewise discarded rather than returned torn.
+
+Remark: Views returned with copy = False are only valid until buffer_length further frames have been appended."""
+class VideoFrameBuffer():
+
+    def __init__(self, buffer_length, frame_shape, frame_dtype):
+        self.buffer_length = buffer_length
+        self.frames_array = np.zeros((buffer_length, *frame_shape), dtype = frame_dtype)
+        self.timestamps_array = np.full(buffer_length, np.nan)
+        self.frame_ids_array = np.full(buffer_length, -1, dtype = np.int64)
+        #Written only by the producer. _claimed_sequence is advanced before a slot is written, _write_sequence after.
+        self._claimed_sequence = 0
+        self._write_sequence = 0
+        #Written only by the consumer
+        self._read_sequence = 0
+        self.overrun_count = 0
+        #Written only by the producer
+        self.high_water_mark = 0
+
+    def __len__(self):
+        return min(self._write_sequence - self._read_sequence, self.buffer_length)
+
+    """
+    Producer side: copy frame_array, with its optional hardware timestamp in seconds and frame id, into the buffer."""
+    def append(self, frame_array, timestamp = None, frame_id = None):
+        write_sequence = self._write_sequence
+        write_index = write_sequence % self.buffer_length
+        self._claimed_sequence = write_sequence + 1
+        np.copyto(self.frames_array[write_index], frame_array, casting = "unsafe")
+        self.timestamps_array[write_index] = np.nan if timestamp is None else timestamp 
+        self.frame_ids_array[write_index] = -1 if frame_id is None else frame_id
+        self._write_sequence = write_sequence + 1
+        num_buffered_frames = min(write_sequence + 1 - self._read_sequence, self.buffer_length)
+        if num_buffered_frames > self.high_water_mark:
+            self.high_water_mark = num_buffered_frames
+
+    """
+    Consumer side: pop a frame, or return None if the buffer is empty.
+
+    If recency is "oldest", the oldest frame is returned. If "newest", the newest frame is returned and all older frames 
+    are discarded.
+
+    If return_metadata is True, a tuple (frame, metadata) is returned instead of the frame, where metadata is a dict with keys 
+    "sequence_number", "timestamp" and "frame_id"; the latter two are None if they were not supplied to append."""
+    def pop_frame(self, recency = "oldest", copy = True, return_metadata = False):
+        while True:
+            write_sequence = self._write_sequence
+            if recency == "oldest":
+                oldest_valid_sequence = write_sequence - self.buffer_length 
+                if self._read_sequence < oldest_valid_sequence:
+                    self.overrun_count += oldest_valid_sequence - self._read_sequence
+                    self._read_sequence = oldest_valid_sequence
+                sequence_number = self._read_sequence
+            elif recency == "newest":
+                sequence_number = write_sequence - 1
+            else:
+                raise ValueError("Recency flag not recognized")
+            if sequence_number < self._read_sequence or sequence_number >= write_sequence:
+                return None
+            read_index = sequence_number % self.buffer_length
+            frame_view = self.frames_array[read_index]
+            frame = frame_view.copy() if copy else frame_view
+            timestamp = self.timestamps_array[read_index]
+            frame_id = self.frame_ids_array[read_index]
+            #Check that the producer did not begin overwriting the slot while it was being read
+            if sequence_number < self._claimed_sequence - self.buffer_length:
+                continue
+            self._read_sequence = sequence_number + 1
+            if return_metadata:
+                metadata = {"sequence_number":sequence_number, 
+                            "timestamp":None if np.isnan(timestamp) else float(timestamp), 
+                            "frame_id":None if frame_id < 0 else int(frame_id)}
+                return (frame, metadata)
+            return frame
+
+    """
+    Consumer side: discard all frames currently in the buffer."""
+    def flush(self):
+        self._read_sequence = self._write_sequence
+
+    """
+    The sequence number which will be assigned to the next appended frame, i.e. the total number of frames appended."""
+    @property 
+    def next_sequence_number(self):
+        return self._write_sequence
+
+    """
+    Return a dict of the buffer's health counters: the number of frames received (i.e. appended), the number dropped 
+    because the buffer was full when they were due to be read, and the largest number of frames ever held at once."""
+    def get_stats(self):
+        return {"frames_received":self._write_sequence, "frames_dropped_on_overflow":self.overrun_count, 
+                "buffer_high_water_mark":self.high_water_mark, "buffer_length":self.buffer_length}
+
+
+"""
+Running statistics of the time taken by a camera's frame handler - copying a frame into the video buffer and running the 
+video frame callbacks - which, if too slow, holds up the driver. Updated only by the thread running the handler."""
+class FrameHandlingLatencyStats():
+
+    def __init__(self):
+        self.count = 0 
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add(self, latency):
+        self.count += 1 
+        self.total_latency += latency 
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def get_stats(self):
+        mean_latency = self.total_latency / self.count if self.count > 0 else None
+        return {"callback_latency_mean_secs":mean_latency, "callback_latency_max_secs":self.max_latency}
@@ -0,0 +1,228 @@
+from multiprocessing import resource_tracker, shared_memory
+import time
+
+import numpy as np
+
+
+"""
+Broadcast of camera frames between processes through shared memory.
+
+A FrameBroadcastPublisher, owned by the process acquiring from a camera, creates a named shared memory block holding a ring
+of frame slots. Any number of FrameBroadcastSubscribers, in viewer or live analysis processes, attach to the block by name and
+read the newest frame without copying it and without any communication with the publisher.
+
+The block begins with a global header giving the sequence number of the most recently published frame, the number of slots,
+and the size of each slot's data area. Each slot then has a header holding the frame's sequence number, timestamp, shape and
+dtype, followed by the frame data. The slot header stores the sequence number twice, once written before the frame data and
+once after, so that a reader can detect a slot which was overwritten while it was being read.
+"""
+
+GLOBAL_HEADER_DTYPE = np.dtype([("latest_sequence", "<u8"), ("slot_count", "<u8"), ("slot_data_nbytes", "<u8")])
+SLOT_HEADER_DTYPE = np.dtype([("sequence_start", "<u8"), ("sequence_end", "<u8"), ("timestamp", "<f8"), ("ndim", "<u8"),
+                            ("shape", "<u8", (4,)), ("dtype", "S8")])
+#Data areas are aligned for efficient copies
+DATA_ALIGNMENT_BYTES = 64
+
+
+def _get_layout(slot_count, slot_data_nbytes):
+    slot_headers_offset = GLOBAL_HEADER_DTYPE.itemsize
+    data_offset = _align(slot_headers_offset + slot_count * SLOT_HEADER_DTYPE.itemsize)
+    aligned_slot_data_nbytes = _align(slot_data_nbytes)
+    total_nbytes = data_offset + slot_count * aligned_slot_data_nbytes
+    return (slot_headers_offset, data_offset, aligned_slot_data_nbytes, total_nbytes)
+
+def _align(nbytes):
+    return -(-nbytes // DATA_ALIGNMENT_BYTES) * DATA_ALIGNMENT_BYTES
+
+
+"""
+Publishes frames into a shared memory ring.
+
+Publishing never blocks on subscribers: each frame simply overwrites the oldest slot.
+
+Parameters:
+
+name: (str) The name of the shared memory block, by which subscribers attach to it.
+
+max_frame_nbytes: (int) The size, in bytes, of the largest frame which will be published, e.g. height * width * 2 for
+uint16 frames.
+
+slot_count: (int) The number of frames held in the ring. A subscriber holding a zero-copy view of a frame has until
+slot_count - 1 further frames are published before the view is overwritten.
+"""
+class FrameBroadcastPublisher():
+
+    def __init__(self, name, max_frame_nbytes, slot_count = 4):
+        self.slot_count = slot_count
+        slot_headers_offset, data_offset, slot_data_nbytes, total_nbytes = _get_layout(slot_count, max_frame_nbytes)
+        self.slot_data_nbytes = slot_data_nbytes
+        self.shared_memory = shared_memory.SharedMemory(name = name, create = True, size = total_nbytes)
+        self.name = self.shared_memory.name
+        self._global_header = np.ndarray((), dtype = GLOBAL_HEADER_DTYPE, buffer = self.shared_memory.buf)
+        self._slot_headers = np.ndarray((slot_count,), dtype = SLOT_HEADER_DTYPE, buffer = self.shared_memory.buf,
+                                        offset = slot_headers_offset)
+        self._slot_data = np.ndarray((slot_count, slot_data_nbytes), dtype = np.uint8, buffer = self.shared_memory.buf,
+                                    offset = data_offset)
+        self._slot_headers[:] = np.zeros(slot_count, dtype = SLOT_HEADER_DTYPE)
+        self._global_header["slot_count"] = slot_count
+        self._global_header["slot_data_nbytes"] = slot_data_nbytes
+        self._global_header["latest_sequence"] = 0
+        self._sequence_number = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    """
+    Close and remove the shared memory block. Attached subscribers keep their mapping until they close."""
+    def close(self):
+        #Views into the buffer must be released before it can be closed
+        self._global_header = None
+        self._slot_headers = None
+        self._slot_data = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+    """
+    Publish a frame, with an optional timestamp in seconds; if None, the current time.time() is used.
+
+    Returns: The sequence number of the published frame. Sequence numbers start at 1."""
+    def publish(self, frame, timestamp = None):
+        frame = np.asarray(frame)
+        if frame.nbytes > self.slot_data_nbytes:
+            raise ValueError("Frame of {0:d} bytes exceeds the broadcast slot size of {1:d} bytes.".format(frame.nbytes, self.slot_data_nbytes))
+        if frame.ndim > 4:
+            raise ValueError("Frames of more than 4 dimensions are not supported.")
+        sequence_number = self._sequence_number + 1
+        slot_index = sequence_number % self.slot_count
+        slot_header = self._slot_headers[slot_index]
+        slot_header["sequence_start"] = sequence_number
+        slot_header["timestamp"] = time.time() if timestamp is None else timestamp
+        slot_header["ndim"] = frame.ndim
+        slot_header["shape"] = tuple(frame.shape) + (0,) * (4 - frame.ndim)
+        slot_header["dtype"] = frame.dtype.str.encode()
+        slot_data_view = self._slot_data[slot_index, :frame.nbytes].view(frame.dtype).reshape(frame.shape)
+        np.copyto(slot_data_view, frame)
+        slot_header["sequence_end"] = sequence_number
+        self._global_header["latest_sequence"] = sequence_number
+        self._sequence_number = sequence_number
+        return sequence_number
+
+
+"""
+Reads frames published by a FrameBroadcastPublisher.
+
+Frames are read newest-first: frames published between two reads are skipped rather than queued, so that a slow viewer
+always shows the latest frame. The number of frames skipped in this way is kept in dropped_frame_count.
+
+Parameters:
+
+name: (str) The name of the publisher's shared memory block.
+"""
+class FrameBroadcastSubscriber():
+
+    def __init__(self, name):
+        self.shared_memory = _attach_shared_memory(name)
+        self._global_header = np.ndarray((), dtype = GLOBAL_HEADER_DTYPE, buffer = self.shared_memory.buf)
+        slot_count = int(self._global_header["slot_count"])
+        slot_headers_offset, data_offset, slot_data_nbytes, total_nbytes = _get_layout(slot_count, int(self._global_header["slot_data_nbytes"]))
+        self.slot_count = slot_count
+        self._slot_headers = np.ndarray((slot_count,), dtype = SLOT_HEADER_DTYPE, buffer = self.shared_memory.buf,
+                                        offset = slot_headers_offset)
+        self._slot_data = np.ndarray((slot_count, slot_data_nbytes), dtype = np.uint8, buffer = self.shared_memory.buf,
+                                    offset = data_offset)
+        self.last_sequence_number = 0
+        self.dropped_frame_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    """
+    Detach from the shared memory block. Any zero-copy frames previously returned must no longer be in use."""
+    def close(self):
+        self._global_header = None
+        self._slot_headers = None
+        self._slot_data = None
+        self.shared_memory.close()
+
+
+    """
+    Get the newest published frame, or None if no frame has been published since the last call.
+
+    If copy is False, the frame is a read-only view into shared memory rather than a copy. It remains valid until the
+    publisher reuses its slot, i.e. for slot_count - 1 further frames; is_frame_current can be used to check that it was
+    not overwritten while in use.
+
+    If return_metadata is True, a tuple (frame, metadata) is returned instead of the frame, where metadata is a dict with keys
+    "sequence_number" and "timestamp"."""
+    def get_newest_frame(self, copy = False, return_metadata = False):
+        while True:
+            latest_sequence = int(self._global_header["latest_sequence"])
+            if latest_sequence <= self.last_sequence_number:
+                return None
+            slot_index = latest_sequence % self.slot_count
+            slot_header = self._slot_headers[slot_index]
+            if int(slot_header["sequence_end"]) != latest_sequence:
+                #Overwritten since the global header was read; retry with the new latest frame
+                continue
+            timestamp = float(slot_header["timestamp"])
+            ndim = int(slot_header["ndim"])
+            frame_shape = tuple(int(n) for n in slot_header["shape"][:ndim])
+            frame_dtype = np.dtype(slot_header["dtype"].decode())
+            frame_nbytes = int(np.prod(frame_shape)) * frame_dtype.itemsize
+            frame = self._slot_data[slot_index, :frame_nbytes].view(frame_dtype).reshape(frame_shape)
+            if copy:
+                frame = frame.copy()
+            else:
+                frame.flags.writeable = False
+            if int(slot_header["sequence_start"]) != latest_sequence:
+                continue
+            if self.last_sequence_number > 0:
+                self.dropped_frame_count += latest_sequence - self.last_sequence_number - 1
+            self.last_sequence_number = latest_sequence
+            if return_metadata:
+                return (frame, {"sequence_number":latest_sequence, "timestamp":timestamp})
+            else:
+                return frame
+
+    """
+    Check whether the slot holding the frame with a given sequence number has not since been reused by the publisher."""
+    def is_frame_current(self, sequence_number):
+        slot_header = self._slot_headers[sequence_number % self.slot_count]
+        return int(slot_header["sequence_start"]) == sequence_number
+
+
+    """
+    Block until a new frame is published, polling every poll_interval seconds, for up to timeout seconds (indefinitely if
+    None). Returns the frame as get_newest_frame, or None on timeout."""
+    def wait_for_newest_frame(self, timeout = None, poll_interval = 0.005, copy = False, return_metadata = False):
+        start_time = time.monotonic()
+        while True:
+            frame = self.get_newest_frame(copy = copy, return_metadata = return_metadata)
+            if not frame is None:
+                return frame
+            if not timeout is None and time.monotonic() - start_time > timeout:
+                return None
+            time.sleep(poll_interval)
+
+
+def _attach_shared_memory(name):
+    try:
+        #Python 3.13+: don't let this process's resource tracker unlink the publisher's block on exit
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        pass
+    #Older versions always register the block; skip registration rather than unregistering afterwards, which would also 
+    #remove the publisher's registration if both processes share a resource tracker
+    original_register_function = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name = name)
+    finally:
+        resource_tracker.register = original_register_function
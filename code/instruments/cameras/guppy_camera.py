@@ -1,4 +1,4 @@
-from collections import deque
+import time
 
 import numpy as np
 from vimba import Vimba, PixelFormat
@@ -26,6 +26,15 @@ class GuppyCamera(camera_interface.Camera):
     """
     def __init__(self, cam_id):
         self.cam_id = cam_id
+        self._video_frame_callbacks = []
+        #Vimba feature objects, resolved once per key, and the last value read from or written to each property
+        self._features_dict = {}
+        self._property_values_cache = {}
+        #Created by start_video
+        self._streaming_buffer = None
+        self._frame_handling_latency_stats = None
+        self.frame_handling_error_count = 0
+        self.last_frame_handling_error = None
         self._load_camera()
 
 
@@ -60,46 +69,97 @@ class GuppyCamera(camera_interface.Camera):
         return frame.as_numpy_ndarray()
         
         
+    """
+    Start video mode. 
+    
+    Each incoming frame is copied once, in the driver's frame callback, into a preallocated (buffer_length, height, width) 
+    camera_interface.VideoFrameBuffer, together with its hardware timestamp and frame id, after which the vimba frame is returned 
+    to the driver. When the buffer is full, the oldest frame is overwritten. 
+    
+    The vimba frame is returned to the driver even if copying it fails, e.g. because its shape no longer matches the buffer 
+    after a change of PixelFormat or ROI; such errors, and errors raised by video frame callbacks, are counted in 
+    frame_handling_error_count, with the latest kept in last_frame_handling_error."""
     def start_video(self, buffer_length = 10):
-        self._streaming_buffer_deque = deque(maxlen = buffer_length)
+        frame_shape = (self.get_property("Height"), self.get_property("Width"))
+        frame_dtype = GuppyCamera._get_pixel_format_dtype(self.get_property("PixelFormat"))
+        self._streaming_buffer = camera_interface.VideoFrameBuffer(buffer_length, frame_shape, frame_dtype)
+        timestamp_tick_frequency = self._get_timestamp_tick_frequency()
+        self._frame_handling_latency_stats = camera_interface.FrameHandlingLatencyStats()
+        self.frame_handling_error_count = 0
+        self.last_frame_handling_error = None
         def frame_handler(cam, frame):
-            self._streaming_buffer_deque.append(frame)
-            cam.queue_frame(frame)
+            handler_start_time = time.perf_counter()
+            try:
+                try:
+                    self._streaming_buffer.append(np.squeeze(frame.as_numpy_ndarray()), timestamp = frame.get_timestamp() / timestamp_tick_frequency, 
+                                                frame_id = frame.get_id())
+                finally:
+                    #A frame which is not queued is lost to the driver for good, eventually stalling streaming
+                    cam.queue_frame(frame)
+                for callback in self._video_frame_callbacks:
+                    callback(self)
+            except Exception as e:
+                self.frame_handling_error_count += 1
+                self.last_frame_handling_error = e
+            self._frame_handling_latency_stats.add(time.perf_counter() - handler_start_time)
         self.cam.start_streaming(frame_handler)
 
     def stop_video(self):
         self.cam.stop_streaming()
-        self._streaming_buffer_deque.clear()
+        self._streaming_buffer.flush()
 
     def is_video_running(self):
         return self.cam.is_streaming()
 
 
-    def get_video_frame(self, recency = "oldest"):
-        try:
-            if recency == "oldest":
-                frame = self._streaming_buffer_deque.popleft() 
-            elif recency == "newest":
-                frame = self._streaming_buffer_deque.pop() 
-            else:
-                raise ValueError("Recency flag not recognized") 
-        except IndexError:
-            return None
-        frame_array = frame.as_numpy_ndarray()
-        squeezed_frame_array = np.squeeze(frame_array)
-        return squeezed_frame_array
+    """
+    Pop a frame from the video buffer, or return None if it is empty. 
+
+    If recency is "newest", older frames are discarded. If copy is False, the returned array is a view into the ring buffer, 
+    which is only valid until buffer_length further frames have arrived. If return_metadata is True, returns a tuple 
+    (frame, metadata) with the frame's sequence number, hardware timestamp in seconds and frame id, as for 
+    VideoFrameBuffer.pop_frame."""
+    def get_video_frame(self, recency = "oldest", copy = True, return_metadata = False):
+        return self._streaming_buffer.pop_frame(recency = recency, copy = copy, return_metadata = return_metadata)
     
 
-    #TODO: try to make this thread-safe!
     def flush_video_buffer(self):
         if not self.is_video_running():
             raise RuntimeError("Video mode is not running.")
-        self._streaming_buffer_deque.clear()
+        self._streaming_buffer.flush()
 
     def get_video_buffer_num_available_frames(self):
         if not self.is_video_running():
             raise RuntimeError("Video mode is not running.")
-        return len(self._streaming_buffer_deque)
+        return len(self._streaming_buffer)
+
+    """
+    Returns the number of frames lost because the video buffer was full. Remains available after stop_video, until video 
+    is started again."""
+    def get_video_buffer_overrun_count(self):
+        self._check_video_started()
+        return self._streaming_buffer.overrun_count
+
+    """
+    Returns a dict of video mode health counters: frames received, frames dropped on buffer overflow, the buffer high-water 
+    mark, the mean and maximum time taken by the frame handler, including callbacks, and the number of errors it caught. 
+    As for get_video_buffer_overrun_count, the counters of the last video run remain available after stop_video."""
+    def get_video_stats(self):
+        self._check_video_started()
+        stats_dict = self._streaming_buffer.get_stats()
+        stats_dict.update(self._frame_handling_latency_stats.get_stats())
+        stats_dict["frame_handling_errors"] = self.frame_handling_error_count
+        return stats_dict
+
+    def _check_video_started(self):
+        if self._streaming_buffer is None:
+            raise RuntimeError("Video mode is not running.")
+
+    def add_video_frame_callback(self, callback):
+        self._video_frame_callbacks.append(callback)
+
+    def remove_video_frame_callback(self, callback):
+        self._video_frame_callbacks.remove(callback)
 
     _supported_writeable_properties = ["DeviceLinkThroughputLimit", "ExposureTime", "ExposureAuto", "Height", "Gain", "GainAuto", "GainRaw", "PixelFormat",
                                     "TriggerActivation", "TriggerDelay",
@@ -115,6 +175,22 @@ class GuppyCamera(camera_interface.Camera):
     _supported_read_only_properties = ["BinningHorizontal", "BinningVertical", "ExposureTimeIncrement", "WidthMax", "HeightMax", "DeviceID"]
 
 
+    #GigE cameras report their timestamp clock rate; otherwise, vimba timestamps are in nanoseconds
+    def _get_timestamp_tick_frequency(self):
+        DEFAULT_TIMESTAMP_TICK_FREQUENCY = 1e9
+        try:
+            return self.cam.GevTimestampTickFrequency.get()
+        except AttributeError:
+            return DEFAULT_TIMESTAMP_TICK_FREQUENCY
+
+    @staticmethod 
+    def _get_pixel_format_dtype(pixel_format_string):
+        if pixel_format_string.endswith("Mono8"):
+            return np.uint8 
+        else:
+            return np.uint16
+
+
     #Wildcard getters which do not obey the standard syntax 
     
     @staticmethod 
@@ -148,11 +224,14 @@ class GuppyCamera(camera_interface.Camera):
             else:
                 raise RuntimeError("Property name {0} is unsupported.".format(key))
         if not key in GuppyCamera._setter_wildcards:
-            attribute = getattr(self.cam, key)
+            attribute = self._get_feature(key)
             attribute.set(value)
         else:
             setter_method = GuppyCamera._setter_wildcards[key] 
             setter_method(self.cam, value) 
+        for dependent_key in GuppyCamera._dependent_properties.get(key, []):
+            self._property_values_cache.pop(dependent_key, None)
+        self._cache_property_value(key, value)
         
 
     def get_property(self, key):
@@ -160,13 +239,96 @@ class GuppyCamera(camera_interface.Camera):
             raise ValueError("""Property name {0} is unsupported. A list of property names is available as my_wrapper.writeable_properties and 
                              my_wrapper.read_only_properties.""".format(key))
         if not key in GuppyCamera._getter_wildcards:
-            attribute = getattr(self.cam, key)
+            attribute = self._get_feature(key)
             attribute_val = attribute.get()
-            return attribute_val
         else:
             getter_method = GuppyCamera._getter_wildcards[key] 
-            return getter_method(self.cam)
+            attribute_val = getter_method(self.cam)
+        self._cache_property_value(key, attribute_val)
+        return attribute_val
+
+
+    """
+    Set several properties at once, given as a dict {key:value}. 
+
+    Writes are made in the order the camera requires - e.g. PixelFormat before Height and Width, and TriggerSelector before the 
+    trigger settings it selects - with properties not in _property_write_order written last, in the order given. A write is 
+    skipped if the value equals the cached value of the property, i.e. the value last read from or written to it; properties 
+    without a cached value are read first. Properties controlled by an auto mode which is not "Off", e.g. ExposureTime while 
+    ExposureAuto is "Continuous", are never cached, and so are read every time. 
+
+    Returns: A list of the keys which were written, in the order they were written."""
+    def apply_properties(self, properties_dict):
+        def get_write_priority(key):
+            if key in GuppyCamera._property_write_order:
+                return GuppyCamera._property_write_order.index(key)
+            else:
+                return len(GuppyCamera._property_write_order)
+        written_keys_list = []
+        for key in sorted(properties_dict, key = get_write_priority):
+            value = properties_dict[key]
+            if key in self._property_values_cache:
+                current_value = self._property_values_cache[key]
+            else:
+                current_value = self.get_property(key)
+            if GuppyCamera._is_property_value_equal(current_value, value):
+                continue
+            self.set_property(key, value)
+            written_keys_list.append(key)
+        return written_keys_list
+
+
+    """
+    Get a dict {key:value} of every supported property, writeable and read-only. 
+
+    Values are taken from the cache where available, so that repeated snapshots cost no round-trips to the camera. If refresh is 
+    True, every property is instead read from the camera. Properties which the connected camera does not have are omitted."""
+    def get_property_snapshot(self, refresh = False):
+        snapshot_dict = {}
+        for key in GuppyCamera._supported_writeable_properties + GuppyCamera._supported_read_only_properties:
+            if refresh or not key in self._property_values_cache:
+                try:
+                    snapshot_dict[key] = self.get_property(key)
+                except AttributeError:
+                    continue
+            else:
+                snapshot_dict[key] = self._property_values_cache[key]
+        return snapshot_dict
+
+
+    #Vimba enum features read back as EnumEntry objects, which compare by name as strings
+    @staticmethod 
+    def _is_property_value_equal(cached_value, value):
+        return cached_value == value or str(cached_value) == str(value)
+
+    #Values controlled by an auto mode change on the camera without being written, so are only cached while the mode is "Off"
+    def _cache_property_value(self, key, value):
+        auto_key = GuppyCamera._auto_controlled_properties.get(key)
+        if not auto_key is None and str(self._property_values_cache.get(auto_key)) != "Off":
+            self._property_values_cache.pop(key, None)
+            return
+        self._property_values_cache[key] = value
+
+    def _get_feature(self, key):
+        try:
+            return self._features_dict[key]
+        except KeyError:
+            feature = getattr(self.cam, key)
+            self._features_dict[key] = feature 
+            return feature
+
+
+    #Properties which must be written before others; e.g. the pixel format sets the allowed image size
+    _property_write_order = ["PixelFormat", "Height", "Width", "TriggerSelector", "TriggerMode", "TriggerSource", "TriggerActivation", 
+                            "TriggerDelay", "ExposureAuto", "ExposureTime", "GainAuto", "Gain", "GainRaw"]
+
+    #Cached values which are invalidated when a given property is written
+    _dependent_properties = {"PixelFormat":["Height", "Width", "HeightMax", "WidthMax"], "ExposureAuto":["ExposureTime"], 
+                            "GainAuto":["Gain", "GainRaw"], "Gain":["GainRaw"], "GainRaw":["Gain"], 
+                            "TriggerSelector":["TriggerMode", "TriggerSource", "TriggerActivation", "TriggerDelay"]}
 
+    #Properties set by the camera itself unless the given auto mode is "Off"
+    _auto_controlled_properties = {"ExposureTime":"ExposureAuto", "Gain":"GainAuto", "GainRaw":"GainAuto"}
 
 
     @property
@@ -189,4 +351,4 @@ class GuppyCamera(camera_interface.Camera):
         with Vimba.get_instance() as vimba:
             cams = vimba.get_all_cameras() 
             ids_list = [cam.get_id() for cam in cams] 
-            return ids_list
\ No newline at end of file
+            return ids_list
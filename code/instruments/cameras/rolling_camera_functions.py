@@ -1,10 +1,27 @@
 import datetime
+import io
 from math import inf 
 import os
+import queue
+import threading
 import time 
 
 from astropy.io import fits
 import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+DEFAULT_FITS_COMPRESSION = "RICE_1"
+DEFAULT_HDF5_COMPRESSION = "gzip"
+HDF5_FRAMES_DATASET_NAME = "frames"
+#How often an idle RollingFrameSequenceAssembler checks that the camera's video is still running
+ASSEMBLER_IDLE_CHECK_INTERVAL_SECS = 0.5
+#Separates the camera name from the exposure grouping name in multi-camera save labels
+EXPOSURE_GROUPING_LABEL_DELIMITER = "_"
+
 """
 Given a camera in video mode, acquire a logical grouping of frames.
 
@@ -50,6 +67,7 @@ def acquire_rolling_frame_sequence(cam, num_frames, frame_timeout):
         sequence_start_time = time.time() 
         sequence_run_time = 0.0
         while sequence_run_time <= frame_timeout:
+            frames_available = cam.get_video_buffer_num_available_frames()
             if frames_available == num_frames:
                 frame_list = [] 
                 for i in range(num_frames):
@@ -105,6 +123,472 @@ def acquire_rolling_frame_sequence_nonblocking(t, cam, num_frames, frame_timeout
         return (t, frames)
 
 
+#Placed in a RollingFrameSequenceAssembler's queue when its thread fails, waking get_sequence
+_WORKER_FAILED_MARKER = object()
+
+
+"""
+Assembles rolling frame sequences on a background thread, without polling.
+
+Behaves as acquire_rolling_frame_sequence, but rather than spinning on the camera's buffer count, the assembler is woken by 
+the camera's video frame callback (see Camera.add_video_frame_callback) and otherwise waits on a condition variable. Complete 
+sequences are placed in a queue, from which they are retrieved with get_sequence. 
+
+Two grouping modes are supported. In "count" mode, the default, frames are grouped as in acquire_rolling_frame_sequence: a 
+sequence which is not complete within frame_timeout of its first frame, or for which too many frames arrive, is flushed. In 
+"timestamp" mode, frames are instead grouped by their hardware timestamps with a TimestampFrameSequenceGrouper, and 
+frame_timeout is unused.
+
+If the assembler thread fails - typically because the camera's video mode was stopped, or the camera closed, while the 
+assembler was running - the exception is kept in worker_error, and re-raised, wrapped in a RuntimeError, by get_sequence 
+and check_worker. close also re-raises it, unless it has already been raised by get_sequence or check_worker. The camera's 
+video should therefore only be stopped after the assembler is closed.
+
+Parameters:
+
+cam: The camera object, already in video mode and configured as for acquire_rolling_frame_sequence. It must support 
+video frame callbacks.
+
+num_frames: Identical to acquire_rolling_frame_sequence. 
+
+frame_timeout: Ditto. 
+
+max_queued_sequences: (int) The maximum number of complete sequences held in the queue. If the queue is full when a sequence 
+completes, the oldest queued sequence is discarded. If 0, the default, the queue is unbounded.
+
+grouping_mode: (str) "count" or "timestamp", as above.
+
+max_frame_gap: (float) In timestamp mode, the largest hardware timestamp difference, in seconds, between consecutive frames 
+of the same sequence. Required in timestamp mode.
+
+sequence_callback: If passed, complete sequences are passed to sequence_callback(frames), called on the assembler thread, 
+instead of being placed in the queue. 
+
+frame_callback: If passed, frame_callback(frame) is called on the assembler thread for every frame read from the camera, 
+including the frames of sequences which are flushed as incomplete or excess, before they are grouped. Only frames lost 
+because the camera's video buffer overflowed are not seen.
+"""
+class RollingFrameSequenceAssembler():
+
+    def __init__(self, cam, num_frames, frame_timeout, max_queued_sequences = 0, grouping_mode = "count", max_frame_gap = None, 
+                sequence_callback = None, frame_callback = None):
+        self.cam = cam 
+        self.num_frames = num_frames 
+        self.frame_timeout = frame_timeout
+        self.grouping_mode = grouping_mode
+        if grouping_mode == "timestamp":
+            if max_frame_gap is None:
+                raise ValueError("max_frame_gap must be specified for timestamp grouping.")
+            self.timestamp_grouper = TimestampFrameSequenceGrouper(num_frames, max_frame_gap)
+        elif grouping_mode == "count":
+            self.timestamp_grouper = None
+        else:
+            raise ValueError("Grouping mode {0} not recognized.".format(grouping_mode))
+        self.sequence_queue = queue.Queue(maxsize = max_queued_sequences)
+        self.sequence_callback = sequence_callback
+        self.frame_callback = frame_callback
+        self.completed_sequence_count = 0
+        self.timeout_flushed_sequence_count = 0
+        self.excess_flushed_sequence_count = 0
+        self.queue_dropped_sequence_count = 0
+        self.worker_error = None
+        self._is_worker_error_reported = False
+        self._condition = threading.Condition()
+        self._is_running = True
+        self.cam.add_video_frame_callback(self._frame_callback)
+        self._assembler_thread = threading.Thread(target = self._assemble_sequences, daemon = True)
+        self._assembler_thread.start()
+
+    def __enter__(self):
+        return self 
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    def close(self):
+        with self._condition:
+            self._is_running = False 
+            self._condition.notify_all()
+        self._assembler_thread.join()
+        self.cam.remove_video_frame_callback(self._frame_callback)
+        if not self._is_worker_error_reported:
+            self.check_worker()
+
+
+    """
+    Get the oldest complete sequence of frames, as a tuple in order of acquisition. 
+    
+    Blocks for up to timeout seconds (indefinitely if None) while waiting for a sequence, returning None if none arrives. 
+    Raises a RuntimeError if the assembler thread has failed and no complete sequences remain."""
+    def get_sequence(self, timeout = None):
+        try:
+            sequence = self.sequence_queue.get(timeout = timeout)
+        except queue.Empty:
+            return None
+        if sequence is _WORKER_FAILED_MARKER:
+            #Leave the marker for any later calls
+            self.sequence_queue.put_nowait(sequence)
+            self.check_worker()
+        return sequence
+
+    """
+    Raise a RuntimeError, chained from the assembler thread's exception, if that thread has failed."""
+    def check_worker(self):
+        if not self.worker_error is None:
+            self._is_worker_error_reported = True
+            raise RuntimeError("The frame sequence assembler stopped: {0}".format(self.worker_error)) from self.worker_error
+
+    def _frame_callback(self, cam):
+        with self._condition:
+            self._condition.notify()
+
+    def _assemble_sequences(self):
+        try:
+            self._assemble_sequences_until_closed()
+        except Exception as e:
+            #Failures while closing, e.g. from a camera stopped just before the assembler, are of no consequence
+            if self._is_running:
+                self.worker_error = e
+                if self.sequence_callback is None:
+                    self._put_in_sequence_queue(_WORKER_FAILED_MARKER)
+
+    def _assemble_sequences_until_closed(self):
+        while True:
+            with self._condition:
+                #The timeout ensures that the camera's video is checked, via the predicate, even if no frames arrive
+                is_frame_available = self._condition.wait_for(lambda: not self._is_running or self.cam.get_video_buffer_num_available_frames() > 0, 
+                                                            timeout = ASSEMBLER_IDLE_CHECK_INTERVAL_SECS)
+                if not self._is_running:
+                    return
+                if not is_frame_available:
+                    continue
+                if self.grouping_mode == "timestamp":
+                    #No need to wait for the rest of the sequence; the grouper holds partial sequences between wakeups
+                    frames_available = None
+                else:
+                    self._condition.wait_for(lambda: not self._is_running or self.cam.get_video_buffer_num_available_frames() >= self.num_frames, 
+                                            timeout = self.frame_timeout)
+                    if not self._is_running:
+                        return
+                    frames_available = self.cam.get_video_buffer_num_available_frames()
+            if self.grouping_mode == "timestamp":
+                for frames in acquire_rolling_frame_sequences_by_timestamp(self.cam, self.timestamp_grouper, 
+                                                                            frame_callback = self.frame_callback):
+                    self._put_sequence(frames)
+            elif frames_available == self.num_frames:
+                frames = tuple(self.cam.get_video_frame() for i in range(self.num_frames))
+                if not self.frame_callback is None:
+                    for frame in frames:
+                        self.frame_callback(frame)
+                self._put_sequence(frames)
+            else:
+                #Either a timeout with missing frames or excess frames; as above, assume a missed trigger
+                if frames_available < self.num_frames:
+                    self.timeout_flushed_sequence_count += 1 
+                else:
+                    self.excess_flushed_sequence_count += 1
+                self._flush_frames()
+
+    #Flush the camera's buffer, first passing the flushed frames to frame_callback
+    def _flush_frames(self):
+        if not self.frame_callback is None:
+            for i in range(self.cam.get_video_buffer_num_available_frames()):
+                frame = self.cam.get_video_frame()
+                if frame is None:
+                    break
+                self.frame_callback(frame)
+        self.cam.flush_video_buffer()
+
+    def _put_sequence(self, frames):
+        self.completed_sequence_count += 1
+        if not self.sequence_callback is None:
+            self.sequence_callback(frames)
+            return
+        self._put_in_sequence_queue(frames)
+
+    def _put_in_sequence_queue(self, item):
+        while True:
+            try:
+                self.sequence_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.sequence_queue.get_nowait()
+                    self.queue_dropped_sequence_count += 1
+                except queue.Empty:
+                    pass
+
+
+    """
+    Get a dict of health counters: the numbers of sequences completed, flushed because the sequence timed out with frames 
+    missing, flushed because excess frames arrived, and discarded because the queue was full. In timestamp mode, the 
+    flushed counts are the grouper's incomplete sequences and excess frames respectively. If the camera reports video 
+    statistics, they are included under the key "camera"."""
+    def get_stats(self):
+        stats_dict = {"sequences_completed":self.completed_sequence_count, "sequences_dropped_on_queue_overflow":self.queue_dropped_sequence_count}
+        if self.grouping_mode == "timestamp":
+            stats_dict["sequences_flushed_by_timeout"] = self.timestamp_grouper.incomplete_sequence_count 
+            stats_dict["excess_frames_flushed"] = self.timestamp_grouper.excess_frame_count
+        else:
+            stats_dict["sequences_flushed_by_timeout"] = self.timeout_flushed_sequence_count
+            stats_dict["sequences_flushed_by_excess"] = self.excess_flushed_sequence_count
+        try:
+            stats_dict["camera"] = self.cam.get_video_stats()
+        except NotImplementedError:
+            pass
+        return stats_dict
+
+
+"""
+Groups frames into logical sequences using the camera's hardware timestamps.
+
+Rather than relying on wall-clock timeouts in software, which are sensitive to jitter in Python scheduling, frames are split 
+into sequences wherever the hardware timestamp difference between consecutive frames exceeds max_frame_gap. This should be 
+set longer than the time between frames within a sequence, but shorter than the time between the last frame of one sequence 
+and the first frame of the next.
+
+A sequence is returned as soon as it contains num_frames frames. A sequence which is cut short by a gap, or by a break in the 
+camera's frame ids (indicating a frame lost in transfer), is discarded, as are any frames which arrive within max_frame_gap 
+of a sequence which has already been returned. The numbers of discarded sequences and frames are kept in 
+incomplete_sequence_count and excess_frame_count.
+
+Parameters:
+
+num_frames: (int) The number of frames in a logical sequence.
+
+max_frame_gap: (float) The largest timestamp difference, in seconds, between consecutive frames of the same sequence.
+"""
+class TimestampFrameSequenceGrouper():
+
+    def __init__(self, num_frames, max_frame_gap):
+        self.num_frames = num_frames 
+        self.max_frame_gap = max_frame_gap
+        self.incomplete_sequence_count = 0 
+        self.excess_frame_count = 0
+        self._pending_frames_list = [] 
+        self._last_timestamp = None 
+        self._last_frame_id = None
+        #True while frames continue to arrive within max_frame_gap of an already-returned sequence
+        self._in_excess_run = False
+
+    """
+    Add a frame with its hardware timestamp (in seconds) and, optionally, frame id. 
+    
+    Returns: A tuple of num_frames frames if this frame completes a sequence, else None."""
+    def add_frame(self, frame, timestamp, frame_id = None):
+        if timestamp is None:
+            raise ValueError("Timestamp grouping requires frames with hardware timestamps.")
+        is_contiguous = (not self._last_timestamp is None and timestamp - self._last_timestamp <= self.max_frame_gap)
+        if is_contiguous and not frame_id is None and not self._last_frame_id is None:
+            is_contiguous = frame_id == self._last_frame_id + 1
+        self._last_timestamp = timestamp 
+        self._last_frame_id = frame_id
+        if self._in_excess_run and is_contiguous:
+            self.excess_frame_count += 1 
+            return None
+        self._in_excess_run = False
+        if not is_contiguous and len(self._pending_frames_list) > 0:
+            self.incomplete_sequence_count += 1 
+            self._pending_frames_list = []
+        self._pending_frames_list.append(frame)
+        if len(self._pending_frames_list) == self.num_frames:
+            frames = tuple(self._pending_frames_list)
+            self._pending_frames_list = []
+            self._in_excess_run = True
+            return frames
+        return None
+
+
+"""
+Drain a camera's video buffer into a TimestampFrameSequenceGrouper.
+
+Non-blocking. The camera must be in video mode and support get_video_frame(return_metadata = True). If frame_callback is 
+passed, frame_callback(frame) is called for every drained frame.
+
+Returns: A list of the sequences, each a tuple of frames, completed by the drained frames. Frames belonging to a 
+sequence which is not yet complete are held by the grouper until the next call."""
+def acquire_rolling_frame_sequences_by_timestamp(cam, grouper, frame_callback = None):
+    completed_sequences_list = []
+    while True:
+        frame_and_metadata = cam.get_video_frame(return_metadata = True)
+        if frame_and_metadata is None:
+            return completed_sequences_list
+        frame, metadata = frame_and_metadata
+        if not frame_callback is None:
+            frame_callback(frame)
+        frames = grouper.add_frame(frame, metadata["timestamp"], frame_id = metadata["frame_id"])
+        if not frames is None:
+            completed_sequences_list.append(frames)
+
+
+"""
+Acquires synchronized shots from several rolling cameras at once. 
+
+Each camera is driven by its own RollingFrameSequenceAssembler, so that cameras are read out in parallel threads. A manager 
+thread collects the completed sequences and assembles them into shots: a shot is started by the first sequence to arrive from 
+any camera, and is complete once a sequence has arrived from every camera. If some camera's sequence has not arrived within 
+that camera's shot_timeout of the start of the shot, or if a second sequence arrives from a camera before the shot is complete, 
+the partial shot is discarded, and counted in incomplete_shot_count. All sequences in a shot share one acquisition datetime, 
+that of the arrival of its first sequence.
+
+Parameters:
+
+camera_configs_dict: A dict {camera_name:camera_config}, where each camera_config is a dict with keys
+
+    "cam": The camera object, in video mode and configured as for RollingFrameSequenceAssembler. 
+    "num_frames", "frame_timeout": As for RollingFrameSequenceAssembler. 
+    "shot_timeout": (float) The time, in seconds, to wait for this camera's sequence after the start of a shot. It should be 
+    longer than the largest expected difference in arrival times between cameras, but shorter than the time between shots.
+    "grouping_mode", "max_frame_gap", "frame_callback": Optional, as for RollingFrameSequenceAssembler.
+    "exposure_grouping_names": Optional, the names of the exposure groupings into which this camera's sequences are saved. 
+    If given for any camera, a ValueError is raised if two (camera, exposure grouping) pairs would have the same 
+    label, as given by get_exposure_grouping_label, since their files would then overwrite one another.
+
+max_queued_shots: (int) The maximum number of complete shots held in the queue. If the queue is full when a shot completes, 
+the oldest queued shot is discarded. If 0, the default, the queue is unbounded.
+"""
+class MultiCameraAcquisitionManager():
+
+    def __init__(self, camera_configs_dict, max_queued_shots = 0):
+        _check_exposure_grouping_labels(camera_configs_dict)
+        self.camera_names_list = list(camera_configs_dict)
+        self.shot_timeouts_dict = {camera_name:camera_configs_dict[camera_name]["shot_timeout"] for camera_name in camera_configs_dict}
+        self.shot_queue = queue.Queue(maxsize = max_queued_shots)
+        self.complete_shot_count = 0
+        self.incomplete_shot_count = 0
+        self._arrival_queue = queue.Queue()
+        self._is_running = True
+        self._manager_thread = threading.Thread(target = self._assemble_shots, daemon = True)
+        self._manager_thread.start()
+        self.assemblers_dict = {}
+        try:
+            for camera_name in camera_configs_dict:
+                camera_config = camera_configs_dict[camera_name]
+                self.assemblers_dict[camera_name] = RollingFrameSequenceAssembler(camera_config["cam"], camera_config["num_frames"], 
+                                                        camera_config["frame_timeout"], grouping_mode = camera_config.get("grouping_mode", "count"), 
+                                                        max_frame_gap = camera_config.get("max_frame_gap"), 
+                                                        sequence_callback = self._get_sequence_callback(camera_name), 
+                                                        frame_callback = camera_config.get("frame_callback"))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self 
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    def close(self):
+        #Close every assembler before re-raising any of their failures
+        close_errors_list = []
+        for camera_name in self.assemblers_dict:
+            try:
+                self.assemblers_dict[camera_name].close()
+            except RuntimeError as e:
+                close_errors_list.append(e)
+        self._is_running = False
+        self._arrival_queue.put(None)
+        self._manager_thread.join()
+        if len(close_errors_list) > 0:
+            raise close_errors_list[0]
+
+
+    """
+    Get the oldest complete shot. 
+
+    Blocks for up to timeout seconds (indefinitely if None) while waiting for a shot, returning None if none arrives. If no 
+    shot arrives and some camera's assembler has failed, e.g. because its video was stopped, a RuntimeError is raised, as for 
+    RollingFrameSequenceAssembler.check_worker.
+
+    Returns: A tuple (acquisition_datetime, sequences_dict), where sequences_dict is a dict {camera_name:frames}, with frames 
+    as returned by RollingFrameSequenceAssembler.get_sequence."""
+    def get_shot(self, timeout = None):
+        try:
+            return self.shot_queue.get(timeout = timeout)
+        except queue.Empty:
+            for camera_name in self.assemblers_dict:
+                self.assemblers_dict[camera_name].check_worker()
+            return None
+
+    """
+    Get a dict of health counters: the numbers of complete and incomplete shots, and under the key "cameras", a dict 
+    {camera_name:stats} of each camera's RollingFrameSequenceAssembler.get_stats()."""
+    def get_stats(self):
+        return {"shots_completed":self.complete_shot_count, "incomplete_shots":self.incomplete_shot_count, 
+                "cameras":{camera_name:self.assemblers_dict[camera_name].get_stats() for camera_name in self.assemblers_dict}}
+
+    def _get_sequence_callback(self, camera_name):
+        def sequence_callback(frames):
+            self._arrival_queue.put((camera_name, frames, time.monotonic(), datetime.datetime.now()))
+        return sequence_callback
+
+    def _assemble_shots(self):
+        pending_sequences_dict = {}
+        shot_start_time = None
+        shot_datetime = None
+        while self._is_running:
+            if len(pending_sequences_dict) == 0:
+                wait_timeout = None
+            else:
+                wait_timeout = max(self._get_shot_deadline(pending_sequences_dict, shot_start_time) - time.monotonic(), 0.0)
+            try:
+                arrival = self._arrival_queue.get(timeout = wait_timeout)
+            except queue.Empty:
+                self.incomplete_shot_count += 1
+                pending_sequences_dict = {}
+                continue
+            if arrival is None:
+                return
+            camera_name, frames, arrival_time, arrival_datetime = arrival
+            if len(pending_sequences_dict) > 0 and (camera_name in pending_sequences_dict or 
+                                                    arrival_time > self._get_shot_deadline(pending_sequences_dict, shot_start_time)):
+                self.incomplete_shot_count += 1
+                pending_sequences_dict = {}
+            if len(pending_sequences_dict) == 0:
+                shot_start_time = arrival_time 
+                shot_datetime = arrival_datetime
+            pending_sequences_dict[camera_name] = frames
+            if len(pending_sequences_dict) == len(self.camera_names_list):
+                sequences_dict = {name:pending_sequences_dict[name] for name in self.camera_names_list}
+                self.complete_shot_count += 1
+                self._put_shot((shot_datetime, sequences_dict))
+                pending_sequences_dict = {}
+
+    #The time by which every camera still missing from the shot must have arrived
+    def _get_shot_deadline(self, pending_sequences_dict, shot_start_time):
+        missing_timeouts_list = [self.shot_timeouts_dict[name] for name in self.camera_names_list if not name in pending_sequences_dict]
+        return shot_start_time + min(missing_timeouts_list)
+
+    def _put_shot(self, shot):
+        while True:
+            try:
+                self.shot_queue.put_nowait(shot)
+                return
+            except queue.Full:
+                try:
+                    self.shot_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+"""
+Get the label under which a camera's exposure grouping is saved in a multi-camera shot, e.g. "Side_TopA" for the grouping
+"TopA" of the camera "Side"."""
+def get_exposure_grouping_label(camera_name, exposure_grouping_name):
+    return EXPOSURE_GROUPING_LABEL_DELIMITER.join((camera_name, exposure_grouping_name))
+
+def _check_exposure_grouping_labels(camera_configs_dict):
+    labels_dict = {}
+    for camera_name in camera_configs_dict:
+        for exposure_grouping_name in camera_configs_dict[camera_name].get("exposure_grouping_names", []):
+            label = get_exposure_grouping_label(camera_name, exposure_grouping_name)
+            if label in labels_dict:
+                raise ValueError("Exposure grouping {0} of camera {1} and exposure grouping {2} of camera {3} would both be saved as {4}.".format(
+                    exposure_grouping_name, camera_name, labels_dict[label][1], labels_dict[label][0], label))
+            labels_dict[label] = (camera_name, exposure_grouping_name)
+
+
 """
 Regroup a series of numpy-formatted frames. 
 
@@ -114,37 +598,120 @@ multiple exposures per frame - regroup them according to the indices in exposure
 Parameters:
 
 frames_list: An iterable of frames from a camera. Frames are assumed to be in numpy array format, 
-being 2D numpy arrays if there is only one exposure per frame, and 3D arrays otherwise.
+being 2D numpy arrays if there is only one exposure per frame, and 3D arrays otherwise. A single 3D (or 4D) 
+array stacking the frames along its first axis is also accepted.
 
 exposure_indices_list: An iterable of iterables, each of them a set of indices to group into one logical 
 grouping of frames. If, for example, frames is of length 3, with each frame containing 2 exposures, then 
 setting exposure_indices_list to [[1, 3, 5], [2, 4, 6]] would group the odd- and even-numbered exposures together, 
 where the exposure index is incremented first within a frame, then between frames.
 
+Returns: A tuple with one entry per grouping, each a 3D array whose first index indexes the exposures in that 
+grouping. Each exposure is copied exactly once, directly from the input frames into the output.
+
 WARNING: Observe that exposure indices index frames from 1, not 0. This choice was made for consistency with an 
 external standard for frame labeling. 
 """
 def regroup_numpy_frames(frames, exposure_indices_list):
+    exposures_list = _get_exposure_views(frames)
+    exposure_shape = exposures_list[0].shape 
+    exposure_dtype = np.result_type(*exposures_list)
+    output_arrays_list = [np.empty((len(exposure_indices), *exposure_shape), dtype = exposure_dtype) 
+                            for exposure_indices in exposure_indices_list]
+    _gather_exposures(exposures_list, exposure_indices_list, output_arrays_list)
+    return tuple(output_arrays_list)
+
+
+"""
+Regroup frames as in regroup_numpy_frames, but write the groupings into caller-provided arrays. 
+
+Allows buffers to be allocated once and reused from shot to shot. 
+
+Parameters:
+
+frames, exposure_indices_list: As in regroup_numpy_frames. 
+
+output_arrays: An iterable of arrays, one per grouping, each of shape (len(exposure_indices), height, width). 
+
+Returns: output_arrays, as a tuple."""
+def regroup_numpy_frames_into(frames, exposure_indices_list, output_arrays):
+    exposures_list = _get_exposure_views(frames)
+    output_arrays_list = list(output_arrays)
+    if len(output_arrays_list) != len(exposure_indices_list):
+        raise ValueError("There must be one output array per exposure grouping.")
+    for output_array, exposure_indices in zip(output_arrays_list, exposure_indices_list):
+        if output_array.shape != (len(exposure_indices), *exposures_list[0].shape):
+            raise ValueError("Output array shape {0} does not match the grouping.".format(output_array.shape))
+    _gather_exposures(exposures_list, exposure_indices_list, output_arrays_list)
+    return tuple(output_arrays_list)
+
+
+#Returns a list of 2D views, one per exposure, without copying any pixel data
+def _get_exposure_views(frames):
+    if isinstance(frames, np.ndarray):
+        if frames.ndim < 3:
+            raise ValueError("Incorrect shape for frames.")
+        return list(frames.reshape(-1, *frames.shape[-2:]))
     first_frame = frames[0]
     if len(first_frame.shape) == 2:
-        exposures = frames
+        return list(frames)
     elif len(first_frame.shape) == 3:
-        exposures = [] 
-        for frame in frames:
-            for exposure in frame:
-                exposures.append(exposure)
+        return [exposure for frame in frames for exposure in frame]
     else:
         raise ValueError("Incorrect shape for frames.") 
-    exposure_array = np.array(exposures)
-    return_tuple_list = []
-    for exposure_indices in exposure_indices_list:
-        exposure_indices = np.array(exposure_indices)
-        #Convert to zero indexing
-        zero_indexed_exposure_indices = exposure_indices - 1
-        regrouped_exposures = exposure_array[zero_indexed_exposure_indices] 
-        regrouped_exposures_tuple = tuple(regrouped_exposures)
-        return_tuple_list.append(regrouped_exposures_tuple)
-    return tuple(return_tuple_list)
+
+
+def _gather_exposures(exposures_list, exposure_indices_list, output_arrays_list):
+    for exposure_indices, output_array in zip(exposure_indices_list, output_arrays_list):
+        for output_index, exposure_index in enumerate(exposure_indices):
+            #Convert to zero indexing
+            output_array[output_index] = exposures_list[exposure_index - 1]
+
+
+"""
+Crop and bin a stack of frames, e.g. to the region of interest of one exposure grouping.
+
+Cropping is done with a view, without copying. Binning sums blocks of binning x binning pixels; to avoid overflow, integer 
+frames are summed into an integer type of at least 32 bits. Rows and columns of the cropped region which do not fill a 
+complete bin are discarded.
+
+Parameters:
+
+frames: A 3D array stacking the frames along its first axis, as returned by regroup_numpy_frames.
+
+roi: A list [x_min, y_min, x_max, y_max] of pixel coordinates, with the max values exclusive, as for the ROI entries of the 
+camera configs. If None, the whole frame is kept.
+
+binning: (int) The bin size, in pixels, along each axis. Default 1, i.e. no binning.
+
+Returns: A tuple (processed_frames, geometry_dict), where geometry_dict gives the region actually kept, in unbinned sensor 
+pixel coordinates, and the bin size, with FITS header keywords ROIXMIN, ROIYMIN, ROIXMAX, ROIYMAX and BINNING, for passing 
+as header_dict to save_frames.
+"""
+def crop_and_bin_frames(frames, roi = None, binning = 1):
+    frames_height, frames_width = frames.shape[-2:]
+    if roi is None:
+        x_min, y_min, x_max, y_max = (0, 0, frames_width, frames_height)
+    else:
+        x_min, y_min, x_max, y_max = roi
+        if not (0 <= x_min < x_max <= frames_width and 0 <= y_min < y_max <= frames_height):
+            raise ValueError("ROI {0} does not lie within the frames.".format(roi))
+    #Trim to a whole number of bins
+    x_max = x_min + (x_max - x_min) // binning * binning 
+    y_max = y_min + (y_max - y_min) // binning * binning
+    if x_max == x_min or y_max == y_min:
+        raise ValueError("ROI {0} is smaller than a single bin.".format(roi))
+    processed_frames = frames[:, y_min:y_max, x_min:x_max]
+    if binning > 1:
+        num_frames, cropped_height, cropped_width = processed_frames.shape
+        binned_view = processed_frames.reshape(num_frames, cropped_height // binning, binning, cropped_width // binning, binning)
+        if np.issubdtype(frames.dtype, np.integer):
+            sum_dtype = np.promote_types(frames.dtype, np.uint32 if np.issubdtype(frames.dtype, np.unsignedinteger) else np.int32)
+        else:
+            sum_dtype = frames.dtype
+        processed_frames = binned_view.sum(axis = (2, 4), dtype = sum_dtype)
+    geometry_dict = {"ROIXMIN":x_min, "ROIYMIN":y_min, "ROIXMAX":x_max, "ROIYMAX":y_max, "BINNING":binning}
+    return (processed_frames, geometry_dict)
 
 
 """
@@ -153,15 +720,198 @@ Save frames to disk.
 Given a tuple of frames as provided by the functions above, save the data to disk at a specified path and 
 in a specified format.
 
+The format is selected by the extension of save_path: 
+
+.fits: Uncompressed FITS, with the frames stacked in the primary HDU.
+
+.fz (e.g. .fits.fz): Tile-compressed FITS, with the frames stacked in a CompImageHDU following an empty primary HDU. 
+Integer frames are compressed losslessly. 
+
+.h5 or .hdf5: HDF5, with the frames stacked in a dataset named "frames", chunked by frame. Requires h5py.
+
+.npy: Uncompressed numpy array, which can be memory-mapped when loaded.
+
+Existing files are never overwritten.
+
 Parameters:
 
-frames: A tuple of frames in numpy array format. 
-path_sans_extension: A path at which to save the data.
+frames: A tuple of frames in numpy array format, or a 3D array stacking them along its first axis. 
+
+save_path: A path at which to save the data.
+
+compression: (str) The compression algorithm. For .fz, one of astropy's compression types, e.g. "RICE_1" (the default), 
+"GZIP_1", or "GZIP_2". For HDF5, an h5py compression filter, e.g. "gzip" (the default) or "lzf". Ignored for other formats.
+
+header_dict: (dict) Optional metadata {keyword:value}, e.g. the geometry returned by crop_and_bin_frames. It is written to the 
+header of the HDU holding the frames for FITS formats, and to the attributes of the dataset for HDF5. Ignored for .npy.
 """
-def save_frames(frames, save_path):
-    frame_numpy_stack = np.stack(frames)
+def save_frames(frames, save_path, compression = None, header_dict = None):
+    _write_frames_to_file(frames, save_path, _get_save_format(save_path), compression, header_dict)
+
+
+"""
+Encode frames into the bytes of a file, as saved by save_frames, without touching the disk. 
+
+Allows the CPU-bound work of compression to be separated from the I/O-bound work of writing, which is done with 
+write_encoded_frames. Parameters are as for save_frames; save_path is used only to select the format.
+
+Returns: The encoded file, as bytes."""
+def encode_frames(frames, save_path, compression = None, header_dict = None):
+    save_format = _get_save_format(save_path)
+    with io.BytesIO() as encoded_file:
+        _write_frames_to_file(frames, encoded_file, save_format, compression, header_dict)
+        return encoded_file.getvalue()
+
+
+"""
+Write frames encoded by encode_frames to save_path. As for save_frames, existing files are never overwritten."""
+def write_encoded_frames(encoded_bytes, save_path):
+    with open(save_path, 'xb') as save_file:
+        save_file.write(encoded_bytes)
+
+
+SAVE_FORMATS = ["fits", "fz", "h5", "hdf5", "npy"]
+
+def _get_save_format(save_path):
     save_format = save_path.split(".")[-1] 
+    if not save_format in SAVE_FORMATS:
+        raise ValueError("Unsupported saving format.")
+    return save_format
+
+
+#save_target is either a path, which must not already exist, or a writeable binary file object
+def _write_frames_to_file(frames, save_target, save_format, compression, header_dict):
+    #Groupings from regroup_numpy_frames are already stacked; avoid copying them again
+    frame_numpy_stack = frames if isinstance(frames, np.ndarray) else np.stack(frames)
+    header_dict = {} if header_dict is None else header_dict
     if save_format == "fits":
-        fits.writeto(save_path, frame_numpy_stack)
+        fits.writeto(save_target, frame_numpy_stack, header = fits.Header(list(header_dict.items())))
+    elif save_format == "fz":
+        compression_type = DEFAULT_FITS_COMPRESSION if compression is None else compression
+        compressed_hdu = fits.CompImageHDU(data = frame_numpy_stack, header = fits.Header(list(header_dict.items())), 
+                                            compression_type = compression_type)
+        fits.HDUList([fits.PrimaryHDU(), compressed_hdu]).writeto(save_target)
+    elif save_format in ["h5", "hdf5"]:
+        if h5py is None:
+            raise ImportError("Saving in HDF5 format requires h5py.")
+        compression_filter = DEFAULT_HDF5_COMPRESSION if compression is None else compression
+        with h5py.File(save_target, 'x' if isinstance(save_target, str) else 'w') as h5_file:
+            frames_dataset = h5_file.create_dataset(HDF5_FRAMES_DATASET_NAME, data = frame_numpy_stack, chunks = (1, *frame_numpy_stack.shape[1:]),
+                                    compression = compression_filter, shuffle = True)
+            frames_dataset.attrs.update(header_dict)
+    elif save_format == "npy":
+        if isinstance(save_target, str):
+            with open(save_target, 'xb') as npy_file:
+                np.save(npy_file, frame_numpy_stack)
+        else:
+            np.save(save_target, frame_numpy_stack)
+
+
+"""
+Load frames saved by save_frames. 
+
+Returns: A 3D array stacking the frames along its first axis."""
+def load_frames(load_path):
+    save_format = load_path.split(".")[-1]
+    if save_format in ["fits", "fz"]:
+        #getdata finds the first HDU with data, i.e. the compressed HDU for .fz files
+        return fits.getdata(load_path)
+    elif save_format in ["h5", "hdf5"]:
+        if h5py is None:
+            raise ImportError("Loading HDF5 files requires h5py.")
+        with h5py.File(load_path, 'r') as h5_file:
+            return h5_file[HDF5_FRAMES_DATASET_NAME][()]
+    elif save_format == "npy":
+        return np.load(load_path)
     else:
-        raise ValueError("Unsupported saving format.")
\ No newline at end of file
+        raise ValueError("Unsupported saving format.")
+
+
+"""
+Saves frames on background worker threads, so that an acquisition loop does not wait on the disk.
+
+Writes are submitted with submit, which places them in a bounded queue and returns immediately; worker threads take them from 
+the queue and save them with save_function. The writer takes ownership of the submitted frames: the caller must not modify 
+them afterwards. While one sequence is being written, the next can thus be acquired and regrouped into fresh arrays.
+
+If the disk cannot keep up, the queue fills. Back-pressure is then reported rather than absorbed by the acquisition loop: submit 
+returns False and the write is discarded, and the count of discarded writes is kept in rejected_write_count. The current 
+number of queued writes and the largest number seen are available as queued_write_count and max_queued_write_count. Writes 
+which raise are recorded, with their exceptions, in failed_writes_list, and do not stop the workers.
+
+Parameters:
+
+num_workers: (int) The number of worker threads. 
+
+max_queued_writes: (int) The maximum number of writes waiting in the queue. 
+
+save_function: The function called as save_function(frames, save_path) to perform each write. Default save_frames.
+"""
+class AsyncFrameWriter():
+
+    def __init__(self, num_workers = 1, max_queued_writes = 8, save_function = save_frames):
+        self.save_function = save_function
+        self.write_queue = queue.Queue(maxsize = max_queued_writes)
+        self.rejected_write_count = 0 
+        self.completed_write_count = 0
+        self.max_queued_write_count = 0
+        self.failed_writes_list = []
+        self._counts_lock = threading.Lock()
+        self._worker_threads_list = []
+        for i in range(num_workers):
+            worker_thread = threading.Thread(target = self._write_frames, daemon = True)
+            worker_thread.start()
+            self._worker_threads_list.append(worker_thread)
+
+    def __enter__(self):
+        return self 
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    """
+    Wait for all queued writes to finish, then stop the worker threads."""
+    def close(self):
+        for worker_thread in self._worker_threads_list:
+            self.write_queue.put(None)
+        for worker_thread in self._worker_threads_list:
+            worker_thread.join()
+        self._worker_threads_list = []
+
+
+    """
+    Queue frames to be saved at save_path. save_kwargs, if passed, is a dict of additional keyword arguments for 
+    save_function, e.g. {"header_dict":header_dict} for save_frames.
+
+    If block is False, the default, returns False without queueing the write if the queue is full; otherwise waits for 
+    space, for up to timeout seconds if specified. Returns True if the write was queued."""
+    def submit(self, frames, save_path, block = False, timeout = None, save_kwargs = None):
+        save_kwargs = {} if save_kwargs is None else save_kwargs
+        try:
+            self.write_queue.put((frames, save_path, save_kwargs), block = block, timeout = timeout)
+        except queue.Full:
+            with self._counts_lock:
+                self.rejected_write_count += 1
+            return False
+        with self._counts_lock:
+            self.max_queued_write_count = max(self.max_queued_write_count, self.write_queue.qsize())
+        return True
+
+    @property
+    def queued_write_count(self):
+        return self.write_queue.qsize()
+
+    def _write_frames(self):
+        while True:
+            write_item = self.write_queue.get()
+            if write_item is None:
+                return
+            frames, save_path, save_kwargs = write_item
+            try:
+                self.save_function(frames, save_path, **save_kwargs)
+            except Exception as e:
+                with self._counts_lock:
+                    self.failed_writes_list.append((save_path, e))
+            else:
+                with self._counts_lock:
+                    self.completed_write_count += 1
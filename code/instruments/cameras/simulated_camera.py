@@ -0,0 +1,218 @@
+import threading
+import time
+
+import numpy as np
+
+from . import camera_interface
+
+
+"""
+A software camera implementing camera_interface.Camera, for exercising acquisition code without hardware attached.
+
+In video mode, the camera emulates an externally triggered camera: frames arrive in sequences of FramesPerSequence frames,
+spaced by FrameInterval seconds, with a new sequence starting every SequenceInterval seconds. Each trigger is independently
+missed with probability DropProbability, in which case no frame is produced; the hardware frame id is only incremented for
+frames which are actually produced, as for a real camera. If TriggerMode is 'Off', the camera instead free-runs with one
+frame every FrameInterval seconds. Frames carry a simulated hardware timestamp equal to their scheduled time, without
+software jitter.
+
+Frame contents are drawn from a small pool of precomputed absorption-imaging-like frames - a Gaussian probe beam, with and
+without an atomic shadow, plus shot noise - scaled to BitDepth, so that generating frames costs only a buffer copy.
+
+Parameters:
+
+cam_id: (str) An identifier for the camera, returned as the DeviceID property.
+
+seed: (int) Optional seed for the random number generator, for reproducible frame contents and dropped triggers.
+"""
+class SimulatedCamera(camera_interface.Camera):
+
+    NUM_PRECOMPUTED_FRAMES = 6
+
+    def __init__(self, cam_id = "DEV_SIMULATED", seed = None):
+        self.cam_id = cam_id
+        self._rng = np.random.default_rng(seed)
+        self._properties_dict = {"BitDepth":12, "DropProbability":0.0, "ExposureTime":100, "FrameInterval":0.01,
+                                "FramesPerSequence":3, "Height":488, "SequenceInterval":1.0, "TriggerMode":"On", "Width":648}
+        self._video_frame_callbacks = []
+        self._streaming_buffer = None
+        self._video_thread = None
+        self._video_stop_event = threading.Event()
+        self._frame_id = 0
+        self._precomputed_frames_array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    def close(self):
+        if self.is_video_running():
+            self.stop_video()
+
+
+    def get_frame(self, timeout_ms = 2000):
+        self._ensure_precomputed_frames()
+        time.sleep(self._properties_dict["FrameInterval"])
+        frame_index = self._rng.integers(SimulatedCamera.NUM_PRECOMPUTED_FRAMES)
+        return self._precomputed_frames_array[frame_index].copy()
+
+
+    def start_video(self, buffer_length = 10):
+        if self.is_video_running():
+            raise RuntimeError("Video mode is already running.")
+        self._ensure_precomputed_frames()
+        frame_shape = self._precomputed_frames_array.shape[1:]
+        self._streaming_buffer = camera_interface.VideoFrameBuffer(buffer_length, frame_shape, self._precomputed_frames_array.dtype)
+        self._frame_handling_latency_stats = camera_interface.FrameHandlingLatencyStats()
+        self._video_stop_event.clear()
+        self._video_thread = threading.Thread(target = self._run_video, daemon = True)
+        self._video_thread.start()
+
+    def stop_video(self):
+        self._video_stop_event.set()
+        self._video_thread.join()
+        self._video_thread = None
+        self._streaming_buffer.flush()
+
+    def is_video_running(self):
+        return not self._video_thread is None
+
+
+    def get_video_frame(self, recency = "oldest", copy = True, return_metadata = False):
+        return self._streaming_buffer.pop_frame(recency = recency, copy = copy, return_metadata = return_metadata)
+
+    def flush_video_buffer(self):
+        if not self.is_video_running():
+            raise RuntimeError("Video mode is not running.")
+        self._streaming_buffer.flush()
+
+    def get_video_buffer_num_available_frames(self):
+        if not self.is_video_running():
+            raise RuntimeError("Video mode is not running.")
+        return len(self._streaming_buffer)
+
+    def get_video_buffer_overrun_count(self):
+        return self._streaming_buffer.overrun_count
+
+    def get_video_stats(self):
+        stats_dict = self._streaming_buffer.get_stats()
+        stats_dict.update(self._frame_handling_latency_stats.get_stats())
+        return stats_dict
+
+    def add_video_frame_callback(self, callback):
+        self._video_frame_callbacks.append(callback)
+
+    def remove_video_frame_callback(self, callback):
+        self._video_frame_callbacks.remove(callback)
+
+
+    #Producer thread: emits frames on the configured trigger schedule until stopped
+    def _run_video(self):
+        frame_interval = self._properties_dict["FrameInterval"]
+        frames_per_sequence = self._properties_dict["FramesPerSequence"]
+        sequence_interval = self._properties_dict["SequenceInterval"]
+        drop_probability = self._properties_dict["DropProbability"]
+        is_triggered = self._properties_dict["TriggerMode"] == "On"
+        start_time = time.monotonic()
+        trigger_count = 0
+        while True:
+            if is_triggered:
+                sequence_index, index_in_sequence = divmod(trigger_count, frames_per_sequence)
+                scheduled_time = start_time + sequence_index * sequence_interval + index_in_sequence * frame_interval
+            else:
+                scheduled_time = start_time + trigger_count * frame_interval
+            trigger_count += 1
+            wait_time = scheduled_time - time.monotonic()
+            if self._video_stop_event.wait(timeout = max(wait_time, 0.0)):
+                return
+            if drop_probability > 0 and self._rng.random() < drop_probability:
+                continue
+            handler_start_time = time.perf_counter()
+            frame_index = self._frame_id % SimulatedCamera.NUM_PRECOMPUTED_FRAMES
+            self._streaming_buffer.append(self._precomputed_frames_array[frame_index], timestamp = scheduled_time, frame_id = self._frame_id)
+            self._frame_id += 1
+            for callback in self._video_frame_callbacks:
+                callback(self)
+            self._frame_handling_latency_stats.add(time.perf_counter() - handler_start_time)
+
+
+    def _ensure_precomputed_frames(self):
+        height = self._properties_dict["Height"]
+        width = self._properties_dict["Width"]
+        bit_depth = self._properties_dict["BitDepth"]
+        frame_dtype = np.uint8 if bit_depth <= 8 else np.uint16
+        if (not self._precomputed_frames_array is None and self._precomputed_frames_array.shape[1:] == (height, width)
+            and self._precomputed_frames_array.dtype == frame_dtype):
+            return
+        pixel_max = 2**bit_depth - 1
+        y_coords, x_coords = np.ogrid[0:height, 0:width]
+        y_center, x_center = height / 2, width / 2
+        probe_profile = np.exp(-((x_coords - x_center)**2 + (y_coords - y_center)**2) / (2 * (min(height, width) / 3)**2))
+        atom_transmission = np.exp(-2.0 * np.exp(-((x_coords - x_center)**2 + (y_coords - y_center)**2) / (2 * (min(height, width) / 12)**2)))
+        dark_level = 0.02 * pixel_max
+        probe_level = 0.6 * pixel_max
+        frames_list = []
+        for i in range(SimulatedCamera.NUM_PRECOMPUTED_FRAMES):
+            #Cycle through with atoms, without atoms, and dark frames
+            frame_type_index = i % 3
+            if frame_type_index == 0:
+                mean_frame = dark_level + probe_level * probe_profile * atom_transmission
+            elif frame_type_index == 1:
+                mean_frame = dark_level + probe_level * probe_profile
+            else:
+                mean_frame = np.full((height, width), dark_level)
+            noisy_frame = self._rng.poisson(mean_frame)
+            frames_list.append(np.clip(noisy_frame, 0, pixel_max).astype(frame_dtype))
+        self._precomputed_frames_array = np.stack(frames_list)
+
+
+    _supported_writeable_properties = ["BitDepth", "DropProbability", "ExposureTime", "FrameInterval", "FramesPerSequence", "Height",
+                                        "SequenceInterval", "TriggerMode", "Width"]
+
+    _supported_writeable_property_values = {"BitDepth":(int, "8 to 16"), "DropProbability":(float, "probability of missing each trigger"),
+                                            "ExposureTime":(int, "in microseconds; has no effect"),
+                                            "FrameInterval":(float, "seconds between frames in a sequence"),
+                                            "FramesPerSequence":(int, "frames per triggered sequence"), "Height":(int, 'pix'),
+                                            "SequenceInterval":(float, "seconds between the starts of sequences"),
+                                            "TriggerMode":(str, "'On' or 'Off'"), "Width":(int, 'pix')}
+
+    _supported_read_only_properties = ["DeviceID", "HeightMax", "WidthMax"]
+
+    _MAX_SENSOR_DIMENSION = 4096
+
+
+    def set_property(self, key, value):
+        if not key in SimulatedCamera._supported_writeable_properties:
+            if key in SimulatedCamera._supported_read_only_properties:
+                raise RuntimeError("Property name {0} is read-only.".format(key))
+            else:
+                raise RuntimeError("Property name {0} is unsupported.".format(key))
+        if self.is_video_running():
+            raise RuntimeError("Properties cannot be changed while video mode is running.")
+        self._properties_dict[key] = value
+
+    def get_property(self, key):
+        if key == "DeviceID":
+            return self.cam_id
+        elif key in ["HeightMax", "WidthMax"]:
+            return SimulatedCamera._MAX_SENSOR_DIMENSION
+        elif key in SimulatedCamera._supported_writeable_properties:
+            return self._properties_dict[key]
+        else:
+            raise ValueError("""Property name {0} is unsupported. A list of property names is available as my_wrapper.writeable_properties and
+                             my_wrapper.read_only_properties.""".format(key))
+
+
+    @property
+    def writeable_properties(self):
+        return SimulatedCamera._supported_writeable_properties
+
+    @property
+    def writeable_property_values(self):
+        return SimulatedCamera._supported_writeable_property_values
+
+    @property
+    def read_only_properties(self):
+        return SimulatedCamera._supported_read_only_properties
@@ -9,6 +9,11 @@ import subprocess
 import sys
 import time
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 from .. import configs as c
 
 
@@ -200,8 +205,22 @@ def _twiddle_file(file_pathname):
     elif sys.platform.startswith("darwin"):
         subprocess.run(["open", "-a", "TextEdit", file_pathname])
         subprocess.run(["killall", "TextEdit"])
+    elif hasattr(os, "posix_fadvise"):
+        _drop_cached_file_pages(file_pathname)
     else:
-        raise NotImplementedError("File refreshing not yet implemented for non-windows or Mac platforms.")
+        raise NotImplementedError("File refreshing not yet implemented for this platform.")
+
+
+#On Linux, no helper program is needed: stat-ing and re-opening the file makes network filesystems revalidate 
+#their cached attributes (close-to-open consistency), and dropping the cached pages forces the next read to go to the remote
+def _drop_cached_file_pages(file_pathname):
+    os.stat(file_pathname)
+    fd = os.open(file_pathname, os.O_RDONLY)
+    try:
+        os.fstat(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
 
 
 def update_json_file(file_pathname, update_dict, patience = 3, wait_time = 0.1):
@@ -225,14 +244,39 @@ def update_json_file(file_pathname, update_dict, patience = 3, wait_time = 0.1):
             else:
                 raise e
 
+"""
+Context manager giving a process exclusive (or, for readers in lock mode, shared) access to a file.
+
+Parameters:
+
+file_path: The path to the file to check out.
+
+method: The mode string with which to open the file, as for open().
+
+checkout_mode: Either "rename" or "lock". In "rename" mode (the default), the file is checked out by renaming it to 
+a unique name, retrying up to checkout_patience times with sleeps of wait_time if another process holds it. In "lock" mode, 
+the file is opened in place and an fcntl advisory lock is taken - shared for read-only methods, exclusive otherwise - 
+likewise retrying up to checkout_patience times with sleeps of wait_time if another process holds a conflicting lock. In 
+either mode, the OSError of the last attempt is raised if the file cannot be checked out. Lock mode is only available on 
+POSIX platforms.
+
+checkout_appendix, checkin_fail_policy: Only used in rename mode.
+
+Remark: The two modes do not exclude one another; all processes accessing a given file must use the same mode."""
 class CheckedOutFile(object):
     def __init__(self, file_path, method, checkout_patience = 3, wait_time = 0.1, 
-                checkout_appendix = None, checkin_fail_policy = "raise"):
+                checkout_appendix = None, checkin_fail_policy = "raise", checkout_mode = "rename"):
         self.file_path = file_path 
         self.method = method
         self.checkout_patience = checkout_patience 
         self.wait_time = wait_time
-        file_obj, checkout_pathname = self.checkout_file(checkout_appendix)
+        self.checkout_mode = checkout_mode
+        if checkout_mode == "rename":
+            file_obj, checkout_pathname = self.checkout_file(checkout_appendix)
+        elif checkout_mode == "lock":
+            file_obj, checkout_pathname = self.checkout_file_locked()
+        else:
+            raise ValueError("Checkout mode {0} not recognized.".format(checkout_mode))
         self.file_obj = file_obj 
         self.checkout_pathname = checkout_pathname
         self.checkin_fail_policy = checkin_fail_policy
@@ -261,7 +305,56 @@ class CheckedOutFile(object):
                 file_obj = open(checked_out_file_path, self.method) 
                 return (file_obj, checked_out_file_path)
 
+    def checkout_file_locked(self):
+        if fcntl is None:
+            raise RuntimeError("Lock-based checkout requires fcntl, which is unavailable on this platform.")
+        if 'x' in self.method:
+            raise ValueError("Exclusive creation is not supported for lock-based checkout.")
+        is_read_only = not any(c in self.method for c in "wa+")
+        if is_read_only:
+            open_flags = os.O_RDONLY
+            lock_type = fcntl.LOCK_SH 
+        else:
+            #Never truncate on open: the file may only be modified once the lock is held
+            open_flags = os.O_RDWR if ('+' in self.method or 'r' in self.method) else os.O_WRONLY
+            if not 'r' in self.method:
+                open_flags |= os.O_CREAT 
+            if 'a' in self.method:
+                open_flags |= os.O_APPEND
+            lock_type = fcntl.LOCK_EX
+        fd = os.open(self.file_path, open_flags)
+        try:
+            self._lock_file(fd, lock_type)
+            if 'w' in self.method:
+                os.ftruncate(fd, 0)
+            file_obj = open(fd, self.method)
+        except BaseException as e:
+            os.close(fd)
+            raise e
+        return (file_obj, self.file_path)
+
+    #As with renaming, the lock is retried up to checkout_patience times before giving up
+    def _lock_file(self, fd, lock_type):
+        counter = 0
+        while True:
+            try:
+                fcntl.flock(fd, lock_type | fcntl.LOCK_NB)
+            except BlockingIOError as e:
+                if counter < self.checkout_patience:
+                    counter += 1
+                    time.sleep(self.wait_time)
+                else:
+                    raise e
+            else:
+                return
+
     def checkin_file(self):
+        if self.checkout_mode == "lock":
+            #Flush before releasing so that the next lock holder sees the writes
+            self.file_obj.flush()
+            fcntl.flock(self.file_obj.fileno(), fcntl.LOCK_UN)
+            self.file_obj.close()
+            return
         self.file_obj.close()
         try:
             os.rename(self.checkout_pathname, self.file_path)
@@ -0,0 +1,176 @@
+import datetime
+import json
+import os
+import sqlite3
+
+from satyendra.code import loading_functions
+
+
+EXPERIMENT_PARAMETERS_FILENAME = "experiment_parameters.json"
+CATALOG_DATE_FORMAT_STRING = "%Y-%m-%d"
+
+"""
+A local SQLite index of the experiment_parameters.json snapshots saved alongside each measurement.
+
+Every snapshot is recorded together with the folder it lives in and the date parsed from that folder's parents
+(i.e. the YYYY-MM-DD folder in the usual year/month/day layout), and every key in it is stored with its value and
+update time. Lookups such as "what was value X on date Y across all measurements" are then queries against the index
+rather than walks over the data tree.
+
+Parameters:
+
+catalog_pathname: The path to the SQLite file holding the catalog. It is created if it does not exist.
+"""
+class ExperimentParametersCatalog():
+
+    def __init__(self, catalog_pathname):
+        self.catalog_pathname = catalog_pathname
+        self.connection = sqlite3.connect(catalog_pathname)
+        self._initialize_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_trace):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _initialize_tables(self):
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+                                        snapshot_id INTEGER PRIMARY KEY,
+                                        pathname TEXT UNIQUE NOT NULL,
+                                        folder_pathname TEXT NOT NULL,
+                                        folder_date TEXT,
+                                        mtime REAL NOT NULL,
+                                        size INTEGER NOT NULL)""")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS parameters (
+                                        snapshot_id INTEGER NOT NULL REFERENCES snapshots(snapshot_id),
+                                        key TEXT NOT NULL,
+                                        value TEXT,
+                                        update_time TEXT)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS parameters_key_index ON parameters(key)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS parameters_snapshot_index ON parameters(snapshot_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS snapshots_date_index ON snapshots(folder_date)")
+
+
+    """
+    Bring the catalog up to date with the snapshots under a root folder.
+
+    Recursively searches root_folder_pathname for experiment_parameters.json files. Files which are new, or whose
+    modification time or size differ from those recorded, are (re-)read; unchanged files are not opened. Catalog entries
+    under root_folder_pathname whose files no longer exist are removed.
+
+    Returns: The number of snapshots which were (re-)indexed."""
+    def update(self, root_folder_pathname):
+        root_folder_pathname = os.path.abspath(root_folder_pathname)
+        known_stats_dict = {}
+        for pathname, mtime, size in self.connection.execute("SELECT pathname, mtime, size FROM snapshots"):
+            known_stats_dict[pathname] = (mtime, size)
+        found_pathnames_set = set()
+        indexed_count = 0
+        with self.connection:
+            for dirpath, dirnames, filenames in os.walk(root_folder_pathname):
+                if not EXPERIMENT_PARAMETERS_FILENAME in filenames:
+                    continue
+                pathname = os.path.join(dirpath, EXPERIMENT_PARAMETERS_FILENAME)
+                found_pathnames_set.add(pathname)
+                file_stat = os.stat(pathname)
+                if known_stats_dict.get(pathname) == (file_stat.st_mtime, file_stat.st_size):
+                    continue
+                try:
+                    with open(pathname, 'r') as json_file:
+                        parameters_dict = json.load(json_file)
+                except json.JSONDecodeError:
+                    continue
+                folder_datetime = loading_functions._get_folder_parent_date_helper(root_folder_pathname, dirpath)
+                folder_date_string = None if folder_datetime is None else folder_datetime.strftime(CATALOG_DATE_FORMAT_STRING)
+                self._remove_snapshot(pathname)
+                cursor = self.connection.execute("""INSERT INTO snapshots (pathname, folder_pathname, folder_date, mtime, size)
+                                                    VALUES (?, ?, ?, ?, ?)""",
+                                                    (pathname, dirpath, folder_date_string, file_stat.st_mtime, file_stat.st_size))
+                snapshot_id = cursor.lastrowid
+                values_dict = parameters_dict.get("Values", {})
+                update_times_dict = parameters_dict.get("Update_Times", {})
+                self.connection.executemany("INSERT INTO parameters (snapshot_id, key, value, update_time) VALUES (?, ?, ?, ?)",
+                                            [(snapshot_id, key, json.dumps(values_dict[key]), update_times_dict.get(key)) for key in values_dict])
+                indexed_count += 1
+            root_prefix = os.path.join(root_folder_pathname, '')
+            for pathname in known_stats_dict:
+                if pathname.startswith(root_prefix) and not pathname in found_pathnames_set:
+                    self._remove_snapshot(pathname)
+        return indexed_count
+
+    def _remove_snapshot(self, pathname):
+        self.connection.execute("DELETE FROM parameters WHERE snapshot_id IN (SELECT snapshot_id FROM snapshots WHERE pathname = ?)", (pathname,))
+        self.connection.execute("DELETE FROM snapshots WHERE pathname = ?", (pathname,))
+
+
+    """
+    Get the recorded history of a single parameter.
+
+    Parameters:
+
+    key: The parameter name.
+
+    date_range: A list [min_datetime, max_datetime]. If passed, only snapshots whose folder date lies between the
+    two, inclusive, are returned.
+
+    Returns: A list of tuples (folder_pathname, folder_datetime, value, update_datetime), sorted by folder date and
+    then update time. folder_datetime and update_datetime are None if they could not be determined.
+    """
+    def get_parameter_history(self, key, date_range = None):
+        query_string = """SELECT snapshots.folder_pathname, snapshots.folder_date, parameters.value, parameters.update_time
+                            FROM parameters JOIN snapshots ON parameters.snapshot_id = snapshots.snapshot_id
+                            WHERE parameters.key = ?"""
+        query_params = [key]
+        if not date_range is None:
+            range_min, range_max = date_range
+            query_string += " AND snapshots.folder_date BETWEEN ? AND ?"
+            query_params.extend([range_min.strftime(CATALOG_DATE_FORMAT_STRING), range_max.strftime(CATALOG_DATE_FORMAT_STRING)])
+        query_string += " ORDER BY snapshots.folder_date, parameters.update_time, snapshots.folder_pathname"
+        history_list = []
+        for folder_pathname, folder_date_string, value_string, update_time_string in self.connection.execute(query_string, query_params):
+            history_list.append((folder_pathname, _parse_datetime_or_none(folder_date_string, CATALOG_DATE_FORMAT_STRING),
+                                json.loads(value_string),
+                                _parse_datetime_or_none(update_time_string, loading_functions.CENTRAL_PARAMETERS_DATETIME_FORMAT_STRING)))
+        return history_list
+
+
+    """
+    Get the values a parameter took on a given date, across all measurements on that date.
+
+    Returns: A list of tuples (folder_pathname, value, update_datetime) as in get_parameter_history."""
+    def get_parameter_values_on_date(self, key, target_datetime):
+        history_list = self.get_parameter_history(key, date_range = [target_datetime, target_datetime])
+        return [(folder_pathname, value, update_datetime) for folder_pathname, folder_datetime, value, update_datetime in history_list]
+
+
+    """
+    Get the full Values dict of the snapshot saved in a given measurement folder, or None if it is not catalogued."""
+    def get_snapshot_values(self, folder_pathname):
+        folder_pathname = os.path.abspath(folder_pathname)
+        snapshot_row = self.connection.execute("SELECT snapshot_id FROM snapshots WHERE folder_pathname = ?", (folder_pathname,)).fetchone()
+        if snapshot_row is None:
+            return None
+        values_dict = {}
+        for key, value_string in self.connection.execute("SELECT key, value FROM parameters WHERE snapshot_id = ?", snapshot_row):
+            values_dict[key] = json.loads(value_string)
+        return values_dict
+
+
+    """
+    Get a sorted list of every parameter name appearing in any catalogued snapshot."""
+    def get_parameter_names(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT key FROM parameters ORDER BY key")]
+
+
+def _parse_datetime_or_none(datetime_string, format_string):
+    if datetime_string is None:
+        return None
+    try:
+        return datetime.datetime.strptime(datetime_string, format_string)
+    except ValueError:
+        return None
@@ -17,7 +17,6 @@ import shutil
 import sys 
 import os 
 import warnings
-import glob
 from xml.etree.ElementTree import tostring
 import matplotlib
 matplotlib.use("TkAgg")
@@ -46,6 +45,11 @@ sys.path.insert(0, path_to_satyendra)
 
 import image_saver_script as saver
 from satyendra.code.image_watchdog import ImageWatchdog
+from satyendra.code.dataset_catalog import DatasetCatalog
+from satyendra.code import absorption_imaging_functions
+from satyendra.code.image_browser_functions import (DecodedFrameCache, FramePrefetcher, IncrementalFolderScanner, 
+                                                    PersistentImageView, build_image_pyramid, get_file_cache_key, 
+                                                    get_neighbouring_items, load_cached_fits_frames)
 from satyendra.code import loading_functions as satyendra_loading_functions
 from satyendra.configs import custom_live_analysis_local as custom_la
 from BEC1_Analysis.scripts import imaging_resonance_processing, rf_spect_processing, hybrid_top_processing
@@ -55,6 +59,11 @@ from BEC1_Analysis.code import measurement, analysis_functions
 
 IMAGE_EXTENSION = ".fits"
 ABSORPTION_LIMIT = 5.0
+FRAME_CACHE_MAX_BYTES = 512 * 2**20
+PREFETCH_NEIGHBOUR_COUNT = 3
+# indices, in the saved (with atoms, without atoms, dark) stack, of the frames read for each frame type:
+RAW_FRAME_INDICES = {'With atoms': 0, 'Without atoms': 1, 'Dark': 2}
+ABSORPTION_FRAME_INDICES = (0, 1, 2)
 SPECIAL_CHARACTERS = "!@#$%^&*()-+?_=,<>/"
 
 ALLOWED_RESONANCE_TYPES = ["12_AB", "12_BA",  "21_BA", "21_AB", 
@@ -205,8 +214,12 @@ class BEC1_Portal():
         self.selected_image_entry = Entry(self.tab1, text="", width=56)
         self.selected_image_entry.place(x = 20, y = 360)
 
-        # blank image variable
-        self.img = np.zeros((1,1,1))
+        # cache of decoded image stacks and derived frames, so that revisiting a shot or frame type is instant
+        self.frame_cache = DecodedFrameCache(max_nbytes = FRAME_CACHE_MAX_BYTES)
+        # loads the shots next to the selected one into the cache in the background, so that browsing never waits on the disk
+        self.prefetcher = FramePrefetcher(lambda path_and_frame_type: self.load_display_pyramid(*path_and_frame_type))
+        # stop the prefetcher before the window goes away, so that it does not keep decoding files
+        self.master.protocol("WM_DELETE_WINDOW", self.close_window)
 
         # Frame type:
         self.frame_type_label = Label(self.tab1, text="Frame type: ").place(x=20, y = 390)
@@ -265,13 +278,12 @@ class BEC1_Portal():
         # current folder name:
         self.folder_path = ''
         self.folder_path_old = self.folder_path
-        # list of fullpaths:
-        self.files_fullpath = []
         # current file name:
         self.current_file_name = ''
         self.current_file_fullpath = ''
-        self.file_names = []
-        self.file_names_old = []
+        # lists the folder incrementally, so that only new files are added to the table:
+        self.folder_scanner = None
+        self.file_table_lock = threading.Lock()
 
         # code the table with file names:
         # 1/ to make table with scrollbar, need frame:
@@ -304,10 +316,9 @@ class BEC1_Portal():
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.tab1)
         self.canvas.get_tk_widget().place(x = 400, y = 5)
         self.ax = self.fig.add_subplot(111)
-        [self.XMIN, self.XMAX] = self.ax.get_xlim()
-        [self.YMIN, self.YMAX] = self.ax.get_ylim()
-        self.oldSizeX = 0
-        self.oldSizeY = 0
+        self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
+        # images are shown by updating one persistent AxesImage rather than redrawing the figure
+        self.image_view = PersistentImageView(self.ax)
         self.toolbar = NavigationToolbar2Tk(self.canvas, self.tab1, pack_toolbar=False)
         self.toolbar.update()
         self.toolbar.place(x = 400, y = 5)
@@ -760,13 +771,10 @@ class BEC1_Portal():
         # current folder name:
         self.folder_path_live_analysis = ''
         self.folder_path_old_live_analysis = self.folder_path_live_analysis
-        # list of fullpaths:
-        self.files_fullpath_live_analysis = []
         # current file name:
         self.current_file_name_live_analysis = ''
         self.current_file_fullpath_live_analysis = ''
-        self.file_names_live_analysis = []
-        self.file_names_old_live_analysis = []
+        self.folder_scanner_live_analysis = None
 
         # selected image:
         self.selected_image_label_live_analysis = Label(self.tab2, text="Selected image: ").place(x=20, y = 335)
@@ -971,8 +979,7 @@ class BEC1_Portal():
         self.ax_image_viewer_live_analysis.set_title('Image viewer')
         [self.XMIN_live_analysis, self.XMAX_live_analysis] = self.ax_image_viewer_live_analysis.get_xlim()
         [self.YMIN_live_analysis, self.YMAX_live_analysis] = self.ax_image_viewer_live_analysis.get_ylim()
-        self.oldSizeX_live_analysis = 0
-        self.oldSizeY_live_analysis = 0
+        self.image_view_live_analysis = PersistentImageView(self.ax_image_viewer_live_analysis)
 
         # form norm box and roi
         self.XMIN_analyze = self.XMIN_live_analysis
@@ -982,8 +989,6 @@ class BEC1_Portal():
         self.roi_rect = None
         self.norm_box_rect = None
 
-        # blank image variable:
-        self.img_live_analysis = np.zeros((1,1,1))
 
         # ROI selection
         self.ROI_Crop_bttn_live_analysis = Button(self.tab2, text="ROI Crop", relief="raised", width=16, command = self.live_analysis_ROI_Crop)
@@ -1292,21 +1297,12 @@ class BEC1_Portal():
         if self.folder_path: # if path is not empty
             self.folder_entry.delete(0,'end')
             self.folder_entry.insert(0, self.folder_path)
-            # list all files with .fits extension:
-            self.file_names = []
-            self.files_fullpath = glob.glob(self.folder_path + '/*.fits')
-            for f in self.files_fullpath:
-                name = f.split(self.folder_path)
-                self.file_names.append(str(name[1]).replace('\\',"")) # make list of file names
-            if self.file_names != self.file_names_old: # only act if file_names has changed
-                # first clear table:
-                self.file_table.delete(*self.file_table.get_children())
-                # then repopulate:
-                for i in range(len(self.file_names)):
-                    id = str(len(self.file_names)-i)               
-                    # then repopulate
-                    self.file_table.insert("","end",text = id, values = str(self.file_names[len(self.file_names)-i-1]))
-                self.file_names_old = self.file_names
+            # add any new .fits files to the table:
+            with self.file_table_lock:
+                if (self.folder_scanner is None) or (self.folder_scanner.folder_path != self.folder_path):
+                    self.folder_scanner = IncrementalFolderScanner(self.folder_path, IMAGE_EXTENSION)
+                    self.file_table.delete(*self.file_table.get_children())
+                update_file_table(self.file_table, self.folder_scanner)
             # udpate backup folder path
             self.folder_path_old = self.folder_path
         else:
@@ -1328,6 +1324,13 @@ class BEC1_Portal():
                 t = Thread (target = self.scan_act)
                 t.start()
 
+    # the last file found by the scanner; files found in the same scan are in name order, i.e. in order of acquisition
+    def get_newest_file_name(self):
+        with self.file_table_lock:
+            if self.folder_scanner is None or len(self.folder_scanner.file_names_list) == 0:
+                return None
+            return self.folder_scanner.file_names_list[-1]
+
     def scan_act(self):
             while True:
                 if self.scan_bttn.config('relief')[-1] == 'sunken':
@@ -1338,65 +1341,45 @@ class BEC1_Portal():
                         # compare file name
                         # if different then display, else do nothing
                         if self.folder_path: # if path is not empty
-                            self.folder_entry.delete(0,'end')
-                            self.folder_entry.insert(0, self.folder_path)
-                            # list all files with .fits extension:
-                            self.file_names_new = []
-                            self.files_fullpath_new = glob.glob(self.folder_path + '/*.fits')
-
-                            if len(self.files_fullpath_new) > 0:
-                                for f in self.files_fullpath_new:
-                                    name = f.split(self.folder_path)
-                                    self.file_names_new.append(str(name[1]).replace('\\',"")) # make list of file names
-                                if self.file_names_new != self.file_names: # if file_names has changed:
-                                    # first clear table:
-                                    self.file_table.delete(*self.file_table.get_children())
-                                    # then repopulate:
-                                    for i in range(len(self.file_names_new)):
-                                        id = str(len(self.file_names_new)-i)               
-                                        # then repopulate
-                                        self.file_table.insert("","end",text = id, values = str(self.file_names_new[len(self.file_names_new)-i-1]))
-
-                                    if len(self.file_names) > 0:
-                                        if self.file_names_new[-1] != self.file_names[-1]: # display last image if last image different from previous last image
-                                            # show new image:
-                                            self.current_file_name = self.file_names_new[-1]
-                                            # make fullpath of selected file
-                                            self.current_file_fullpath = self.folder_path + '/' + self.current_file_name
-                                            # update selected image textbox:
-                                            self.selected_image_entry.delete(0,'end')
-                                            self.selected_image_entry.insert(0,self.current_file_name)
-                                            # now display image:
-                                            if self.image_is_displayed: 
-                                                self.image_is_displayed = False
-                                                self.display_image()
-                                            print(self.current_file_name)
-                                            # next, show metadata:
-                                            
-                                            
-                                            # # acquire run id
-                                            # run_id = self.current_file_name.split('_')[0] 
-                                            # # load run params from json file
-                                            # run_parameters_path = self.folder_path + "/run_params_dump.json"
-                                            # with open(run_parameters_path, 'r') as json_file:
-                                            #     run_parameters_dict = json.load(json_file)   
-                                            # self.params_for_selected_file = run_parameters_dict[run_id] # all params
-
-                                            # for i in range(len(self.metadata_variables)):
-                                            #     self.metadata_values[i] = str(self.params_for_selected_file[self.metadata_variables[i]])
-                                            # # first clear metadata table:
-                                            # self.params_table.delete(*self.params_table.get_children())
-                                            # # then repopulate it
-                                            # for i in range(len(self.metadata_variables)):
-                                            #     param = str(self.metadata_variables[i])
-                                            #     value = str(self.metadata_values[i])    
-                                            #     # then repopulate
-                                            #     self.params_table.insert("","end",text = param, values = value)
-
-
-                                    #else: # if there is no file_names yet, then just display the last of file_names_new
-                                self.file_names = self.file_names_new
-                                self.files_fullpath = self.files_fullpath_new                 
+                            previous_newest_file_name = self.get_newest_file_name()
+                            self.refresh()
+                            newest_file_name = self.get_newest_file_name()
+                            if newest_file_name is not None and previous_newest_file_name is not None:
+                                if newest_file_name != previous_newest_file_name: # display last image if last image different from previous last image
+                                    # show new image:
+                                    self.current_file_name = newest_file_name
+                                    # make fullpath of selected file
+                                    self.current_file_fullpath = self.folder_path + '/' + self.current_file_name
+                                    # update selected image textbox:
+                                    self.selected_image_entry.delete(0,'end')
+                                    self.selected_image_entry.insert(0,self.current_file_name)
+                                    # now display image:
+                                    if self.image_is_displayed: 
+                                        self.image_is_displayed = False
+                                        self.display_image()
+                                    print(self.current_file_name)
+                                    # next, show metadata:
+                                    
+                                    
+                                    # # acquire run id
+                                    # run_id = self.current_file_name.split('_')[0] 
+                                    # # load run params from json file
+                                    # run_parameters_path = self.folder_path + "/run_params_dump.json"
+                                    # with open(run_parameters_path, 'r') as json_file:
+                                    #     run_parameters_dict = json.load(json_file)   
+                                    # self.params_for_selected_file = run_parameters_dict[run_id] # all params
+
+                                    # for i in range(len(self.metadata_variables)):
+                                    #     self.metadata_values[i] = str(self.params_for_selected_file[self.metadata_variables[i]])
+                                    # # first clear metadata table:
+                                    # self.params_table.delete(*self.params_table.get_children())
+                                    # # then repopulate it
+                                    # for i in range(len(self.metadata_variables)):
+                                    #     param = str(self.metadata_variables[i])
+                                    #     value = str(self.metadata_values[i])    
+                                    #     # then repopulate
+                                    #     self.params_table.insert("","end",text = param, values = value)
+
 
                     else:
                         # print('Scanning but not showing new...')
@@ -1479,6 +1462,8 @@ class BEC1_Portal():
         self.selected_image_entry.insert(0,self.current_file_name)
         # now display image:
         self.display_image()
+        # then load its neighbours in the background:
+        self.prefetch_neighbours(self.file_table.focus())
         # next, show metadata:
         # acquire run id
         run_id = self.current_file_name.split('_')[0] 
@@ -1565,9 +1550,9 @@ class BEC1_Portal():
         print("Background area: {0}".format(bg_area))
         roi_area = (y_max_roi - y_min_roi)*(x_max_roi - x_min_roi)
 
-        overall_od = -np.log(safe_subtract(self.img[0,:,:], self.img[2,:,:])/safe_subtract(self.img[1,:,:], self.img[2,:,:]))
-        overall_od_nan_filtered = np.nan_to_num(overall_od)
-        overall_od_fully_cleaned = np.clip(overall_od_nan_filtered, AD_HOC_NEGATIVE_OD_LIMIT, ABSORPTION_LIMIT)
+        img = self.load_image_stack(self.current_file_fullpath)
+        overall_od_fully_cleaned = absorption_imaging_functions.get_od_image(img[0,:,:], img[1,:,:], img[2,:,:], 
+                                        clip_min = AD_HOC_NEGATIVE_OD_LIMIT, clip_max = ABSORPTION_LIMIT)
         
         od_roi_cropped = overall_od_fully_cleaned[y_min_roi:y_max_roi, x_min_roi:x_max_roi]
 
@@ -1609,6 +1594,7 @@ class BEC1_Portal():
             # redraw image once done so that user has to click the crop bttn again to crop
             self.display_image()
 
+        deactivate_selector()
         toggle_selector.RS = RectangleSelector(self.ax, line_select_callback,
         useblit=True,
         button=[1,3], # don't use middle button
@@ -1640,6 +1626,7 @@ class BEC1_Portal():
             # redraw image once done so that user has to clip the crop bttn again to crop
             self.display_image()
 
+        deactivate_selector()
         toggle_selector.RS = RectangleSelector(self.ax, line_select_callback,
         useblit=True,
         button=[1,3], # don't use middle button
@@ -1670,6 +1657,7 @@ class BEC1_Portal():
             # redraw image once done so that user has to clip the crop bttn again to crop
             self.display_image()
 
+        deactivate_selector()
         toggle_selector.RS = RectangleSelector(self.ax, line_select_callback,
         useblit=True,
         button=[1,3], # don't use middle button
@@ -1689,13 +1677,10 @@ class BEC1_Portal():
         sigma = float(self.LiLF_cross_section_entry.get())
         Nsat = float(self.LiLF_sat_count_entry.get())
 
-        od = (-np.log(safe_subtract(self.img[0,:,:], self.img[2,:,:])/safe_subtract(self.img[1,:,:], self.img[2,:,:])))
-        ic =  safe_subtract(self.img[1,:,:], self.img[0,:,:])/Nsat
-
-        # now clean od and ic:
-        od = np.nan_to_num(od)
-        # fix clipping
-        od = np.clip(od, 0, ABSORPTION_LIMIT)
+        img = self.load_image_stack(self.current_file_fullpath)
+        # od cleaned of nans and clipped:
+        od = absorption_imaging_functions.get_od_image(img[0,:,:], img[1,:,:], img[2,:,:], clip_min = 0, clip_max = ABSORPTION_LIMIT)
+        ic =  safe_subtract(img[1,:,:], img[0,:,:])/Nsat
 
         od_cropped = od[x_min:x_max, y_min:y_max] # just OD, but cropped
         ic_cropped = ic[x_min:x_max, y_min:y_max]
@@ -1711,28 +1696,9 @@ class BEC1_Portal():
         self.show_new_bttn.config(relief="raised")
         self.show_new_bttn.config(fg='black')
 
-        # then re draw canvas
-        if self.img.any():
-            # get dims of image
-            dims = self.img[0,:,:].shape 
-            x_limit = dims[1]
-            y_limit = dims[0]
-
-            # draw blank
-            plt.close(self.fig)
-            self.fig.clf()
-            self.ax.cla()
-            self.ax = self.fig.add_subplot(111)
-            self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-            self.canvas.draw_idle()
-            time.sleep(0.5)
-
-            # draw new
-            self.ax.invert_yaxis()
-            self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**15).set_clim(self.min_scale, self.max_scale)
-            self.ax.set_xlim([0, x_limit])
-            self.ax.set_ylim([0, y_limit])
-            self.canvas.draw_idle()
+        # then show the whole image
+        self.image_view.reset_view()
+        self.canvas.draw_idle()
 
     def ROI_poly_button(self):
         # first clear all rois:
@@ -1767,145 +1733,61 @@ class BEC1_Portal():
             pickle.dump(self.roi, fileObj)
             fileObj.close()
 
+    def load_image_stack(self, file_fullpath):
+        return np.stack(load_cached_fits_frames(self.frame_cache, file_fullpath, ABSORPTION_FRAME_INDICES))
+
+    def load_display_frame(self, file_fullpath, frame_type):
+        # only the frames needed for the frame type are read from the file
+        if frame_type in RAW_FRAME_INDICES:
+            frame_indices = (RAW_FRAME_INDICES[frame_type],)
+        else:
+            frame_indices = ABSORPTION_FRAME_INDICES
+        # derived frames are keyed by the parameters used in computing them as well as the frame type
+        frame_key = get_file_cache_key(file_fullpath, frame_type, ABSORPTION_LIMIT)
+        display_frame = self.frame_cache.get(frame_key)
+        if display_frame is None:
+            frames = load_cached_fits_frames(self.frame_cache, file_fullpath, frame_indices)
+            display_frame = compute_display_frame(frames, frame_type)
+            # raw integer frames are displayed as read, and are already cached under their own key; caching them again would 
+            # count their bytes twice against the cache's limit
+            if not display_frame is frames[0]:
+                self.frame_cache.put(frame_key, display_frame)
+        return display_frame
+
+    def prefetch_neighbours(self, table_item):
+        table_items = self.file_table.get_children()
+        if not table_item in table_items:
+            return
+        neighbour_items = get_neighbouring_items(table_items, table_items.index(table_item), PREFETCH_NEIGHBOUR_COUNT)
+        neighbour_paths = [self.folder_path + '/' + str(self.file_table.item(item)['values'][0]) for item in neighbour_items]
+        self.prefetcher.prefetch([(path, self.frame_type) for path in neighbour_paths])
+
+    def close_window(self):
+        self.prefetcher.close()
+        self.master.destroy()
+
+    def load_display_pyramid(self, file_fullpath, frame_type):
+        # downsampled copies of the displayed frame, drawn instead of it when zoomed out
+        pyramid_key = get_file_cache_key(file_fullpath, frame_type, ABSORPTION_LIMIT, 'pyramid')
+        return self.frame_cache.get_or_compute(pyramid_key, 
+                        lambda: build_image_pyramid(self.load_display_frame(file_fullpath, frame_type)))
+
     def display_image(self):
-        with fits.open(self.current_file_fullpath, memmap = False) as hdul:
-            self.img = hdul[0].data 
-
-        # get dims of image
-        dims = self.img[0,:,:].shape 
-        x_limit = dims[1]
-        y_limit = dims[0]
-        # get dims of current axes:
-        [self.XMIN, self.XMAX] = self.ax.get_xlim()
-        [self.YMIN, self.YMAX] = self.ax.get_ylim()
-
-        # first close
-        self.ax.clear()
-        self.fig.clf()
-        plt.close(self.fig)
-        self.ax = self.fig.add_subplot(111)
-        self.ax.invert_yaxis()
-        time.sleep(0.5)
+        self.frame = self.load_display_frame(self.current_file_fullpath, self.frame_type)
+        downsampled_frames = self.load_display_pyramid(self.current_file_fullpath, self.frame_type)
         print('Displaying image...')
 
-        # then show image:
-        frame_type = self.frame_type
-        if frame_type == 'OD':
-            self.frame = (-np.log(safe_subtract(self.img[0,:,:], self.img[2,:,:])/safe_subtract(self.img[1,:,:], self.img[2,:,:])))
-            # clean image: using nan_to_num
-            self.frame = np.nan_to_num(self.frame, nan=ABSORPTION_LIMIT)
-            # fix clipping
-            self.frame = np.clip(self.frame, 0, ABSORPTION_LIMIT)
-            self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**15).set_clim(self.min_scale, self.max_scale)
-            
-            # zoom/pan perspective
-            if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                self.ax.set_xlim([self.XMIN, self.XMAX])
-                self.ax.set_ylim([self.YMIN, self.YMAX])
-            else:
-                self.ax.set_xlim([0, x_limit])
-                self.ax.set_ylim([0, y_limit])
-            self.oldSizeX = x_limit
-            self.oldSizeY = y_limit
-            # end of zoom/pan perspective
-            self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-            self.canvas.draw_idle()
+        # remove the previous ROI and any unused crop selector; the zoom/pan perspective is kept unless the image size changes
+        deactivate_selector(self.ax)
+        self.image_view.clear_overlays()
+        if self.frame_type in ('With atoms', 'Without atoms', 'Dark'):
+            self.image_view.show_frame(self.frame, 0, 2**self.brightness, downsampled_frames = downsampled_frames) # need to adjust gray scale/colormap here with BRIGHTNESS variable
         else:
-            if frame_type == 'FakeOD':
-                self.frame = (safe_subtract(self.img[0,:,:], self.img[2,:,:])/safe_subtract(self.img[1,:,:], self.img[2,:,:]))
-                # clean image: using nan_to_num
-                self.frame = np.nan_to_num(self.frame)
-                # fix clipping
-                self.frame = np.clip(self.frame, 0, ABSORPTION_LIMIT)
-                self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**15).set_clim(self.min_scale, self.max_scale)
-
-                # zoom/pan perspective
-                if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                    self.ax.set_xlim([self.XMIN, self.XMAX])
-                    self.ax.set_ylim([self.YMIN, self.YMAX])
-                else:
-                    self.ax.set_xlim([0, x_limit])
-                    self.ax.set_ylim([0, y_limit])
-                self.oldSizeX = x_limit
-                self.oldSizeY = y_limit
-                # end of zoom/pan perspective
-                self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-                self.canvas.draw_idle()
-            else:
-                if frame_type == 'With atoms':
-                    self.frame = self.img[0,:,:]
-                    # clean image: using nan_to_num
-                    self.frame = np.nan_to_num(self.frame)
-                    self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**self.brightness)  # need to adjust gray scale/colormap here with BRIGHTNESS variable
-                    # zoom/pan perspective
-                    if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                        self.ax.set_xlim([self.XMIN, self.XMAX])
-                        self.ax.set_ylim([self.YMIN, self.YMAX])
-                    else:
-                        self.ax.set_xlim([0, x_limit])
-                        self.ax.set_ylim([0, y_limit])
-                    self.oldSizeX = x_limit
-                    self.oldSizeY = y_limit
-                    # end of zoom/pan perspective
-                    self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-                    self.canvas.draw_idle()
-
-                elif frame_type == 'Without atoms':
-                    self.frame = self.img[1,:,:]
-                    # clean image: using nan_to_num
-                    self.frame = np.nan_to_num(self.frame)
-                    self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**self.brightness)  # need to adjust gray scale/colormap here with BRIGHTNESS variable
-                    # zoom/pan perspective
-                    if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                        self.ax.set_xlim([self.XMIN, self.XMAX])
-                        self.ax.set_ylim([self.YMIN, self.YMAX])
-                    else:
-                        self.ax.set_xlim([0, x_limit])
-                        self.ax.set_ylim([0, y_limit])
-                    self.oldSizeX = x_limit
-                    self.oldSizeY = y_limit
-                    # end of zoom/pan perspective
-                    self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-                    self.canvas.draw_idle()
-
-                elif frame_type == 'Dark':
-                    self.frame = self.img[2,:,:]
-                    # clean image: using nan_to_num
-                    self.frame = np.nan_to_num(self.frame)
-                    self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**self.brightness)  # need to adjust gray scale/colormap here with BRIGHTNESS variable
-                    # zoom/pan perspective
-                    if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                        self.ax.set_xlim([self.XMIN, self.XMAX])
-                        self.ax.set_ylim([self.YMIN, self.YMAX])
-                    else:
-                        self.ax.set_xlim([0, x_limit])
-                        self.ax.set_ylim([0, y_limit])
-                    self.oldSizeX = x_limit
-                    self.oldSizeY = y_limit
-                    # end of zoom/pan perspective
-                    self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-                    self.canvas.draw_idle()
-
-                else:
-                    self.frame = (-np.log(safe_subtract(self.img[0,:,:], self.img[2,:,:])/safe_subtract(self.img[1,:,:], self.img[2,:,:])))
-                    # clean image: using nan_to_num
-                    self.frame = np.nan_to_num(self.frame)
-                    self.ax.imshow(self.frame, cmap='gray', vmin=0, vmax=2**15).set_clim(self.min_scale, self.max_scale)
-                    # zoom/pan perspective
-                    if (self.oldSizeX == x_limit) and (self.oldSizeY == y_limit):
-                        self.ax.set_xlim([self.XMIN, self.XMAX])
-                        self.ax.set_ylim([self.YMIN, self.YMAX])
-                    else:
-                        self.ax.set_xlim([0, x_limit])
-                        self.ax.set_ylim([0, y_limit])
-                    self.oldSizeX = x_limit
-                    self.oldSizeY = y_limit
-                    # end of zoom/pan perspective
-                    self.fig.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
-                    self.canvas.draw_idle()
+            self.image_view.show_frame(self.frame, self.min_scale, self.max_scale, downsampled_frames = downsampled_frames)
 
         # now display roi if there is one:
         self.display_roi()
+        self.canvas.draw_idle()
         # change display status to True to allow the next shot in queue
         self.image_is_displayed = True
     
@@ -1918,7 +1800,6 @@ class BEC1_Portal():
             self.roi_xs.append(self.roi_xs[0])
             self.roi_ys.append(self.roi_ys[0])
             self.ax.plot(self.roi_xs, self.roi_ys, color = 'r')
-            self.canvas.draw_idle()
 
     ###########################
     #   Image saver functions #
@@ -2027,7 +1908,7 @@ class BEC1_Portal():
             
 
     def acquire(self):
-        camera_saving_folder_pathname, saving_location_root_pathname, image_names_list = saver.load_config(self.current_imaging_type_image_saver)
+        camera_saving_folder_pathname, saving_location_root_pathname, image_names_list, dataset_catalog_pathname = saver.load_config(self.current_imaging_type_image_saver)
         user_entered_name = self.folder_name
         is_dryrun = user_entered_name == "dryrun"
         savefolder_pathname = saver.initialize_savefolder_portal(saving_location_root_pathname, user_entered_name, is_dryrun)
@@ -2036,40 +1917,50 @@ class BEC1_Portal():
             print("Running as a dry run. WARNING: All images will be deleted on termination.\n")
 
         print("Initializing watchdog...\n")
-        my_watchdog = ImageWatchdog(camera_saving_folder_pathname, savefolder_pathname, image_names_list, image_extension = IMAGE_EXTENSION)
-        print("Running!") 
+        # catalog saved images if configured; the catalog must live on this thread
+        dataset_catalog = None
+        if dataset_catalog_pathname and not is_dryrun:
+            dataset_catalog = DatasetCatalog(dataset_catalog_pathname)
+        # close the catalog even if the watchdog fails, so that its connection is not leaked
+        try:
+            my_watchdog = ImageWatchdog(camera_saving_folder_pathname, savefolder_pathname, image_names_list, image_extension = IMAGE_EXTENSION, 
+                                        dataset_catalog = dataset_catalog)
+            print("Running!") 
 
-        while True:
-            # main while loop goes here
-            image_saved = my_watchdog.associate_images_with_run()
-            if(image_saved):
-                print("Saved something at: ") 
-                t = datetime.datetime.now().strftime("%H-%M-%S")
-                print(t)
-                status_string =  'Saved to: ' + self.folder_name + ', at ' + t
-                # reset status box:
-                self.image_saver_status.delete(0,'end')
-                self.image_saver_status.insert(0, status_string)
+            while True:
+                # main while loop goes here
+                image_saved = my_watchdog.associate_images_with_run()
+                if(image_saved):
+                    print("Saved something at: ") 
+                    t = datetime.datetime.now().strftime("%H-%M-%S")
+                    print(t)
+                    status_string =  'Saved to: ' + self.folder_name + ', at ' + t
+                    # reset status box:
+                    self.image_saver_status.delete(0,'end')
+                    self.image_saver_status.insert(0, status_string)
                 
-            if self.acquisition_state == "STOPPED":   
-                # reset status box:
-                self.image_saver_status.delete(0,'end')
-                self.image_saver_status.insert(0,"Saving last image...")
-                print("Trying to save the last images...") 
-                my_watchdog.associate_images_with_run() 
-                my_watchdog.save_run_parameters()
-                print("Success!") 
-                time.sleep(1)
-                # reset status box:
-                self.image_saver_status.delete(0,'end')
-                self.image_saver_status.insert(0,"Success!")
-                if (is_dryrun):
-                    saver.nuke_savefolder(savefolder_pathname)
-                break  
+                if self.acquisition_state == "STOPPED":   
+                    # reset status box:
+                    self.image_saver_status.delete(0,'end')
+                    self.image_saver_status.insert(0,"Saving last image...")
+                    print("Trying to save the last images...") 
+                    my_watchdog.associate_images_with_run() 
+                    my_watchdog.save_run_parameters()
+                    print("Success!") 
+                    time.sleep(1)
+                    # reset status box:
+                    self.image_saver_status.delete(0,'end')
+                    self.image_saver_status.insert(0,"Success!")
+                    if (is_dryrun):
+                        saver.nuke_savefolder(savefolder_pathname)
+                    break  
+        finally:
+            if not dataset_catalog is None:
+                dataset_catalog.close()
 
     def go_to_button(self):
         if self.folder_name:
-            camera_saving_folder_pathname, saving_location_root_pathname, image_names_list = saver.load_config(self.current_imaging_type_image_saver)
+            camera_saving_folder_pathname, saving_location_root_pathname, image_names_list, dataset_catalog_pathname = saver.load_config(self.current_imaging_type_image_saver)
             user_entered_name = self.folder_name
             is_dryrun = user_entered_name == "dryrun"
             self.folder_path = saver.initialize_savefolder_portal(saving_location_root_pathname, user_entered_name, is_dryrun)
@@ -2272,21 +2163,12 @@ class BEC1_Portal():
         if self.folder_path_live_analysis: # if path is not empty
             self.folder_entry_live_analysis.delete(0,'end')
             self.folder_entry_live_analysis.insert(0, self.folder_path_live_analysis)
-            # list all files with .fits extension:
-            self.file_names_live_analysis = []
-            self.files_fullpath_live_analysis = glob.glob(self.folder_path_live_analysis + '/*.fits')
-            for f in self.files_fullpath_live_analysis:
-                name = f.split(self.folder_path_live_analysis)
-                self.file_names_live_analysis.append(str(name[1]).replace('\\',"")) # make list of file names
-            if self.file_names_live_analysis != self.file_names_old_live_analysis: # only act if file_names has changed
-                # first clear table:
-                self.file_table_live_analysis.delete(*self.file_table_live_analysis.get_children())
-                # then repopulate:
-                for i in range(len(self.file_names_live_analysis)):
-                    id = str(len(self.file_names_live_analysis)-i)               
-                    # then repopulate
-                    self.file_table_live_analysis.insert("","end",text = id, values = str(self.file_names_live_analysis[len(self.file_names_live_analysis)-i-1]))
-                self.file_names_old_live_analysis = self.file_names_live_analysis
+            # add any new .fits files to the table; the lock serializes table updates from the scanning and live analysis threads
+            with self.file_table_lock:
+                if (self.folder_scanner_live_analysis is None) or (self.folder_scanner_live_analysis.folder_path != self.folder_path_live_analysis):
+                    self.folder_scanner_live_analysis = IncrementalFolderScanner(self.folder_path_live_analysis, IMAGE_EXTENSION)
+                    self.file_table_live_analysis.delete(*self.file_table_live_analysis.get_children())
+                update_file_table(self.file_table_live_analysis, self.folder_scanner_live_analysis)
             # udpate backup folder path
             self.folder_path_old_live_analysis = self.folder_path_live_analysis
         else:
@@ -2300,46 +2182,15 @@ class BEC1_Portal():
     
     def display_image_live_analysis(self):
         # this is the lighter version of the full display_image method
-        with fits.open(self.current_file_fullpath_live_analysis, memmap = False) as hdul:
-            self.img_live_analysis = hdul[0].data
-
-        # get dims of image
-        dims = self.img_live_analysis[0,:,:].shape 
-        x_limit = dims[1]
-        y_limit = dims[0]
-        # get dims of current axes:
-        [self.XMIN_live_analysis, self.XMAX_live_analysis] = self.ax_image_viewer_live_analysis.get_xlim()
-        [self.YMIN_live_analysis, self.YMAX_live_analysis] = self.ax_image_viewer_live_analysis.get_ylim()
-
-        # first close
-        self.ax_image_viewer_live_analysis.cla()
-        self.image_viewer_live_analysis.clf()
-        plt.close(self.fig_live_analysis)
-        self.ax_image_viewer_live_analysis = self.image_viewer_live_analysis.add_subplot(111)
-        self.ax_image_viewer_live_analysis.invert_yaxis()
-
         # show images only in FakeOD. This is only for ROI selection and image checking... nothing fancy here
-        self.frame_live_analysis = (safe_subtract(self.img_live_analysis[0,:,:], self.img_live_analysis[2,:,:])/safe_subtract(self.img_live_analysis[1,:,:], self.img_live_analysis[2,:,:]))
-        # clean image: using nan_to_num
-        self.frame_live_analysis = np.nan_to_num(self.frame_live_analysis)
-        # fix clipping
-        self.frame_live_analysis = np.clip(self.frame_live_analysis, 0, ABSORPTION_LIMIT)
+        self.frame_live_analysis = self.load_display_frame(self.current_file_fullpath_live_analysis, 'FakeOD')
+        downsampled_frames = self.load_display_pyramid(self.current_file_fullpath_live_analysis, 'FakeOD')
         min_scale = 0
         max_scale = 1.3
-        self.ax_image_viewer_live_analysis.imshow(self.frame_live_analysis, cmap='gray', vmin=0, vmax=2**15).set_clim(min_scale, max_scale)
-
-        # zoom/pan perspective
-        if (self.oldSizeX_live_analysis == x_limit) and (self.oldSizeY_live_analysis == y_limit):
-            self.ax_image_viewer_live_analysis.set_xlim([self.XMIN_live_analysis, self.XMAX_live_analysis])
-            self.ax_image_viewer_live_analysis.set_ylim([self.YMIN_live_analysis, self.YMAX_live_analysis])
-        else:
-            self.ax_image_viewer_live_analysis.set_xlim([0, x_limit])
-            self.ax_image_viewer_live_analysis.set_ylim([0, y_limit])
-        self.oldSizeX_live_analysis = x_limit
-        self.oldSizeY_live_analysis = y_limit
-        # end of zoom/pan perspective
-        # reset title
-        self.ax_image_viewer_live_analysis.set_title('Image viewer')
+        # remove previous ROI and norm box drawings; the zoom/pan perspective is kept unless the image size changes
+        deactivate_selector(self.ax_image_viewer_live_analysis)
+        self.image_view_live_analysis.clear_overlays()
+        self.image_view_live_analysis.show_frame(self.frame_live_analysis, min_scale, max_scale, downsampled_frames = downsampled_frames)
         # self.image_viewer_live_analysis.subplots_adjust(left=0.05, bottom=0.04, right=0.98, top=0.94, wspace=0, hspace=0)
         self.canvas_image_viewer_live_analysis.draw_idle()
 
@@ -2498,6 +2349,7 @@ class BEC1_Portal():
             # redraw image once done so that user has to clip the crop bttn again to crop
             self.display_image_live_analysis()
 
+        deactivate_selector()
         toggle_selector.RS = RectangleSelector(self.ax_image_viewer_live_analysis, line_select_callback,
         useblit=True,
         button=[1,3], # don't use middle button
@@ -2528,6 +2380,7 @@ class BEC1_Portal():
             # redraw image once done so that user has to clip the crop bttn again to crop
             self.display_image_live_analysis()
 
+        deactivate_selector()
         toggle_selector.RS = RectangleSelector(self.ax_image_viewer_live_analysis, line_select_callback,
         useblit=True,
         button=[1,3], # don't use middle button
@@ -3250,6 +3103,29 @@ def toggle_selector(event):
                 print (' RectangleSelector activated.')
                 toggle_selector.RS.set_active(True)
 
+
+# the axes of the image viewers are kept between images, so that a crop selector which is no longer wanted is deactivated
+# rather than being cleared with its axes
+def deactivate_selector(ax = None):
+    selector = getattr(toggle_selector, 'RS', None)
+    if selector is not None and (ax is None or selector.ax is ax):
+        selector.set_active(False)
+
+'''
+Add the files found by a scan of folder_scanner to the top of file_table, newest first, numbering the rows in the order 
+the files were found. Only new rows are inserted; the table is rebuilt only if files were removed.
+Returns the names of the files added.
+'''
+def update_file_table(file_table, folder_scanner):
+    added_file_names, removed_file_names = folder_scanner.scan()
+    if len(removed_file_names) > 0:
+        file_table.delete(*file_table.get_children())
+        added_file_names = list(folder_scanner.file_names_list)
+    known_file_count = len(folder_scanner.file_names_list) - len(added_file_names)
+    for i in range(len(added_file_names)):
+        file_table.insert("", 0, text = str(known_file_count + i + 1), values = str(added_file_names[i]))
+    return added_file_names
+
 '''
 Credit: Eric A. Wolf, BEC1@MIT, 2022. 
 
@@ -3265,6 +3141,27 @@ def safe_subtract(x, y, minimum_cast = np.byte):
     newtype = np.result_type(x, y, minimum_cast)
     return x.astype(newtype) - y.astype(newtype)
 
+'''
+Compute the frame shown for a given frame type from the frames read for it: the single frame for 'With atoms', 
+'Without atoms' and 'Dark', or the (with atoms, without atoms, dark) frames otherwise.
+OD and FakeOD frames are computed in float32 by the shared absorption imaging kernel, cleaned of nans and clipped to 
+[0, ABSORPTION_LIMIT]; raw frames are cleaned of nans.
+'''
+def compute_display_frame(frames, frame_type):
+    if frame_type in RAW_FRAME_INDICES:
+        frame = frames[0]
+        # integer frames have no nans, and are shown without a copy
+        return np.nan_to_num(frame) if np.issubdtype(frame.dtype, np.floating) else frame
+    with_atoms, without_atoms, dark = frames
+    if frame_type == 'FakeOD':
+        return absorption_imaging_functions.get_fake_od_image(with_atoms, without_atoms, dark, 
+                                                            clip_min = 0, clip_max = ABSORPTION_LIMIT)
+    elif frame_type == 'OD':
+        return absorption_imaging_functions.get_od_image(with_atoms, without_atoms, dark, nan_value = ABSORPTION_LIMIT, 
+                                                        clip_min = 0, clip_max = ABSORPTION_LIMIT)
+    else:
+        return absorption_imaging_functions.get_od_image(with_atoms, without_atoms, dark)
+
 #### code for free hand tool... taken from github.com/jdoepfert/roipoly.py/blob/master/roipoly/roipoly.py
 #### why not install package? Because code is cursed... some methods don't work properly
 
@@ -0,0 +1,97 @@
+import sys
+import os
+import time
+
+import numpy as np
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code import absorption_imaging_functions
+
+DEFAULT_SETTINGS_DICT = {"Height":2048, "Width":2048, "BitDepth":16, "repetitions":20, "ABSORPTION_LIMIT":5.0}
+
+def main():
+    settings_dict = parse_clas()
+    with_atoms, without_atoms, dark = make_frames(settings_dict["Height"], settings_dict["Width"], settings_dict["BitDepth"])
+    absorption_limit = settings_dict["ABSORPTION_LIMIT"]
+    kernels_dict = {"numpy float32 kernel":absorption_imaging_functions.AbsorptionImageKernel(use_numba = False)}
+    if not absorption_imaging_functions.numba is None:
+        kernels_dict["numba kernel"] = absorption_imaging_functions.AbsorptionImageKernel(use_numba = True)
+    reference_od = get_reference_od(with_atoms, without_atoms, dark, absorption_limit)
+    out = np.empty(with_atoms.shape, dtype = np.float32)
+    functions_dict = {"safe_subtract reference":lambda: get_reference_od(with_atoms, without_atoms, dark, absorption_limit)}
+    for kernel_name in kernels_dict:
+        kernel = kernels_dict[kernel_name]
+        functions_dict[kernel_name] = (lambda kernel: lambda: kernel.get_od(with_atoms, without_atoms, dark, out = out,
+                                                                            nan_value = absorption_limit, clip_min = 0,
+                                                                            clip_max = absorption_limit))(kernel)
+    print("Frames: {0:d} x {1:d}, {2:d} repetitions".format(settings_dict["Height"], settings_dict["Width"], settings_dict["repetitions"]))
+    reference_time = None
+    for function_name in functions_dict:
+        function = functions_dict[function_name]
+        #The first call compiles the numba kernel and allocates scratch buffers
+        od = function()
+        max_deviation = np.max(np.abs(od - reference_od))
+        start_time = time.perf_counter()
+        for i in range(settings_dict["repetitions"]):
+            function()
+        mean_time = (time.perf_counter() - start_time) / settings_dict["repetitions"]
+        if reference_time is None:
+            reference_time = mean_time
+        print("{0}: {1:.2f} ms per OD image ({2:.1f}x), max deviation from reference {3:.1e}".format(
+            function_name, mean_time * 1e3, reference_time / mean_time, max_deviation))
+
+
+def make_frames(height, width, bit_depth):
+    rng = np.random.default_rng(0)
+    pixel_max = 2**bit_depth - 1
+    dark = rng.integers(0, pixel_max // 100, size = (height, width)).astype(np.uint16)
+    without_atoms = (dark + rng.integers(pixel_max // 10, pixel_max // 2, size = (height, width))).astype(np.uint16)
+    transmission = rng.random((height, width))
+    with_atoms = (dark + transmission * (without_atoms - dark)).astype(np.uint16)
+    return (with_atoms, without_atoms, dark)
+
+
+#The OD computation as done by the image browser before the shared kernel
+def get_reference_od(with_atoms, without_atoms, dark, absorption_limit):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        od = -np.log(safe_subtract(with_atoms, dark) / safe_subtract(without_atoms, dark))
+    od = np.nan_to_num(od, nan = absorption_limit)
+    return np.clip(od, 0, absorption_limit)
+
+def safe_subtract(x, y, minimum_cast = np.byte):
+    newtype = np.result_type(x, y, minimum_cast)
+    return x.astype(newtype) - y.astype(newtype)
+
+
+HELP_ALIASES = ["h", "help", "HELP", "Help"]
+
+def parse_clas():
+    cla_list = sys.argv[1:]
+    if len(cla_list) > 0 and cla_list[0] in HELP_ALIASES:
+        help_function()
+        exit(0)
+    settings_dict = DEFAULT_SETTINGS_DICT.copy()
+    for cla in cla_list:
+        key, value_string = cla.split("=")
+        if not key in settings_dict:
+            raise ValueError("Unrecognized setting: {0}".format(key))
+        settings_dict[key] = type(settings_dict[key])(value_string)
+    return settings_dict
+
+
+def help_function():
+    print("Absorption Kernel Benchmark")
+    print("Compares the time taken to compute OD images by the shared absorption imaging kernel, with and without numba, ")
+    print("against the safe_subtract-based computation previously used by the image browser.")
+    print("CLAs:")
+    print("Any number of key=value pairs overriding the defaults:")
+    for key in DEFAULT_SETTINGS_DICT:
+        print("    {0} (default {1})".format(key, DEFAULT_SETTINGS_DICT[key]))
+
+
+if __name__ == "__main__":
+    main()
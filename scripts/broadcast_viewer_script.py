@@ -0,0 +1,59 @@
+import sys 
+import os
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code import plotting_utilities
+from satyendra.code.instruments.cameras import frame_broadcast
+
+
+def main():
+    broadcast_name, bit_depth = parse_clas()
+    plot_kwargs = {"cmap":"gray", "origin":"lower"}
+    if not bit_depth is None:
+        plot_kwargs["vmin"] = 0 
+        plot_kwargs["vmax"] = 2**bit_depth - 1
+    fig, ax = plotting_utilities.initialize_live_plot()
+    with frame_broadcast.FrameBroadcastSubscriber(broadcast_name) as subscriber:
+        print("Attached to broadcast {0}. Use Ctrl+C to exit.".format(broadcast_name))
+        current_frame = None
+        try:
+            while True:
+                #Frames published while the previous one was being drawn are skipped. The frame is copied, since the publisher 
+                #may overwrite its slot while it is being drawn.
+                current_frame = subscriber.wait_for_newest_frame(timeout = 1.0, copy = True)
+                if not current_frame is None:
+                    #For frames with multiple exposures, show the first
+                    if current_frame.ndim == 3:
+                        current_frame = current_frame[0]
+                    plotting_utilities.update_live_plot_imshow(current_frame, ax = ax, **plot_kwargs)
+        finally:
+            #No frame may refer to the shared memory when the subscriber closes it
+            current_frame = None
+
+
+def parse_clas():
+    command_line_args = sys.argv[1:]
+    if len(command_line_args) == 0 or command_line_args[0] == "help":
+        _help_function() 
+        exit(0)
+    broadcast_name = command_line_args[0]
+    bit_depth = None
+    if len(command_line_args) > 1:
+        bit_depth = int(command_line_args[1])
+    return (broadcast_name, bit_depth)
+
+
+def _help_function():
+    print("Program name: Broadcast Viewer Script") 
+    print("Description: Live viewing of the frames published by a running image_acquisition_script, without opening the camera.") 
+    print("CLAs:")
+    print("1: Broadcast name. The broadcast_name given in the camera's acquisition settings.")
+    print("2: (optional) Bit depth. If specified, the color scale is fixed to the camera's full range; otherwise it is set per frame.")
+
+
+if __name__ == "__main__":
+    main()
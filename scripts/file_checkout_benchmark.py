@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+import sys 
+import tempfile
+import time
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code import loading_functions
+
+CHECKOUT_MODES = ["rename", "lock"]
+
+def main():
+    num_workers, num_iterations = parse_clas()
+    print("Contending workers: {0:d}, checkouts per worker: {1:d}\n".format(num_workers, num_iterations))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for checkout_mode in CHECKOUT_MODES:
+            counter_pathname = os.path.join(temp_dir, "counter_{0}.json".format(checkout_mode))
+            with open(counter_pathname, 'w') as f:
+                json.dump({"count":0}, f)
+            start_time = time.perf_counter()
+            with multiprocessing.Pool(num_workers) as pool:
+                failures_list = pool.starmap(_contend_for_file, [(counter_pathname, checkout_mode, num_iterations)] * num_workers)
+            elapsed_time = time.perf_counter() - start_time
+            with open(counter_pathname, 'r') as f:
+                final_count = json.load(f)["count"]
+            total_checkouts = num_workers * num_iterations
+            print("Mode: {0}".format(checkout_mode))
+            print("Total time: {0:.3f} s".format(elapsed_time))
+            print("Mean time per checkout: {0:.3f} ms".format(1000 * elapsed_time / total_checkouts))
+            print("Failed checkouts: {0:d}".format(sum(failures_list)))
+            print("Final count: {0:d} (expected {1:d})\n".format(final_count, total_checkouts - sum(failures_list)))
+
+
+#Read-modify-write a shared counter, counting checkouts that exhausted their patience
+def _contend_for_file(counter_pathname, checkout_mode, num_iterations):
+    failures = 0
+    for i in range(num_iterations):
+        try:
+            with loading_functions.CheckedOutFile(counter_pathname, 'r+', checkout_mode = checkout_mode) as f:
+                counter_dict = json.load(f) 
+                counter_dict["count"] += 1
+                f.seek(0)
+                json.dump(counter_dict, f)
+                f.truncate()
+        except OSError:
+            failures += 1
+    return failures
+
+
+HELP_ALIASES = ["h", "help", "HELP", "Help"]
+
+def parse_clas():
+    cla_list = sys.argv[1:]
+    if len(cla_list) > 0 and cla_list[0] in HELP_ALIASES:
+        help_function()
+        exit(0)
+    num_workers = int(cla_list[0]) if len(cla_list) > 0 else 4
+    num_iterations = int(cla_list[1]) if len(cla_list) > 1 else 100
+    return (num_workers, num_iterations)
+
+
+def help_function():
+    print("File Checkout Benchmark")
+    print("Compares the contention latency of the rename- and lock-based checkout modes of CheckedOutFile.")
+    print("CLAs:")
+    print("1: (optional) num_workers (int): The number of processes contending for the file. Default 4.")
+    print("2: (optional) num_iterations (int): The number of checkouts made by each process. Default 100.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import sys 
+import os
+import tempfile
+import time
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+
+sys.path.insert(0, path_to_satyendra)
+
+import numpy as np
+
+from satyendra.code.instruments.cameras import rolling_camera_functions
+from satyendra.code.instruments.cameras.simulated_camera import SimulatedCamera
+
+DEFAULT_SETTINGS_DICT = {"num_files":20, "frames_per_file":3, "Height":488, "Width":648, "BitDepth":12, "save_folder":""}
+
+#Pairs (extension, compression) to benchmark
+SAVE_FORMATS_LIST = [(".fits", None), (".fits.fz", "RICE_1"), (".fits.fz", "GZIP_1"), (".fits.fz", "GZIP_2"), 
+                    (".h5", "gzip"), (".h5", "lzf"), (".npy", None)]
+
+def main():
+    settings_dict = parse_clas()
+    with SimulatedCamera(seed = 0) as cam:
+        for key in ["Height", "Width", "BitDepth"]:
+            cam.set_property(key, settings_dict[key])
+        cam.set_property("FrameInterval", 0.0)
+        frame_stacks_list = [np.stack([cam.get_frame() for j in range(settings_dict["frames_per_file"])]) 
+                            for i in range(settings_dict["num_files"])]
+    raw_byte_count = sum([frame_stack.nbytes for frame_stack in frame_stacks_list])
+    save_folder = settings_dict["save_folder"] if settings_dict["save_folder"] else None
+    print("{0:<10}{1:<10}{2:>14}{3:>14}{4:>12}".format("Format", "Codec", "Write (MB/s)", "Read (MB/s)", "Ratio"))
+    for extension, compression in SAVE_FORMATS_LIST:
+        if extension in [".h5", ".hdf5"] and rolling_camera_functions.h5py is None:
+            print("{0:<10}{1:<10}{2:>14}".format(extension, str(compression), "h5py not installed"))
+            continue
+        with tempfile.TemporaryDirectory(dir = save_folder) as temp_folder:
+            save_paths_list = [os.path.join(temp_folder, "frames_{0:d}{1}".format(i, extension)) for i in range(len(frame_stacks_list))]
+            write_start_time = time.perf_counter()
+            for frame_stack, save_path in zip(frame_stacks_list, save_paths_list):
+                rolling_camera_functions.save_frames(frame_stack, save_path, compression = compression)
+            write_time = time.perf_counter() - write_start_time
+            read_start_time = time.perf_counter()
+            for save_path in save_paths_list:
+                rolling_camera_functions.load_frames(save_path)
+            read_time = time.perf_counter() - read_start_time
+            file_byte_count = sum([os.path.getsize(save_path) for save_path in save_paths_list])
+        print("{0:<10}{1:<10}{2:>14.1f}{3:>14.1f}{4:>12.2f}".format(extension, str(compression), raw_byte_count / write_time / 1e6, 
+                                                                raw_byte_count / read_time / 1e6, raw_byte_count / file_byte_count))
+
+
+HELP_ALIASES = ["h", "help", "HELP", "Help"]
+
+def parse_clas():
+    cla_list = sys.argv[1:]
+    if len(cla_list) > 0 and cla_list[0] in HELP_ALIASES:
+        help_function()
+        exit(0)
+    settings_dict = DEFAULT_SETTINGS_DICT.copy()
+    for cla in cla_list:
+        key, value_string = cla.split("=")
+        if not key in settings_dict:
+            raise ValueError("Unrecognized setting: {0}".format(key))
+        settings_dict[key] = type(settings_dict[key])(value_string)
+    return settings_dict
+
+
+def help_function():
+    print("Frame Format Benchmark")
+    print("Measures write and read throughput and compression ratio of each save_frames format on simulated absorption images.")
+    print("Ratio is the uncompressed size of the frames divided by the size on disk.")
+    print("CLAs:")
+    print("Any number of key=value pairs overriding the defaults:")
+    for key in DEFAULT_SETTINGS_DICT:
+        print("    {0} (default {1})".format(key, DEFAULT_SETTINGS_DICT[key]))
+    print("save_folder sets where the temporary files are written, e.g. a network share; by default the system temp folder.")
+
+
+if __name__ == "__main__":
+    main()
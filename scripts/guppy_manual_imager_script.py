@@ -14,7 +14,7 @@ sys.path.insert(0, path_to_satyendra)
 
 from BEC1_Analysis.code import image_processing_functions, measurement
 
-from satyendra.code import plotting_utilities, loading_functions
+from satyendra.code import absorption_imaging_functions, plotting_utilities, loading_functions
 from satyendra.code.instruments.cameras import guppy_camera
 
 
@@ -103,10 +103,9 @@ def parse_clas():
 
 
 def setup_camera(cam, camera_parameter_dict, camera_parameter_override_dict):
-    for key in camera_parameter_dict:
-        cam.set_property(key, camera_parameter_dict[key])
-    for key in camera_parameter_override_dict:
-        cam.set_property(key, camera_parameter_override_dict[key])
+    properties_dict = dict(camera_parameter_dict)
+    properties_dict.update(camera_parameter_override_dict)
+    cam.apply_properties(properties_dict)
 
 
 #Convenience method that "interprets" the images according to the camera name.
@@ -127,11 +126,12 @@ def handle_image(camera_name, frame_array, roi_coords):
         fluorescence_sum = np.sum(background_subtracted_fluorescence.astype(float))
         result_string += "Fluorescence pixel sum: {0:.4e}\n".format(fluorescence_sum)
     elif camera_name == "MOT":
-        absorption_od_image = image_processing_functions.get_absorption_od_image(frame_array, ROI = roi_coords)
         if not roi_coords is None:
             x_min, y_min, x_max, y_max = roi_coords 
-            absorption_od_image = absorption_od_image[y_min:y_max, x_min:x_max] 
-            od_sum = np.sum(absorption_od_image)
+            #Only the OD within the ROI is reported, so only it is computed
+            with_atoms, without_atoms, dark = [frame[y_min:y_max, x_min:x_max] for frame in frame_array[:3]]
+            absorption_od_image = absorption_imaging_functions.get_od_image(with_atoms, without_atoms, dark)
+            od_sum = np.sum(absorption_od_image, dtype = np.float64)
             result_string += "OD pixel sum: {0:.4e}\n".format(od_sum) 
     else:
         pass 
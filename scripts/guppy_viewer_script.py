@@ -61,10 +61,9 @@ def parse_clas():
 
 
 def setup_camera(cam, camera_parameter_dict, camera_parameter_override_dict):
-    for key in camera_parameter_dict:
-        cam.set_property(key, camera_parameter_dict[key])
-    for key in camera_parameter_override_dict:
-        cam.set_property(key, camera_parameter_override_dict[key])
+    properties_dict = dict(camera_parameter_dict)
+    properties_dict.update(camera_parameter_override_dict)
+    cam.apply_properties(properties_dict)
 
 
 
@@ -1,6 +1,8 @@
+import contextlib
 import datetime
 import sys 
 import os
+import time
 
 path_to_file = os.path.dirname(os.path.abspath(__file__))
 path_to_satyendra = path_to_file + "/../../"
@@ -8,35 +10,228 @@ path_to_satyendra = path_to_file + "/../../"
 sys.path.insert(0, path_to_satyendra)
 
 from satyendra.code import loading_functions
-from satyendra.code.instruments.cameras import rolling_camera_functions
+from satyendra.code.instruments.cameras import acquisition_pipeline, frame_broadcast, rolling_camera_functions
 
 DATETIME_FORMAT_STRING = "%Y-%m-%d--%H-%M-%S"
 FILENAME_DELIMITER_CHAR = "_"
+DEFAULT_SHOT_TIMEOUT_SECS = 1.0
+DEFAULT_STATS_INTERVAL_SECS = 60.0
+DEFAULT_PIPELINE_QUEUE_LENGTH = 4
+#"frames" publishes every frame the camera delivers; "sequences" only the frames of complete sequences
+DEFAULT_BROADCAST_MODE = "frames"
+#Key under which a single camera's sequences are passed through the pipeline
+SINGLE_CAMERA_NAME = "camera"
 
 def main():
     acquisition_settings = parse_clas()
-    with initialize_camera(acquisition_settings) as cam:
-        savefolder_pathname = acquisition_settings["savefolder_path"]
-        exposure_groupings_dict = acquisition_settings["exposure_groupings"]
-        exposure_groupings_indices_list = [] 
-        for key in exposure_groupings_dict:
-            exposure_groupings_indices_list.append(exposure_groupings_dict[key]) 
-        exposure_grouping_names_list = list(exposure_groupings_dict)
+    if "cameras" in acquisition_settings:
+        acquire_multi_camera(acquisition_settings)
+    else:
+        acquire_single_camera(acquisition_settings)
+
+
+def acquire_single_camera(acquisition_settings):
+    with initialize_camera(acquisition_settings) as cam, contextlib.ExitStack() as publishers_exit_stack:
+        print("Initialization complete. Rolling - use Ctrl+C to exit.")
+        #Optional settings; by default, frames are grouped by count with a software timeout
+        grouping_mode = acquisition_settings.get("grouping_mode", "count")
+        max_frame_gap = acquisition_settings.get("max_frame_gap_secs")
+        frame_callback = get_frame_publishing_callback(acquisition_settings, publishers_exit_stack)
+        with rolling_camera_functions.RollingFrameSequenceAssembler(cam, acquisition_settings["frames_per_sequence"], 
+                                                                    acquisition_settings["frame_sequence_timeout_secs"], 
+                                                                    grouping_mode = grouping_mode, max_frame_gap = max_frame_gap, 
+                                                                    frame_callback = frame_callback) as assembler:
+            def get_shot():
+                #Wake periodically so that Ctrl+C is handled promptly
+                frames = assembler.get_sequence(timeout = 1.0)
+                if frames is None:
+                    return None
+                return (datetime.datetime.now(), {SINGLE_CAMERA_NAME:frames})
+            run_acquisition_pipeline(get_shot, assembler.get_stats, acquisition_settings, {SINGLE_CAMERA_NAME:acquisition_settings})
+
+
+"""
+Acquire synchronized shots from several cameras, each configured as for a single camera under a "cameras" dict in the 
+acquisition settings. Every sequence in a shot is saved with the same datetime, and each file is labelled with its camera's 
+name as well as its exposure grouping's, e.g. "Side_TopA"."""
+def acquire_multi_camera(acquisition_settings):
+    camera_settings_dict = acquisition_settings["cameras"]
+    with contextlib.ExitStack() as exit_stack:
+        #Entered first so that the broadcasts are closed only after the manager stops publishing to them
+        publishers_exit_stack = exit_stack.enter_context(contextlib.ExitStack())
+        camera_configs_dict = {}
+        for camera_name in camera_settings_dict:
+            camera_settings = camera_settings_dict[camera_name]
+            cam = exit_stack.enter_context(initialize_camera(camera_settings))
+            camera_configs_dict[camera_name] = {"cam":cam, "num_frames":camera_settings["frames_per_sequence"], 
+                                                "frame_timeout":camera_settings["frame_sequence_timeout_secs"], 
+                                                "shot_timeout":camera_settings.get("shot_timeout_secs", DEFAULT_SHOT_TIMEOUT_SECS), 
+                                                "grouping_mode":camera_settings.get("grouping_mode", "count"), 
+                                                "max_frame_gap":camera_settings.get("max_frame_gap_secs"), 
+                                                "exposure_grouping_names":list(camera_settings["exposure_groupings"]), 
+                                                "frame_callback":get_frame_publishing_callback(camera_settings, publishers_exit_stack)}
         print("Initialization complete. Rolling - use Ctrl+C to exit.")
+        manager = exit_stack.enter_context(rolling_camera_functions.MultiCameraAcquisitionManager(camera_configs_dict))
+        reported_incomplete_shot_count = 0
+        def get_shot():
+            nonlocal reported_incomplete_shot_count
+            if manager.incomplete_shot_count > reported_incomplete_shot_count:
+                reported_incomplete_shot_count = manager.incomplete_shot_count
+                print("WARNING: Discarded a shot missing a camera's frames. {0} incomplete shots in total.".format(reported_incomplete_shot_count))
+            return manager.get_shot(timeout = 1.0)
+        run_acquisition_pipeline(get_shot, manager.get_stats, acquisition_settings, camera_settings_dict, 
+                                label_with_camera_names = True)
+
+
+"""
+Run the acquisition loop, passing each shot through the pipeline regroup -> encode -> write -> notify. 
+
+The loop itself is the acquire stage: it only takes shots from get_shot, a function returning a tuple 
+(acquisition_datetime, {camera_name:frames}) or None, publishes their frames for viewers where a camera's "broadcast_mode" is 
+"sequences", and submits them to the pipeline, 
+so that it never waits on the later stages. Each later stage runs on its own worker threads behind a bounded queue; if the 
+pipeline is backed up all the way to the acquire stage, the shot is discarded with a warning, rather than frames being 
+dropped silently by the camera. Acquisition and pipeline statistics, including per-stage timing, are printed every 
+stats_interval_secs. If label_with_camera_names is True, each saved file's exposure grouping name is prefixed by its 
+camera's name."""
+def run_acquisition_pipeline(get_shot, get_acquisition_stats, acquisition_settings, camera_settings_dict, label_with_camera_names = False):
+    #The save format is set by save_extension; save_compression optionally overrides the format's default codec
+    save_compression = acquisition_settings.get("save_compression")
+
+    def regroup_stage(shot_dict):
+        groupings_list = []
+        for camera_name in shot_dict["sequences_dict"]:
+            for exposure_grouping_name, frames, header_dict in regroup_sequence(shot_dict["sequences_dict"][camera_name], 
+                                                                                camera_settings_dict[camera_name]):
+                if label_with_camera_names:
+                    exposure_grouping_name = rolling_camera_functions.get_exposure_grouping_label(camera_name, exposure_grouping_name)
+                groupings_list.append((exposure_grouping_name, frames, header_dict))
+        return {"datetime_string":shot_dict["datetime_string"], "groupings_list":groupings_list}
+
+    def encode_stage(shot_dict):
+        encoded_files_list = []
+        for exposure_grouping_name, frames, header_dict in shot_dict["groupings_list"]:
+            filename_sans_extension = FILENAME_DELIMITER_CHAR.join((shot_dict["datetime_string"], exposure_grouping_name))
+            filename = filename_sans_extension + acquisition_settings["save_extension"]
+            file_path = os.path.join(acquisition_settings["savefolder_path"], filename)
+            encoded_bytes = rolling_camera_functions.encode_frames(frames, file_path, compression = save_compression, header_dict = header_dict)
+            encoded_files_list.append((file_path, encoded_bytes))
+        return {"datetime_string":shot_dict["datetime_string"], "encoded_files_list":encoded_files_list}
+
+    def write_stage(shot_dict):
+        #Attempt every file of the shot before reporting a failure
+        write_errors_list = []
+        for file_path, encoded_bytes in shot_dict["encoded_files_list"]:
+            try:
+                rolling_camera_functions.write_encoded_frames(encoded_bytes, file_path)
+            except OSError as e:
+                write_errors_list.append(e)
+        if len(write_errors_list) > 0:
+            raise write_errors_list[0]
+        return shot_dict
+
+    def notify_stage(shot_dict):
+        print("Saved at: {0}".format(shot_dict["datetime_string"]))
+
+    stages_list = [("regroup", regroup_stage, 1), ("encode", encode_stage, acquisition_settings.get("encoder_threads", 1)), 
+                    ("write", write_stage, acquisition_settings.get("writer_threads", 1)), ("notify", notify_stage, 1)]
+    pipeline_queue_length = acquisition_settings.get("pipeline_queue_length", DEFAULT_PIPELINE_QUEUE_LENGTH)
+    stats_interval = acquisition_settings.get("stats_interval_secs", DEFAULT_STATS_INTERVAL_SECS)
+    with acquisition_pipeline.AcquisitionPipeline(stages_list, max_queued_items = pipeline_queue_length) as pipeline, \
+        contextlib.ExitStack() as publishers_exit_stack:
+        publishers_dict = {}
+        reported_failure_count = 0
+        last_stats_time = time.monotonic()
         while True:
-            frames = rolling_camera_functions.acquire_rolling_frame_sequence(cam, acquisition_settings["frames_per_sequence"],
-                                                                            acquisition_settings["frame_sequence_timeout_secs"])
-            if not frames is None:
-                acquisition_datetime = datetime.datetime.now()
+            shot = get_shot()
+            if not shot is None:
+                acquisition_datetime, sequences_dict = shot
                 acquisition_datetime_string = acquisition_datetime.strftime(DATETIME_FORMAT_STRING)
-                regrouped_exposures_list = rolling_camera_functions.regroup_numpy_frames(frames, exposure_groupings_indices_list)
-                for regrouped_exposures, exposure_grouping_name in zip(regrouped_exposures_list, exposure_grouping_names_list):
-                    filename_sans_extension = FILENAME_DELIMITER_CHAR.join((acquisition_datetime_string, exposure_grouping_name))
-                    filename = filename_sans_extension + acquisition_settings["save_extension"]
-                    file_path = os.path.join(acquisition_settings["savefolder_path"], filename)
-                    rolling_camera_functions.save_frames(regrouped_exposures, file_path)
-                print("Saved at: {0}".format(acquisition_datetime_string))
-                
+                for camera_name in sequences_dict:
+                    publish_sequence(publishers_dict, publishers_exit_stack, sequences_dict[camera_name], camera_settings_dict[camera_name])
+                if not pipeline.submit({"datetime_string":acquisition_datetime_string, "sequences_dict":sequences_dict}):
+                    print("WARNING: Pipeline full; frames at {0} were not saved. {1} shots discarded in total.".format(
+                        acquisition_datetime_string, pipeline.rejected_item_count))
+            for stage_name, shot_dict, e in pipeline.failed_items_list[reported_failure_count:]:
+                print("WARNING: {0} stage failed for frames at {1}: {2}".format(stage_name, shot_dict["datetime_string"], e))
+            reported_failure_count = len(pipeline.failed_items_list)
+            if time.monotonic() - last_stats_time > stats_interval:
+                last_stats_time = time.monotonic()
+                report_stats({"acquisition":get_acquisition_stats(), "pipeline":pipeline.get_stats()})
+
+
+#Regroup a camera's sequence by its exposure groupings, cropping and binning where configured. Returns a list of tuples 
+#(exposure_grouping_name, frames, header_dict).
+def regroup_sequence(frames, camera_settings):
+    exposure_groupings_dict = camera_settings["exposure_groupings"]
+    exposure_groupings_indices_list = [exposure_groupings_dict[key] for key in exposure_groupings_dict]
+    regrouped_exposures_list = rolling_camera_functions.regroup_numpy_frames(frames, exposure_groupings_indices_list)
+    #Optional per-grouping {name:[x_min, y_min, x_max, y_max]} and {name:bin_size}; groupings not listed are saved in full
+    exposure_grouping_rois_dict = camera_settings.get("exposure_grouping_rois", {})
+    exposure_grouping_binning_dict = camera_settings.get("exposure_grouping_binning", {})
+    groupings_list = []
+    for regrouped_exposures, exposure_grouping_name in zip(regrouped_exposures_list, exposure_groupings_dict):
+        header_dict = None
+        if exposure_grouping_name in exposure_grouping_rois_dict or exposure_grouping_name in exposure_grouping_binning_dict:
+            regrouped_exposures, header_dict = rolling_camera_functions.crop_and_bin_frames(regrouped_exposures, 
+                                                        roi = exposure_grouping_rois_dict.get(exposure_grouping_name), 
+                                                        binning = exposure_grouping_binning_dict.get(exposure_grouping_name, 1))
+        groupings_list.append((exposure_grouping_name, regrouped_exposures, header_dict))
+    return groupings_list
+
+
+"""
+Get a function publishing every frame read from a camera for viewers, to be passed to the camera's 
+RollingFrameSequenceAssembler as its frame_callback, or None if the camera settings contain no "broadcast_name" or set 
+"broadcast_mode" to "sequences". Frames are published as they arrive, including those of incomplete or excess sequences 
+which are flushed rather than saved, so that a viewer shows what the camera actually received. The broadcast is created on 
+the first frame, once the frame size is known, and is closed by exit_stack."""
+def get_frame_publishing_callback(camera_settings, exit_stack):
+    broadcast_name = camera_settings.get("broadcast_name")
+    if broadcast_name is None or camera_settings.get("broadcast_mode", DEFAULT_BROADCAST_MODE) != "frames":
+        return None
+    publisher = None
+    def publish_frame(frame):
+        nonlocal publisher
+        if publisher is None:
+            publisher = exit_stack.enter_context(frame_broadcast.FrameBroadcastPublisher(broadcast_name, frame.nbytes))
+        publisher.publish(frame)
+    return publish_frame
+
+
+"""
+Publish each frame of a complete sequence for viewers, if the camera settings contain a "broadcast_name" and set 
+"broadcast_mode" to "sequences". The broadcast is created on the first sequence, once the frame size is known, and is closed 
+by exit_stack."""
+def publish_sequence(publishers_dict, exit_stack, frames, camera_settings):
+    broadcast_name = camera_settings.get("broadcast_name")
+    if broadcast_name is None or camera_settings.get("broadcast_mode", DEFAULT_BROADCAST_MODE) != "sequences":
+        return
+    if not broadcast_name in publishers_dict:
+        max_frame_nbytes = max([frame.nbytes for frame in frames])
+        publishers_dict[broadcast_name] = exit_stack.enter_context(frame_broadcast.FrameBroadcastPublisher(broadcast_name, max_frame_nbytes))
+    for frame in frames:
+        publishers_dict[broadcast_name].publish(frame)
+
+
+#Print acquisition health counters, flattening nested dicts into dotted keys, so that buffer lengths and timeouts can be tuned
+def report_stats(stats_dict):
+    def flatten_stats(nested_dict, prefix):
+        flat_items_list = []
+        for key in nested_dict:
+            if isinstance(nested_dict[key], dict):
+                flat_items_list.extend(flatten_stats(nested_dict[key], prefix + key + "."))
+            else:
+                flat_items_list.append((prefix + key, nested_dict[key]))
+        return flat_items_list
+    stats_string = ", ".join(["{0}={1}".format(key, _format_stat(value)) for key, value in flatten_stats(stats_dict, "")])
+    print("Stats at {0}: {1}".format(datetime.datetime.now().strftime(DATETIME_FORMAT_STRING), stats_string))
+
+def _format_stat(value):
+    if isinstance(value, float):
+        return "{0:.3g}".format(value)
+    return str(value)
+
 
 help_aliases = ["help", "Help", "HELP", "h"]
 
@@ -57,11 +252,12 @@ def initialize_camera(acquisition_settings):
     if acquisition_settings["camera_type"] == "guppy":
         from satyendra.code.instruments.cameras import guppy_camera 
         cam = guppy_camera.GuppyCamera(camera_id)
+    elif acquisition_settings["camera_type"] == "simulated":
+        from satyendra.code.instruments.cameras import simulated_camera 
+        cam = simulated_camera.SimulatedCamera(camera_id)
     else:
         raise ValueError("Unsupported camera type")
-    camera_acquisition_parameters = acquisition_settings["acquisition_parameters"]
-    for key in camera_acquisition_parameters:
-        cam.set_property(key, camera_acquisition_parameters[key])
+    cam.apply_properties(acquisition_settings["acquisition_parameters"])
     cam.start_video()
     return cam
 
@@ -70,6 +266,10 @@ def help_function():
     print("A script for acquiring images from a free-running camera, e.g. Andor or guppy.")
     print("CLAS:")
     print("1: Acquisitions_Name (str): A name, as specified in image_acquisition_config_local, encoding the acquisition type.")
+    print("If the acquisition settings contain a 'cameras' dict of per-camera settings, all of the cameras are acquired together,")
+    print("and each shot is saved only once every camera's frames have arrived.")
+    print("If a camera's settings contain a 'broadcast_name', every frame it delivers is also published for broadcast_viewer_script;")
+    print("with 'broadcast_mode' set to 'sequences', only the frames of complete sequences are published.")
 
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ path_to_satyendra = path_to_file + "/../../"
 sys.path.insert(0, path_to_satyendra)
 
 from satyendra.code.image_watchdog import ImageWatchdog
+from satyendra.code.dataset_catalog import DatasetCatalog
 from satyendra.code import loading_functions
 
 IMAGE_EXTENSION = ".fits"
@@ -22,7 +23,7 @@ def main():
     imaging_type = parse_clas()
     print("Welcome to the image saving script!\n")
     print("Images will be labelled with run_ids and saved in today's folder under a user-chosen name.\n") 
-    camera_saving_folder_pathname, saving_location_root_pathname, image_specification_list = load_config(imaging_type)
+    camera_saving_folder_pathname, saving_location_root_pathname, image_specification_list, dataset_catalog_pathname = load_config(imaging_type)
     savefolder_pathname = None 
     while not savefolder_pathname:
         user_entered_name = prompt_for_savefolder_input() 
@@ -31,7 +32,11 @@ def main():
     if is_dryrun:
         print("Running as a dry run. WARNING: All images will be deleted on termination.\n")
     print("Initializing watchdog...\n")
-    my_watchdog = ImageWatchdog(camera_saving_folder_pathname, savefolder_pathname, image_specification_list, image_extension = IMAGE_EXTENSION)
+    dataset_catalog = None
+    if dataset_catalog_pathname and not is_dryrun:
+        dataset_catalog = DatasetCatalog(dataset_catalog_pathname)
+    my_watchdog = ImageWatchdog(camera_saving_folder_pathname, savefolder_pathname, image_specification_list, image_extension = IMAGE_EXTENSION, 
+                                dataset_catalog = dataset_catalog)
     print("Running! Interrupt with Ctrl+C at your leisure.\n") 
     try:
         while True:
@@ -45,6 +50,8 @@ def main():
         my_watchdog.save_run_parameters()
         print("Success!") 
     finally:
+        if not dataset_catalog is None:
+            dataset_catalog.close()
         if(is_dryrun):
             nuke_savefolder(savefolder_pathname)
 
@@ -64,7 +71,9 @@ def load_config(imaging_type):
     camera_saving_folder_pathname = type_specific_config_dict["camera_saving_folder_pathname"]
     saving_location_root_pathname = type_specific_config_dict["saving_location_root_pathname"]
     image_names_list = type_specific_config_dict["image_names_list"]
-    return (camera_saving_folder_pathname, saving_location_root_pathname, image_names_list)
+    #Optional; if absent, saved images are not catalogued
+    dataset_catalog_pathname = type_specific_config_dict.get("dataset_catalog_pathname")
+    return (camera_saving_folder_pathname, saving_location_root_pathname, image_names_list, dataset_catalog_pathname)
 
 def prompt_for_savefolder_input():
     input_is_ok = False 
@@ -0,0 +1,77 @@
+import sys 
+import os
+import time
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.instruments.cameras import rolling_camera_functions
+from satyendra.code.instruments.cameras.simulated_camera import SimulatedCamera
+
+DEFAULT_SETTINGS_DICT = {"duration_secs":10.0, "grouping_mode":"count", "Height":488, "Width":648, "BitDepth":12, 
+                        "FramesPerSequence":3, "FrameInterval":0.01, "SequenceInterval":0.1, "DropProbability":0.0, 
+                        "buffer_length":10}
+
+def main():
+    settings_dict = parse_clas()
+    frames_per_sequence = settings_dict["FramesPerSequence"]
+    frame_interval = settings_dict["FrameInterval"]
+    #Timeouts and gaps sit halfway between the intra- and inter-sequence spacings
+    sequence_gap = settings_dict["SequenceInterval"] - (frames_per_sequence - 1) * frame_interval
+    frame_timeout = (frames_per_sequence - 1) * frame_interval + sequence_gap / 2
+    max_frame_gap = (frame_interval + sequence_gap) / 2
+    with SimulatedCamera(seed = 0) as cam:
+        for key in ["Height", "Width", "BitDepth", "FramesPerSequence", "FrameInterval", "SequenceInterval", "DropProbability"]:
+            cam.set_property(key, settings_dict[key])
+        cam.start_video(buffer_length = settings_dict["buffer_length"])
+        sequence_count = 0 
+        byte_count = 0
+        start_time = time.perf_counter()
+        with rolling_camera_functions.RollingFrameSequenceAssembler(cam, frames_per_sequence, frame_timeout, 
+                                                                    grouping_mode = settings_dict["grouping_mode"], 
+                                                                    max_frame_gap = max_frame_gap) as assembler:
+            while time.perf_counter() - start_time < settings_dict["duration_secs"]:
+                frames = assembler.get_sequence(timeout = 0.1)
+                if not frames is None:
+                    sequence_count += 1 
+                    byte_count += sum([f.nbytes for f in frames])
+        elapsed_time = time.perf_counter() - start_time
+        overrun_count = cam.get_video_buffer_overrun_count()
+        cam.stop_video()
+    expected_sequence_count = elapsed_time / settings_dict["SequenceInterval"]
+    print("Grouping mode: {0}".format(settings_dict["grouping_mode"]))
+    print("Sequences acquired: {0:d} of ~{1:.0f} triggered".format(sequence_count, expected_sequence_count))
+    print("Sequence rate: {0:.2f} /s".format(sequence_count / elapsed_time))
+    print("Throughput: {0:.2f} MB/s".format(byte_count / elapsed_time / 1e6))
+    print("Buffer overruns: {0:d}".format(overrun_count))
+
+
+HELP_ALIASES = ["h", "help", "HELP", "Help"]
+
+def parse_clas():
+    cla_list = sys.argv[1:]
+    if len(cla_list) > 0 and cla_list[0] in HELP_ALIASES:
+        help_function()
+        exit(0)
+    settings_dict = DEFAULT_SETTINGS_DICT.copy()
+    for cla in cla_list:
+        key, value_string = cla.split("=")
+        if not key in settings_dict:
+            raise ValueError("Unrecognized setting: {0}".format(key))
+        settings_dict[key] = type(settings_dict[key])(value_string)
+    return settings_dict
+
+
+def help_function():
+    print("Simulated Acquisition Benchmark")
+    print("Measures acquisition throughput and frame loss of the rolling frame assembler against a SimulatedCamera.")
+    print("CLAs:")
+    print("Any number of key=value pairs overriding the defaults:")
+    for key in DEFAULT_SETTINGS_DICT:
+        print("    {0} (default {1})".format(key, DEFAULT_SETTINGS_DICT[key]))
+
+
+if __name__ == "__main__":
+    main()
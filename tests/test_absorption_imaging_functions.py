@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code import absorption_imaging_functions
+
+
+def _get_test_frames():
+    rng = np.random.default_rng(0)
+    dark = rng.integers(0, 50, size = (40, 60)).astype(np.uint16)
+    without_atoms = dark + rng.integers(500, 4000, size = (40, 60)).astype(np.uint16)
+    with_atoms = dark + (rng.random((40, 60)) * (without_atoms - dark)).astype(np.uint16)
+    #Undefined and infinite pixels: 0/0, and 0 and negative transmission
+    with_atoms[0, 0] = without_atoms[0, 0] = dark[0, 0]
+    with_atoms[0, 1] = dark[0, 1]
+    with_atoms[0, 2] = dark[0, 2] - 1 if dark[0, 2] > 0 else 0
+    return (with_atoms, without_atoms, dark)
+
+def _get_reference_od(with_atoms, without_atoms, dark, take_log, nan_value, clip_min, clip_max):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio = (with_atoms.astype(float) - dark) / (without_atoms.astype(float) - dark)
+        image = -np.log(ratio) if take_log else ratio
+    image = np.nan_to_num(image, nan = nan_value)
+    return np.clip(image, clip_min, clip_max)
+
+
+def _check_kernel(kernel):
+    with_atoms, without_atoms, dark = _get_test_frames()
+    od = kernel.get_od(with_atoms, without_atoms, dark, nan_value = 5.0, clip_min = 0.0, clip_max = 5.0)
+    assert od.dtype == np.float32
+    assert np.allclose(od, _get_reference_od(with_atoms, without_atoms, dark, True, 5.0, 0.0, 5.0), rtol = 1e-5, atol = 1e-5)
+    assert od[0, 0] == 5.0
+    assert od[0, 1] == 5.0
+    fake_od = kernel.get_fake_od(with_atoms, without_atoms, dark)
+    assert np.allclose(fake_od, _get_reference_od(with_atoms, without_atoms, dark, False, 0.0, None, None), rtol = 1e-5)
+    assert fake_od[0, 0] == 0.0
+    #Unclipped infinities become the largest finite value
+    unclipped_od = kernel.get_od(with_atoms, without_atoms, dark)
+    assert unclipped_od[0, 1] == np.finfo(np.float32).max
+    out = np.empty(with_atoms.shape, dtype = np.float32)
+    assert kernel.get_od(with_atoms, without_atoms, dark, out = out) is out
+    assert np.array_equal(out, unclipped_od)
+    #Non-contiguous views, e.g. an ROI, are accepted
+    roi_od = kernel.get_od(with_atoms[5:20, 10:50], without_atoms[5:20, 10:50], dark[5:20, 10:50])
+    assert np.array_equal(roi_od, unclipped_od[5:20, 10:50])
+    with pytest.raises(ValueError):
+        kernel.get_od(with_atoms, without_atoms, dark[1:])
+    with pytest.raises(ValueError):
+        kernel.get_od(with_atoms, without_atoms, dark, out = np.empty(with_atoms.shape))
+
+
+def test_absorption_image_kernel():
+    _check_kernel(absorption_imaging_functions.AbsorptionImageKernel(use_numba = False))
+    if not absorption_imaging_functions.numba is None:
+        _check_kernel(absorption_imaging_functions.AbsorptionImageKernel(use_numba = True))
+    with_atoms, without_atoms, dark = _get_test_frames()
+    assert np.allclose(absorption_imaging_functions.get_od_image(with_atoms, without_atoms, dark),
+                        absorption_imaging_functions.AbsorptionImageKernel(use_numba = False).get_od(with_atoms, without_atoms, dark))
@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+import time
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.instruments.cameras.acquisition_pipeline import AcquisitionPipeline
+
+
+def test_acquisition_pipeline():
+    results_list = []
+    def double_stage(item):
+        if item == 3:
+            raise ValueError("Simulated stage failure")
+        return 2 * item
+    def drop_stage(item):
+        return None if item == 4 else item
+    stages_list = [("double", double_stage, 2), ("drop", drop_stage, 1), ("record", results_list.append, 1)]
+    with AcquisitionPipeline(stages_list, max_queued_items = 8) as pipeline:
+        for i in range(5):
+            assert pipeline.submit(i)
+    #3 fails in the first stage, and 4 (from 2) is dropped by the second
+    assert sorted(results_list) == [0, 2, 8]
+    stats_dict = pipeline.get_stats()
+    assert stats_dict["double"]["items_processed"] == 4
+    assert stats_dict["double"]["items_failed"] == 1
+    assert stats_dict["record"]["items_processed"] == 3
+    assert pipeline.failed_items_list[0][:2] == ("double", 3)
+
+
+def test_acquisition_pipeline_back_pressure():
+    release_event = threading.Event()
+    def slow_stage(item):
+        release_event.wait()
+        return item
+    with AcquisitionPipeline([("pass", lambda item: item, 1), ("slow", slow_stage, 1)], max_queued_items = 1) as pipeline:
+        #One item held by each worker and one in each queue fill the pipeline
+        submitted_count = 0
+        start_time = time.monotonic()
+        while time.monotonic() - start_time < 2.0 and pipeline.rejected_item_count == 0:
+            if pipeline.submit(submitted_count):
+                submitted_count += 1
+            time.sleep(0.01)
+        assert pipeline.rejected_item_count == 1
+        assert submitted_count == 4
+        release_event.set()
+    assert pipeline.get_stats()["slow"]["items_processed"] == 4
+    assert pipeline.get_stats()["pass"]["blocked_total_secs"] > 0
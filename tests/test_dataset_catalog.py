@@ -0,0 +1,63 @@
+import datetime 
+import json
+import os
+import shutil
+import sys
+
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.dataset_catalog import DatasetCatalog, parse_image_filename
+
+RESOURCE_DIR_PATH = "resources"
+TEMP_FOLDER_PATH = os.path.join(RESOURCE_DIR_PATH, "Catalog_Temp")
+CATALOG_PATHNAME = os.path.join(RESOURCE_DIR_PATH, "dataset_catalog_temp.sqlite")
+
+SPOOF_RUN_PARAMETERS_DICT = {
+    "805383":{"id":805383, "runtime":"2022-04-06T09:56:19Z", "ListBoundVariables":["foo"], "foo":1.0, "bar":3},
+    "805384":{"id":805384, "runtime":"2022-04-06T09:56:58Z", "ListBoundVariables":["foo"], "foo":2.0, "bar":3},
+    "805734":{"id":805734, "runtime":"2022-04-06T15:48:46Z", "ListBoundVariables":["foo"], "foo":1.0, "bar":3},
+    "805735":{"id":805735, "runtime":"2022-04-06T15:49:52Z", "ListBoundVariables":["foo"], "foo":2.0, "bar":3}
+}
+
+
+def test_parse_image_filename():
+    assert parse_image_filename("805734_2022-04-06--15-48-46_TopA.fits") == (805734, datetime.datetime(2022, 4, 6, 15, 48, 46), "TopA")
+    assert parse_image_filename("unmatched_2022-04-06--15-48-46_Side.fits") == (None, datetime.datetime(2022, 4, 6, 15, 48, 46), "Side")
+    assert parse_image_filename("garbage.fits") == (None, None, None)
+
+
+def test_update_folder_and_query():
+    try:
+        shutil.copytree(os.path.join(RESOURCE_DIR_PATH, "Modern_Format_Filenames"), TEMP_FOLDER_PATH)
+        with open(os.path.join(TEMP_FOLDER_PATH, "run_params_dump.json"), 'w') as json_file:
+            json.dump(SPOOF_RUN_PARAMETERS_DICT, json_file)
+        with DatasetCatalog(CATALOG_PATHNAME) as catalog:
+            assert catalog.update_folder(TEMP_FOLDER_PATH) == 6
+            assert catalog.update_folder(TEMP_FOLDER_PATH) == 0
+            run_images = catalog.find_images(run_id = 805734)
+            assert [f[2] for f in run_images] == ["TopA", "TopB"]
+            assert run_images[0][1] == datetime.datetime(2022, 4, 6, 15, 48, 46)
+            assert os.path.basename(run_images[0][3]) == "805734_2022-04-06--15-48-46_TopA.fits"
+            assert len(catalog.find_images(image_type = "Side")) == 2
+            assert len(catalog.find_images(parameter_values = {"foo":1})) == 3
+            assert len(catalog.find_images(image_type = "TopB", parameter_values = {"foo":2.0})) == 1
+            #Only list-bound variables are catalogued
+            assert len(catalog.find_images(parameter_values = {"bar":3})) == 0
+            assert catalog.get_run_parameters(805384) == {"foo":2.0}
+            datetime_range = [datetime.datetime(2022, 4, 6, 15, 0, 0), datetime.datetime(2022, 4, 6, 16, 0, 0)]
+            assert len(catalog.find_images(datetime_range = datetime_range)) == 4
+            os.remove(os.path.join(TEMP_FOLDER_PATH, "805383_2022-04-06--09-56-19_Side.fits"))
+            catalog.update_folder(TEMP_FOLDER_PATH)
+            assert len(catalog.find_images(image_type = "Side")) == 1
+            #Adding an image directly, as the watchdog does
+            new_image_pathname = os.path.join(TEMP_FOLDER_PATH, "805999_2022-04-06--16-00-00_Side.fits")
+            shutil.copy2(os.path.join(TEMP_FOLDER_PATH, "805384_2022-04-06--09-56-58_Side.fits"), new_image_pathname)
+            catalog.add_image(new_image_pathname, run_parameters = {"id":805999, "ListBoundVariables":["foo"], "foo":5.0})
+            assert len(catalog.find_images(parameter_values = {"foo":5})) == 1
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)
+        if os.path.exists(CATALOG_PATHNAME):
+            os.remove(CATALOG_PATHNAME)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.instruments.cameras.frame_broadcast import FrameBroadcastPublisher, FrameBroadcastSubscriber
+
+BROADCAST_NAME = "satyendra_test_broadcast"
+
+
+def test_frame_broadcast():
+    with FrameBroadcastPublisher(BROADCAST_NAME, 2 * 3 * 4 * 2, slot_count = 3) as publisher:
+        with FrameBroadcastSubscriber(BROADCAST_NAME) as subscriber:
+            assert subscriber.get_newest_frame() is None
+            publisher.publish(np.full((2, 3), 1, dtype = np.uint16), timestamp = 1.0)
+            frame, metadata = subscriber.get_newest_frame(return_metadata = True)
+            assert frame.shape == (2, 3)
+            assert frame.dtype == np.uint16
+            assert np.all(frame == 1)
+            assert metadata == {"sequence_number":1, "timestamp":1.0}
+            assert not frame.flags.writeable
+            #Nothing new has been published
+            assert subscriber.get_newest_frame() is None
+            #Stale frames are skipped
+            for i in range(2, 5):
+                publisher.publish(np.full((2, 3, 4), i, dtype = np.uint16))
+            frame, metadata = subscriber.get_newest_frame(return_metadata = True)
+            assert frame.shape == (2, 3, 4)
+            assert np.all(frame == 4)
+            assert subscriber.dropped_frame_count == 2
+            assert subscriber.is_frame_current(metadata["sequence_number"])
+            copied_frame = frame.copy()
+            del frame
+            #Overwrite the slot holding the frame
+            for i in range(3):
+                publisher.publish(np.zeros((2, 3), dtype = np.uint16))
+            assert not subscriber.is_frame_current(metadata["sequence_number"])
+            assert np.all(copied_frame == 4)
@@ -0,0 +1,153 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+pytest.importorskip("vimba")
+
+from satyendra.code.instruments.cameras.guppy_camera import GuppyCamera
+
+
+#Stands in for a vimba feature, recording every write made to it
+class _FakeFeature():
+
+    def __init__(self, fake_cam, key):
+        self.fake_cam = fake_cam
+        self.key = key
+
+    def get(self):
+        return self.fake_cam.get_value(self.key)
+
+    def set(self, value):
+        self.fake_cam.written_keys_list.append(self.key)
+        self.fake_cam.set_value(self.key, value)
+
+
+#Stands in for a vimba camera whose trigger features hold separate values for each selected trigger
+class _FakeVimbaCamera():
+
+    TRIGGER_KEYS = ["TriggerMode", "TriggerSource", "TriggerActivation", "TriggerDelay"]
+
+    def __init__(self):
+        self.values_dict = {"TriggerSelector":"ExposureStart", "ExposureAuto":"Off", "ExposureTime":100, "GainAuto":"Off",
+                            "Gain":0.0, "GainRaw":8, "Height":4, "Width":6}
+        self.trigger_values_dict = {}
+        self.written_keys_list = []
+        self.frame_handler = None
+        self.queued_frames_list = []
+
+    def get_pixel_format(self):
+        return "Mono8"
+
+    def start_streaming(self, frame_handler):
+        self.frame_handler = frame_handler
+
+    def is_streaming(self):
+        return not self.frame_handler is None
+
+    def queue_frame(self, frame):
+        self.queued_frames_list.append(frame)
+
+    def get_value(self, key):
+        if key in _FakeVimbaCamera.TRIGGER_KEYS:
+            default_trigger_values_dict = {"TriggerMode":"Off", "TriggerSource":"Freerun", "TriggerActivation":"RisingEdge", "TriggerDelay":0.0}
+            selected_trigger_values_dict = self.trigger_values_dict.get(self.values_dict["TriggerSelector"], {})
+            return selected_trigger_values_dict.get(key, default_trigger_values_dict[key])
+        return self.values_dict[key]
+
+    def set_value(self, key, value):
+        if key in _FakeVimbaCamera.TRIGGER_KEYS:
+            self.trigger_values_dict.setdefault(self.values_dict["TriggerSelector"], {})[key] = value
+        else:
+            self.values_dict[key] = value
+
+    def __getattr__(self, key):
+        if key in self.values_dict or key in _FakeVimbaCamera.TRIGGER_KEYS:
+            return _FakeFeature(self, key)
+        raise AttributeError(key)
+
+
+#Stands in for a vimba frame
+class _FakeVimbaFrame():
+
+    def __init__(self, frame_array, frame_id):
+        self.frame_array = frame_array
+        self.frame_id = frame_id
+
+    def as_numpy_ndarray(self):
+        return self.frame_array[:, :, np.newaxis]
+
+    def get_timestamp(self):
+        return self.frame_id * 1e6
+
+    def get_id(self):
+        return self.frame_id
+
+
+def _get_fake_guppy_camera():
+    cam = GuppyCamera.__new__(GuppyCamera)
+    cam.cam_id = "fake"
+    cam._video_frame_callbacks = []
+    cam._features_dict = {}
+    cam._property_values_cache = {}
+    cam._streaming_buffer = None
+    cam._frame_handling_latency_stats = None
+    cam.frame_handling_error_count = 0
+    cam.last_frame_handling_error = None
+    cam.cam = _FakeVimbaCamera()
+    return cam
+
+
+def test_apply_properties_trigger_selector():
+    cam = _get_fake_guppy_camera()
+    trigger_properties_dict = {"TriggerSource":"Line1", "TriggerMode":"On", "TriggerSelector":"ExposureStart"}
+    assert cam.apply_properties(trigger_properties_dict) == ["TriggerMode", "TriggerSource"]
+    assert cam.apply_properties(trigger_properties_dict) == []
+    #Selecting another trigger must invalidate the cached settings of the previous one
+    trigger_properties_dict["TriggerSelector"] = "FrameStart"
+    assert cam.apply_properties(trigger_properties_dict) == ["TriggerSelector", "TriggerMode", "TriggerSource"]
+    assert cam.cam.trigger_values_dict["FrameStart"] == {"TriggerMode":"On", "TriggerSource":"Line1"}
+    trigger_properties_dict["TriggerSelector"] = "ExposureStart"
+    assert cam.apply_properties(trigger_properties_dict) == ["TriggerSelector"]
+
+
+def test_apply_properties_auto_modes():
+    cam = _get_fake_guppy_camera()
+    assert cam.apply_properties({"ExposureAuto":"Off", "ExposureTime":200}) == ["ExposureTime"]
+    cam.cam.values_dict["ExposureTime"] = 300
+    #With the auto mode off, the cached value is trusted
+    assert cam.apply_properties({"ExposureTime":200}) == []
+    assert cam.apply_properties({"ExposureAuto":"Continuous", "ExposureTime":200}) == ["ExposureAuto", "ExposureTime"]
+    #The camera adjusts the exposure itself, so the value is read again rather than taken from the cache
+    cam.cam.values_dict["ExposureTime"] = 250
+    assert cam.apply_properties({"ExposureTime":200}) == ["ExposureTime"]
+    assert not "ExposureTime" in cam._property_values_cache
+    assert cam.get_property_snapshot()["ExposureTime"] == 200
+
+
+def test_frame_handler_requeues_frames():
+    cam = _get_fake_guppy_camera()
+    for stats_function in [cam.get_video_stats, cam.get_video_buffer_overrun_count]:
+        try:
+            stats_function()
+        except RuntimeError:
+            pass
+        else:
+            assert False
+    cam.start_video(buffer_length = 3)
+    callback_frame_counts_list = []
+    cam.add_video_frame_callback(lambda cam: callback_frame_counts_list.append(cam.get_video_buffer_num_available_frames()))
+    good_frame = _FakeVimbaFrame(np.ones((4, 6), dtype = np.uint8), 0)
+    #E.g. a frame which arrived after the ROI was changed without restarting video
+    bad_frame = _FakeVimbaFrame(np.ones((8, 6), dtype = np.uint8), 1)
+    for frame in [good_frame, bad_frame, good_frame]:
+        cam.cam.frame_handler(cam.cam, frame)
+    assert cam.cam.queued_frames_list == [good_frame, bad_frame, good_frame]
+    assert callback_frame_counts_list == [1, 2]
+    assert cam.get_video_stats()["frame_handling_errors"] == 1
+    assert isinstance(cam.last_frame_handling_error, ValueError)
@@ -0,0 +1,261 @@
+import os
+import shutil
+import sys
+import threading
+
+from astropy.io import fits
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code import image_browser_functions
+
+TEMP_FOLDER_PATH = os.path.join("resources", "Image_Browser_Temp")
+
+
+def test_decoded_frame_cache():
+    frame_nbytes = np.zeros((10, 10), dtype = np.uint16).nbytes
+    cache = image_browser_functions.DecodedFrameCache(max_nbytes = 3 * frame_nbytes)
+    for i in range(3):
+        assert cache.put(i, np.full((10, 10), i, dtype = np.uint16))
+    assert len(cache) == 3
+    assert cache.current_nbytes == 3 * frame_nbytes
+    #Using 0 makes 1 the least recently used entry
+    assert np.all(cache.get(0) == 0)
+    assert cache.put(3, np.full((10, 10), 3, dtype = np.uint16))
+    assert not 1 in cache
+    assert 0 in cache and 2 in cache and 3 in cache
+    assert cache.get(1) is None
+    assert cache.hit_count == 1
+    assert cache.miss_count == 1
+    #Cached values are shared and so read-only
+    assert not cache.get(0).flags.writeable
+    #Tuples of arrays are sized by their total
+    assert cache.put("pair", (np.zeros((10, 10), dtype = np.uint16), np.zeros((10, 10), dtype = np.uint16)))
+    assert cache.current_nbytes == 3 * frame_nbytes
+    assert len(cache) == 2
+    #Oversized values are not cached
+    assert not cache.put("big", np.zeros((40, 10), dtype = np.uint16))
+    assert not "big" in cache
+    compute_calls_list = []
+    def compute_function():
+        compute_calls_list.append(1)
+        return np.ones(5)
+    assert np.all(cache.get_or_compute("computed", compute_function) == 1)
+    assert np.all(cache.get_or_compute("computed", compute_function) == 1)
+    assert len(compute_calls_list) == 1
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.current_nbytes == 0
+    #The arrays put in the cache are left writeable for their owners
+    caller_frames = (np.zeros((2, 2)), np.zeros((2, 2)))
+    assert cache.put("caller_frames", caller_frames)
+    caller_frames[1][0, 0] = 1
+    assert all(frame.flags.writeable for frame in caller_frames)
+    assert all(not frame.flags.writeable for frame in cache.get("caller_frames"))
+    assert isinstance(cache.get("caller_frames"), tuple)
+
+
+def test_get_file_cache_key():
+    os.makedirs(TEMP_FOLDER_PATH)
+    try:
+        file_path = os.path.join(TEMP_FOLDER_PATH, "foo.fits")
+        with open(file_path, 'w') as f:
+            f.write("foo")
+        key = image_browser_functions.get_file_cache_key(file_path, "OD", 5.0)
+        assert key == image_browser_functions.get_file_cache_key(file_path, "OD", 5.0)
+        assert key[-2:] == ("OD", 5.0)
+        assert key != image_browser_functions.get_file_cache_key(file_path, "Dark", 5.0)
+        #Overwriting the file invalidates the key
+        stat_result = os.stat(file_path)
+        os.utime(file_path, ns = (stat_result.st_atime_ns, stat_result.st_mtime_ns + 10**9))
+        assert key != image_browser_functions.get_file_cache_key(file_path, "OD", 5.0)
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)
+
+
+def test_persistent_image_view():
+    fig, ax = plt.subplots()
+    try:
+        view = image_browser_functions.PersistentImageView(ax)
+        assert view.show_frame(np.zeros((20, 30)), 0, 1)
+        first_axes_image = view.axes_image
+        assert ax.get_xlim() == (0, 30)
+        assert ax.get_ylim() == (0, 20)
+        ax.set_xlim([5, 10])
+        ax.plot([0, 1], [0, 1])
+        #Same shape: updated in place, keeping the zoom
+        assert not view.show_frame(np.ones((20, 30)), 0, 2)
+        assert view.axes_image is first_axes_image
+        assert np.all(view.axes_image.get_array() == 1)
+        assert view.axes_image.get_clim() == (0, 2)
+        assert ax.get_xlim() == (5, 10)
+        assert len(ax.images) == 1
+        view.clear_overlays()
+        assert len(ax.lines) == 0
+        assert len(ax.images) == 1
+        #New shape: image recreated and view reset
+        assert view.show_frame(np.zeros((40, 50)), 0, 1)
+        assert not view.axes_image is first_axes_image
+        assert len(ax.images) == 1
+        assert ax.get_xlim() == (0, 50)
+        ax.set_ylim([1, 2])
+        view.reset_view()
+        assert ax.get_ylim() == (0, 40)
+    finally:
+        plt.close(fig)
+
+
+def test_frame_prefetcher():
+    loaded_items_list = []
+    release_event = threading.Event()
+    def load_function(item):
+        if item == "blocking":
+            release_event.wait()
+        if item == "bad":
+            raise ValueError("Bad item")
+        loaded_items_list.append(item)
+    with image_browser_functions.FramePrefetcher(load_function) as prefetcher:
+        prefetcher.prefetch(["blocking", "stale"])
+        #Later requests replace pending ones
+        prefetcher.prefetch(["blocking", 1, "bad", 2])
+        release_event.set()
+        assert prefetcher.wait_until_idle(timeout = 5.0)
+        assert loaded_items_list[-2:] == [1, 2]
+        assert not "stale" in loaded_items_list
+        assert prefetcher.failed_load_count == 1
+        prefetcher.prefetch([3])
+        assert prefetcher.wait_until_idle(timeout = 5.0)
+        assert loaded_items_list[-1] == 3
+
+
+def test_get_neighbouring_items():
+    items_list = ["a", "b", "c", "d", "e"]
+    assert image_browser_functions.get_neighbouring_items(items_list, 2, 1) == ["d", "b"]
+    assert image_browser_functions.get_neighbouring_items(items_list, 1, 3) == ["c", "a", "d", "e"]
+    assert image_browser_functions.get_neighbouring_items(items_list, 4, 2) == ["d", "c"]
+    assert image_browser_functions.get_neighbouring_items(items_list, 0, 0) == []
+
+
+def test_incremental_folder_scanner():
+    os.makedirs(TEMP_FOLDER_PATH)
+    try:
+        def make_file(name):
+            with open(os.path.join(TEMP_FOLDER_PATH, name), 'w') as f:
+                f.write("foo")
+        for name in ["b.fits", "a.fits", "c.txt", ".hidden.fits"]:
+            make_file(name)
+        os.makedirs(os.path.join(TEMP_FOLDER_PATH, "folder.fits"))
+        scanner = image_browser_functions.IncrementalFolderScanner(TEMP_FOLDER_PATH, image_extension = ".fits")
+        assert scanner.scan() == (["a.fits", "b.fits"], [])
+        assert scanner.scan() == ([], [])
+        make_file("0.fits")
+        make_file("d.fits")
+        assert scanner.scan() == (["0.fits", "d.fits"], [])
+        #Names are kept in the order in which they were found
+        assert scanner.file_names_list == ["a.fits", "b.fits", "0.fits", "d.fits"]
+        os.remove(os.path.join(TEMP_FOLDER_PATH, "b.fits"))
+        assert scanner.scan() == ([], ["b.fits"])
+        assert scanner.file_names_list == ["a.fits", "0.fits", "d.fits"]
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)
+
+
+def test_read_fits_frames():
+    os.makedirs(TEMP_FOLDER_PATH)
+    try:
+        stack = np.arange(3 * 4 * 5, dtype = np.uint16).reshape((3, 4, 5)) * 1000
+        uint_path = os.path.join(TEMP_FOLDER_PATH, "uint.fits")
+        fits.PrimaryHDU(stack).writeto(uint_path)
+        frames_list = image_browser_functions.read_fits_frames(uint_path, [2, 0])
+        assert len(frames_list) == 2
+        assert frames_list[0].dtype == np.uint16
+        assert np.array_equal(frames_list[0], stack[2])
+        assert np.array_equal(frames_list[1], stack[0])
+        roi_frames_list = image_browser_functions.read_fits_frames(uint_path, [1], roi = [1, 2, 4, 4])
+        assert np.array_equal(roi_frames_list[0], stack[1, 2:4, 1:4])
+        float_path = os.path.join(TEMP_FOLDER_PATH, "float.fits")
+        fits.PrimaryHDU(stack.astype(np.float32) / 7).writeto(float_path)
+        assert np.allclose(image_browser_functions.read_fits_frames(float_path, [1])[0], stack[1] / 7)
+        scaled_path = os.path.join(TEMP_FOLDER_PATH, "scaled.fits")
+        scaled_hdu = fits.PrimaryHDU(stack.astype(np.float32))
+        scaled_hdu.scale('int16', bscale = 2.0, bzero = 10.0)
+        scaled_hdu.writeto(scaled_path)
+        assert np.allclose(image_browser_functions.read_fits_frames(scaled_path, [2])[0], stack[2], atol = 2.0)
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)
+
+
+def test_load_cached_fits_frames():
+    os.makedirs(TEMP_FOLDER_PATH)
+    try:
+        stack = np.arange(3 * 4 * 5, dtype = np.uint16).reshape((3, 4, 5))
+        fits_path = os.path.join(TEMP_FOLDER_PATH, "stack.fits")
+        fits.PrimaryHDU(stack).writeto(fits_path)
+        cache = image_browser_functions.DecodedFrameCache()
+        dark_frame, = image_browser_functions.load_cached_fits_frames(cache, fits_path, [2])
+        assert np.array_equal(dark_frame, stack[2])
+        assert len(cache) == 1
+        frames_list = image_browser_functions.load_cached_fits_frames(cache, fits_path, [0, 1, 2])
+        assert all(np.array_equal(frame, stack[i]) for i, frame in enumerate(frames_list))
+        #The dark frame was reused rather than read again
+        assert np.shares_memory(frames_list[2], dark_frame)
+        assert len(cache) == 3
+        roi_frame, = image_browser_functions.load_cached_fits_frames(cache, fits_path, [0], roi = [0, 0, 2, 2])
+        assert np.array_equal(roi_frame, stack[0, :2, :2])
+        assert len(cache) == 4
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)
+
+
+def test_build_image_pyramid():
+    frame = np.arange(9 * 17, dtype = np.uint16).reshape((9, 17))
+    levels = image_browser_functions.build_image_pyramid(frame, max_downsample_factor = 8)
+    assert [level.shape for level in levels] == [(4, 8), (2, 4)]
+    assert levels[0].dtype == np.float32
+    assert levels[0][1, 2] == np.mean(frame[2:4, 4:6])
+    assert levels[1][0, 0] == np.mean(frame[0:4, 0:4])
+    assert len(image_browser_functions.build_image_pyramid(frame, max_downsample_factor = 2)) == 1
+    assert len(image_browser_functions.build_image_pyramid(np.zeros((3, 100)))) == 0
+
+
+def test_choose_pyramid_level():
+    choose_pyramid_level = image_browser_functions.choose_pyramid_level
+    assert choose_pyramid_level(1000, 1000, 1000, 1000, 4) == 0
+    assert choose_pyramid_level(2000, 2000, 1000, 1000, 4) == 1
+    assert choose_pyramid_level(3999, 3999, 1000, 1000, 4) == 1
+    assert choose_pyramid_level(100000, 100000, 1000, 1000, 4) == 3
+    #The less downsampled axis decides
+    assert choose_pyramid_level(8000, 1000, 1000, 1000, 4) == 0
+    assert choose_pyramid_level(8000, 8000, 1000, 1000, 1) == 0
+    assert choose_pyramid_level(8000, 8000, 0, 0, 4) == 0
+
+
+def test_persistent_image_view_pyramid():
+    fig, ax = plt.subplots(figsize = (1, 1), dpi = 100)
+    try:
+        view = image_browser_functions.PersistentImageView(ax)
+        frame = np.ones((1024, 1024))
+        levels = image_browser_functions.build_image_pyramid(frame, max_downsample_factor = 8)
+        view.show_frame(frame, 0, 1, downsampled_frames = levels)
+        #The axes are under 100 screen pixels across, showing 1024 image pixels
+        assert view.level_index == 3
+        assert view.axes_image.get_array().shape == (128, 128)
+        assert view.axes_image.get_extent() == [-0.5, 1023.5, 1023.5, -0.5]
+        ax.set_xlim([0, 100])
+        ax.set_ylim([0, 100])
+        assert view.level_index == 0
+        assert view.axes_image.get_array().shape == (1024, 1024)
+        #A new frame of the same shape keeps the zoom and the level
+        view.show_frame(2 * frame, 0, 2, downsampled_frames = levels)
+        assert view.level_index == 0
+        assert ax.get_xlim() == (0, 100)
+        view.reset_view()
+        assert view.level_index == 3
+    finally:
+        plt.close(fig)
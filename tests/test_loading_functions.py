@@ -4,6 +4,7 @@ import json
 import os
 import shutil
 import sys
+import time
 
 import matplotlib.pyplot as plt
 
@@ -72,6 +73,40 @@ def test_file_checkout():
     finally:
         os.remove(temp_file_path)
 
+def test_file_checkout_locked():
+    TEMP_FILE_NAME = "Temp_Locked_Checkout_Test.txt"
+    temp_file_path = os.path.join(RESOURCE_DIR_PATH, TEMP_FILE_NAME)
+    try:
+        with open(temp_file_path, 'w') as f:
+            f.write("Hello")
+        with loading_functions.CheckedOutFile(temp_file_path, 'r', checkout_mode = "lock") as f:
+            assert f.read() == "Hello"
+            #Lock mode leaves the file in place
+            assert TEMP_FILE_NAME in os.listdir(RESOURCE_DIR_PATH)
+        with loading_functions.CheckedOutFile(temp_file_path, 'w', checkout_mode = "lock") as f:
+            f.write("Goodbye")
+        with open(temp_file_path, 'r') as f:
+            assert f.read() == "Goodbye"
+        with loading_functions.CheckedOutFile(temp_file_path, 'a', checkout_mode = "lock") as f:
+            f.write("!")
+        with open(temp_file_path, 'r') as f:
+            assert f.read() == "Goodbye!"
+        #A conflicting lock is retried for checkout_patience attempts, then given up on
+        with loading_functions.CheckedOutFile(temp_file_path, 'r', checkout_mode = "lock") as f:
+            with loading_functions.CheckedOutFile(temp_file_path, 'r', checkout_mode = "lock") as f_other:
+                assert f_other.read() == "Goodbye!"
+            start_time = time.time()
+            try:
+                loading_functions.CheckedOutFile(temp_file_path, 'a', checkout_patience = 2, wait_time = 0.05, 
+                                                checkout_mode = "lock")
+            except BlockingIOError:
+                assert time.time() - start_time >= 0.1
+            else:
+                assert False
+        assert len([f for f in os.listdir(RESOURCE_DIR_PATH) if TEMP_FILE_NAME in f]) == 1
+    finally:
+        os.remove(temp_file_path)
+
 def _get_json_contents(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
@@ -0,0 +1,77 @@
+import datetime 
+import json
+import os
+import shutil
+import sys
+import time
+
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.parameters_catalog import ExperimentParametersCatalog
+
+RESOURCE_DIR_PATH = "resources"
+TEMP_ROOT_FOLDER_NAME = "catalog_temp"
+CATALOG_FILENAME = "catalog_temp.sqlite"
+
+
+def test_update_and_query():
+    root_pathname = os.path.join(RESOURCE_DIR_PATH, TEMP_ROOT_FOLDER_NAME)
+    catalog_pathname = os.path.join(RESOURCE_DIR_PATH, CATALOG_FILENAME)
+    try:
+        experiment_parameters_pathnames_list = _spoof_directory_tree_helper(root_pathname)
+        with ExperimentParametersCatalog(catalog_pathname) as catalog:
+            assert catalog.update(root_pathname) == 4
+            #Nothing has changed, so nothing should be re-read
+            assert catalog.update(root_pathname) == 0
+            assert catalog.get_parameter_names() == ["bar", "foo"]
+            foo_history = catalog.get_parameter_history("foo")
+            assert len(foo_history) == 4
+            assert [f[2] for f in foo_history] == [1, 1, 2, 2]
+            assert foo_history[0][1] == datetime.datetime(1970, 1, 1)
+            assert foo_history[0][3] == datetime.datetime(1970, 1, 1)
+            day_two_values = catalog.get_parameter_values_on_date("foo", datetime.datetime(1970, 1, 2))
+            assert len(day_two_values) == 2
+            assert all([f[1] == 2 for f in day_two_values])
+            assert len(catalog.get_parameter_history("bar")) == 2
+            #Modify one snapshot and delete another
+            modified_pathname = experiment_parameters_pathnames_list[0]
+            with open(modified_pathname, 'w') as json_file:
+                json.dump({"Values":{"foo":1337}, "Update_Times":{"foo":"1970-01-01--12-00-00"}}, json_file)
+            os.utime(modified_pathname, (time.time() + 10, time.time() + 10))
+            os.remove(experiment_parameters_pathnames_list[-1])
+            assert catalog.update(root_pathname) == 1
+            foo_history = catalog.get_parameter_history("foo")
+            assert len(foo_history) == 3
+            assert 1337 in [f[2] for f in foo_history]
+            assert catalog.get_snapshot_values(os.path.dirname(modified_pathname)) == {"foo":1337}
+        #The catalog persists between sessions
+        with ExperimentParametersCatalog(catalog_pathname) as catalog:
+            assert len(catalog.get_parameter_history("foo")) == 3
+    finally:
+        if os.path.exists(root_pathname):
+            shutil.rmtree(root_pathname)
+        if os.path.exists(catalog_pathname):
+            os.remove(catalog_pathname)
+
+
+def _spoof_directory_tree_helper(root_pathname):
+    date_folder_names_list = ["1970-01-01", "1970-01-02"]
+    data_folder_names_list = ["hello", "dolly"]
+    experiment_parameters_pathnames_list = []
+    for i, date_folder_name in enumerate(date_folder_names_list):
+        for data_folder_name in data_folder_names_list:
+            data_folder_pathname = os.path.join(root_pathname, "1970", "1970-01", date_folder_name, data_folder_name)
+            os.makedirs(data_folder_pathname)
+            values_dict = {"foo":i + 1}
+            update_times_dict = {"foo":"{0}--00-00-00".format(date_folder_name)}
+            if data_folder_name == "hello":
+                values_dict["bar"] = "baz"
+                update_times_dict["bar"] = "{0}--00-00-00".format(date_folder_name)
+            experiment_parameters_pathname = os.path.join(data_folder_pathname, "experiment_parameters.json")
+            with open(experiment_parameters_pathname, 'w') as json_file:
+                json.dump({"Values":values_dict, "Update_Times":update_times_dict}, json_file)
+            experiment_parameters_pathnames_list.append(experiment_parameters_pathname)
+    return experiment_parameters_pathnames_list
@@ -0,0 +1,343 @@
+import os
+import shutil
+import sys
+import threading
+import time
+
+from astropy.io import fits
+import numpy as np
+
+path_to_file = os.path.dirname(os.path.abspath(__file__))
+path_to_satyendra = path_to_file + "/../../"
+sys.path.insert(0, path_to_satyendra)
+
+from satyendra.code.instruments.cameras import rolling_camera_functions
+from satyendra.code.instruments.cameras.camera_interface import VideoFrameBuffer
+from satyendra.code.instruments.cameras.simulated_camera import SimulatedCamera
+
+RESOURCE_DIR_PATH = "resources"
+TEMP_FOLDER_PATH = os.path.join(RESOURCE_DIR_PATH, "Save_Frames_Temp")
+
+
+def _initialize_simulated_camera(drop_probability = 0.0):
+    cam = SimulatedCamera(seed = 0)
+    cam.set_property("Height", 32)
+    cam.set_property("Width", 48)
+    cam.set_property("FramesPerSequence", 3)
+    cam.set_property("FrameInterval", 0.005)
+    cam.set_property("SequenceInterval", 0.1)
+    cam.set_property("DropProbability", drop_probability)
+    return cam
+
+
+def test_video_frame_buffer():
+    frame_buffer = VideoFrameBuffer(3, (2, 2), np.uint16)
+    assert frame_buffer.pop_frame() is None
+    for i in range(5):
+        frame_buffer.append(np.full((2, 2), i), timestamp = 0.1 * i, frame_id = i)
+    assert len(frame_buffer) == 3
+    frame, metadata = frame_buffer.pop_frame(return_metadata = True)
+    assert frame[0, 0] == 2 
+    assert metadata["sequence_number"] == 2
+    assert metadata["frame_id"] == 2
+    assert np.isclose(metadata["timestamp"], 0.2)
+    assert frame_buffer.overrun_count == 2
+    assert frame_buffer.pop_frame(recency = "newest")[0, 0] == 4 
+    assert len(frame_buffer) == 0
+    frame_buffer.append(np.zeros((2, 2)))
+    frame_buffer.flush() 
+    assert frame_buffer.pop_frame() is None
+
+
+def test_video_frame_buffer_concurrent_overrun():
+    #A fast producer overruns a small buffer while the consumer reads; no frame may be returned torn or out of order
+    num_appended_frames = 5000
+    frame_buffer = VideoFrameBuffer(4, (16, 16), np.int64)
+    def produce_frames():
+        for i in range(num_appended_frames):
+            frame_buffer.append(np.full((16, 16), i), timestamp = 0.001 * i, frame_id = i)
+    producer_thread = threading.Thread(target = produce_frames)
+    producer_thread.start()
+    sequence_numbers_list = []
+    while producer_thread.is_alive() or len(frame_buffer) > 0:
+        frame_and_metadata = frame_buffer.pop_frame(return_metadata = True)
+        if frame_and_metadata is None:
+            continue
+        frame, metadata = frame_and_metadata
+        assert np.all(frame == metadata["sequence_number"])
+        assert metadata["frame_id"] == metadata["sequence_number"]
+        sequence_numbers_list.append(metadata["sequence_number"])
+    producer_thread.join()
+    assert np.all(np.diff(sequence_numbers_list) > 0)
+    assert frame_buffer.next_sequence_number == num_appended_frames
+    #Every frame was either read or counted as overrun, including those overwritten while being read
+    assert len(sequence_numbers_list) + frame_buffer.overrun_count == num_appended_frames
+    assert frame_buffer.overrun_count > 0
+    assert sequence_numbers_list[-1] == num_appended_frames - 1
+    assert frame_buffer.get_stats()["buffer_high_water_mark"] <= 4
+
+
+def test_rolling_frame_sequence_assembler():
+    with _initialize_simulated_camera() as cam:
+        cam.start_video()
+        with rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05) as assembler:
+            for i in range(3):
+                frames = assembler.get_sequence(timeout = 1.0)
+                assert len(frames) == 3
+                assert frames[0].shape == (32, 48)
+                assert frames[0].dtype == np.uint16
+
+
+def test_rolling_frame_sequence_assembler_timestamp_mode():
+    with _initialize_simulated_camera(drop_probability = 0.2) as cam:
+        cam.start_video()
+        with rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05, grouping_mode = "timestamp", 
+                                                                    max_frame_gap = 0.05) as assembler:
+            for i in range(3):
+                frames = assembler.get_sequence(timeout = 2.0)
+                assert len(frames) == 3
+
+
+def test_rolling_frame_sequence_assembler_video_stopped():
+    with _initialize_simulated_camera() as cam:
+        cam.start_video()
+        assembler = rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05)
+        assert not assembler.get_sequence(timeout = 1.0) is None
+        cam.stop_video()
+        #The failure is reported rather than get_sequence waiting out its timeout
+        try:
+            #Sequences completed before the video stopped are returned first
+            for i in range(10):
+                assembler.get_sequence(timeout = 2.0)
+        except RuntimeError as e:
+            assert "Video mode is not running" in str(e.__cause__)
+        else:
+            assert False
+        assert not assembler.worker_error is None
+        #Already reported, so close does not raise again
+        assembler.close()
+        cam.start_video()
+        assembler = rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05)
+        cam.stop_video()
+        time.sleep(2 * rolling_camera_functions.ASSEMBLER_IDLE_CHECK_INTERVAL_SECS)
+        try:
+            assembler.close()
+        except RuntimeError:
+            pass
+        else:
+            assert False
+
+
+def test_rolling_frame_sequence_assembler_frame_callback():
+    for grouping_mode in ["count", "timestamp"]:
+        with _initialize_simulated_camera(drop_probability = 0.3) as cam:
+            cam.start_video()
+            frames_seen_list = []
+            with rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05, grouping_mode = grouping_mode, max_frame_gap = 0.05,
+                                                                        frame_callback = frames_seen_list.append) as assembler:
+                for i in range(3):
+                    assert not assembler.get_sequence(timeout = 2.0) is None
+                stats_dict = assembler.get_stats()
+            #The frames of flushed, incomplete sequences are seen as well as those of complete ones
+            assert stats_dict["sequences_flushed_by_timeout"] > 0
+            assert len(frames_seen_list) > 3 * stats_dict["sequences_completed"]
+            assert frames_seen_list[0].shape == (32, 48)
+
+
+def test_multi_camera_acquisition_manager():
+    with _initialize_simulated_camera() as side_cam, _initialize_simulated_camera() as top_cam:
+        side_cam.start_video()
+        top_cam.start_video()
+        camera_configs_dict = {name:{"cam":cam, "num_frames":3, "frame_timeout":0.05, "shot_timeout":0.05} 
+                                for name, cam in [("Side", side_cam), ("Top", top_cam)]}
+        with rolling_camera_functions.MultiCameraAcquisitionManager(camera_configs_dict) as manager:
+            for i in range(3):
+                acquisition_datetime, sequences_dict = manager.get_shot(timeout = 1.0)
+                assert list(sequences_dict) == ["Side", "Top"]
+                assert len(sequences_dict["Side"]) == 3 and len(sequences_dict["Top"]) == 3
+    #No shot is complete if one camera never delivers a sequence
+    with _initialize_simulated_camera() as side_cam, _initialize_simulated_camera(drop_probability = 1.0) as top_cam:
+        side_cam.start_video()
+        top_cam.start_video()
+        camera_configs_dict = {name:{"cam":cam, "num_frames":3, "frame_timeout":0.05, "shot_timeout":0.05} 
+                                for name, cam in [("Side", side_cam), ("Top", top_cam)]}
+        with rolling_camera_functions.MultiCameraAcquisitionManager(camera_configs_dict) as manager:
+            assert manager.get_shot(timeout = 0.5) is None
+            assert manager.incomplete_shot_count > 0
+
+
+def test_multi_camera_exposure_grouping_labels():
+    #Two cameras may share an exposure grouping name, since their files are labelled by camera
+    with _initialize_simulated_camera() as side_cam, _initialize_simulated_camera() as top_cam:
+        side_cam.start_video()
+        top_cam.start_video()
+        camera_configs_dict = {name:{"cam":cam, "num_frames":3, "frame_timeout":0.05, "shot_timeout":0.05,
+                                    "exposure_grouping_names":["TopA"]} for name, cam in [("Side", side_cam), ("Top", top_cam)]}
+        with rolling_camera_functions.MultiCameraAcquisitionManager(camera_configs_dict) as manager:
+            acquisition_datetime, sequences_dict = manager.get_shot(timeout = 1.0)
+            labels_list = [rolling_camera_functions.get_exposure_grouping_label(camera_name, "TopA") for camera_name in sequences_dict]
+            assert labels_list == ["Side_TopA", "Top_TopA"]
+        #Configs whose labels would collide are rejected before any camera is read
+        camera_configs_dict["Side"]["exposure_grouping_names"] = ["Top_A"]
+        camera_configs_dict["Side_Top"] = camera_configs_dict.pop("Top")
+        camera_configs_dict["Side_Top"]["exposure_grouping_names"] = ["A"]
+        try:
+            rolling_camera_functions.MultiCameraAcquisitionManager(camera_configs_dict)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+def test_acquisition_stats():
+    frame_buffer = VideoFrameBuffer(3, (2, 2), np.uint16)
+    for i in range(5):
+        frame_buffer.append(np.full((2, 2), i))
+    frame_buffer.pop_frame()
+    buffer_stats_dict = frame_buffer.get_stats()
+    assert buffer_stats_dict["frames_received"] == 5
+    assert buffer_stats_dict["frames_dropped_on_overflow"] == 2
+    assert buffer_stats_dict["buffer_high_water_mark"] == 3
+    with _initialize_simulated_camera(drop_probability = 0.3) as cam:
+        cam.start_video()
+        with rolling_camera_functions.RollingFrameSequenceAssembler(cam, 3, 0.05) as assembler:
+            for i in range(3):
+                assembler.get_sequence(timeout = 2.0)
+            stats_dict = assembler.get_stats()
+        assert stats_dict["sequences_completed"] >= 3
+        assert stats_dict["camera"]["frames_received"] >= 9
+        assert stats_dict["camera"]["callback_latency_max_secs"] > 0
+
+
+def test_timestamp_frame_sequence_grouper():
+    grouper = rolling_camera_functions.TimestampFrameSequenceGrouper(3, 0.05)
+    timestamps_list = [0.0, 0.01, 0.02, 1.0, 1.01, 2.0, 2.01, 2.02, 2.03, 3.0, 3.01, 3.02]
+    sequences_list = []
+    for i, timestamp in enumerate(timestamps_list):
+        frames = grouper.add_frame(i, timestamp)
+        if not frames is None:
+            sequences_list.append(frames)
+    assert sequences_list == [(0, 1, 2), (5, 6, 7), (9, 10, 11)]
+    assert grouper.incomplete_sequence_count == 1
+    assert grouper.excess_frame_count == 1
+
+
+def test_timestamp_frame_sequence_grouper_frame_ids():
+    grouper = rolling_camera_functions.TimestampFrameSequenceGrouper(3, 0.05)
+    #A break in the frame ids means a frame was lost in transfer, even though the timestamps are contiguous
+    frame_ids_list = [0, 1, 3, 4, 5, 10, 11, 12]
+    timestamps_list = [0.0, 0.01, 0.03, 0.04, 0.05, 1.0, 1.01, 1.02]
+    sequences_list = []
+    for frame_id, timestamp in zip(frame_ids_list, timestamps_list):
+        frames = grouper.add_frame(frame_id, timestamp, frame_id = frame_id)
+        if not frames is None:
+            sequences_list.append(frames)
+    assert sequences_list == [(3, 4, 5), (10, 11, 12)]
+    assert grouper.incomplete_sequence_count == 1
+    try:
+        grouper.add_frame(13, None)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_acquire_rolling_frame_sequences_by_timestamp():
+    #Stands in for a camera in video mode, whose buffer is filled directly
+    class BufferCamera():
+        def __init__(self):
+            self.frame_buffer = VideoFrameBuffer(10, (2, 2), np.uint16)
+        def get_video_frame(self, return_metadata = False):
+            return self.frame_buffer.pop_frame(return_metadata = return_metadata)
+    cam = BufferCamera()
+    grouper = rolling_camera_functions.TimestampFrameSequenceGrouper(3, 0.05)
+    for i, timestamp in enumerate([0.0, 0.01, 0.02, 1.0, 1.01]):
+        cam.frame_buffer.append(np.full((2, 2), i), timestamp = timestamp, frame_id = i)
+    sequences_list = rolling_camera_functions.acquire_rolling_frame_sequences_by_timestamp(cam, grouper)
+    assert [[frame[0, 0] for frame in frames] for frames in sequences_list] == [[0, 1, 2]]
+    #The partial sequence is held by the grouper until its last frame arrives
+    cam.frame_buffer.append(np.full((2, 2), 5), timestamp = 1.02, frame_id = 5)
+    sequences_list = rolling_camera_functions.acquire_rolling_frame_sequences_by_timestamp(cam, grouper)
+    assert [[frame[0, 0] for frame in frames] for frames in sequences_list] == [[3, 4, 5]]
+    assert rolling_camera_functions.acquire_rolling_frame_sequences_by_timestamp(cam, grouper) == []
+
+
+def test_regroup_numpy_frames():
+    frames = tuple(np.arange(i * 8, (i + 1) * 8).reshape(2, 2, 2) for i in range(3))
+    odd_exposures, even_exposures = rolling_camera_functions.regroup_numpy_frames(frames, [[1, 3, 5], [2, 4, 6]])
+    assert odd_exposures.shape == (3, 2, 2)
+    assert [f[0, 0] for f in odd_exposures] == [0, 8, 16]
+    assert [f[0, 0] for f in even_exposures] == [4, 12, 20]
+    #Stacked input and 2D frames give the same result
+    stacked_odd_exposures, stacked_even_exposures = rolling_camera_functions.regroup_numpy_frames(np.stack(frames), [[1, 3, 5], [2, 4, 6]])
+    assert np.array_equal(stacked_odd_exposures, odd_exposures)
+    single_exposure_frames = [np.full((2, 2), i) for i in range(3)]
+    reversed_exposures, = rolling_camera_functions.regroup_numpy_frames(single_exposure_frames, [[3, 2, 1]])
+    assert [f[0, 0] for f in reversed_exposures] == [2, 1, 0]
+
+
+def test_regroup_numpy_frames_into():
+    frames = tuple(np.arange(i * 8, (i + 1) * 8).reshape(2, 2, 2) for i in range(3))
+    output_arrays = [np.zeros((3, 2, 2), dtype = int), np.zeros((2, 2, 2), dtype = int)]
+    returned_arrays = rolling_camera_functions.regroup_numpy_frames_into(frames, [[1, 3, 5], [6, 2]], output_arrays)
+    assert returned_arrays[0] is output_arrays[0]
+    assert [f[0, 0] for f in output_arrays[1]] == [20, 4]
+
+
+def test_crop_and_bin_frames():
+    frames = np.arange(2 * 10 * 12, dtype = np.uint16).reshape(2, 10, 12)
+    cropped_frames, geometry_dict = rolling_camera_functions.crop_and_bin_frames(frames, roi = [1, 2, 8, 9])
+    assert cropped_frames.shape == (2, 7, 7)
+    assert np.shares_memory(cropped_frames, frames)
+    assert geometry_dict == {"ROIXMIN":1, "ROIYMIN":2, "ROIXMAX":8, "ROIYMAX":9, "BINNING":1}
+    binned_frames, geometry_dict = rolling_camera_functions.crop_and_bin_frames(frames, roi = [1, 2, 8, 9], binning = 2)
+    assert binned_frames.shape == (2, 3, 3)
+    assert binned_frames.dtype == np.uint32
+    assert binned_frames[1, 2, 0] == np.sum(frames[1, 6:8, 1:3])
+    assert geometry_dict["ROIXMAX"] == 7 and geometry_dict["ROIYMAX"] == 8
+
+
+def test_async_frame_writer():
+    saved_paths_list = []
+    write_released_event = threading.Event()
+    saved_header_dicts_list = []
+    def blocking_save_function(frames, save_path, header_dict = None):
+        write_released_event.wait()
+        if save_path == "bad_path":
+            raise OSError("Simulated write failure")
+        saved_paths_list.append(save_path)
+        saved_header_dicts_list.append(header_dict)
+    with rolling_camera_functions.AsyncFrameWriter(num_workers = 1, max_queued_writes = 2, save_function = blocking_save_function) as writer:
+        assert writer.submit(np.zeros((2, 2)), "path_1")
+        #Wait for the worker to take the first write, leaving the queue empty
+        while writer.queued_write_count > 0:
+            time.sleep(0.01)
+        assert writer.submit(np.zeros((2, 2)), "bad_path")
+        assert writer.submit(np.zeros((2, 2)), "path_2", save_kwargs = {"header_dict":{"SHOT":2}})
+        assert not writer.submit(np.zeros((2, 2)), "path_3")
+        assert writer.rejected_write_count == 1
+        assert writer.max_queued_write_count == 2
+        write_released_event.set()
+    assert saved_paths_list == ["path_1", "path_2"]
+    assert saved_header_dicts_list == [None, {"SHOT":2}]
+    assert writer.completed_write_count == 2
+    assert writer.failed_writes_list[0][0] == "bad_path"
+
+
+def test_save_and_load_frames():
+    frames = np.random.default_rng(0).integers(0, 4096, size = (3, 20, 30)).astype(np.uint16)
+    save_filenames_list = ["frames.fits", "frames.fits.fz", "frames_gzip.fits.fz", "frames.npy"]
+    if not rolling_camera_functions.h5py is None:
+        save_filenames_list.append("frames.h5")
+    try:
+        os.mkdir(TEMP_FOLDER_PATH)
+        for save_filename in save_filenames_list:
+            save_path = os.path.join(TEMP_FOLDER_PATH, save_filename)
+            compression = "GZIP_2" if "gzip" in save_filename else None
+            rolling_camera_functions.save_frames(tuple(frames), save_path, compression = compression, header_dict = {"BINNING":2})
+            loaded_frames = rolling_camera_functions.load_frames(save_path)
+            assert loaded_frames.dtype == frames.dtype
+            assert np.array_equal(loaded_frames, frames)
+        assert fits.getheader(os.path.join(TEMP_FOLDER_PATH, "frames.fits.fz"), 1)["BINNING"] == 2
+    finally:
+        shutil.rmtree(TEMP_FOLDER_PATH)